@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+import io
+from pathlib import Path
+import random
+import zipfile
+
+from PIL import Image
+
+# Number of distinct images encoded per format; pages cycle through them
+IMAGE_VARIANTS = 8
+
+_MESSY_CHAPTER_NAMES = (
+    "{series} - Chapter {number}.cbz",
+    "{series} Ch.{number} [Scans].cbz",
+    "{series}_c{number:0>3} (v2).cbz",
+    "[Group] {series} Chapter{number}.cbz",
+    "{series} {number}.cbz",
+)
+_MESSY_PAGE_NAMES = ("{page}.{ext}", "page_{page:03}.{ext}", "P{page:04} copy.{ext}")
+
+
+@dataclass
+class CorpusSpec:
+    """
+    Shape of a synthetic library: `series` folders of `chapters` CBZs holding
+    `pages` images each. Pages cycle through `formats`; a `nested` layout puts
+    them in subfolders of each archive, and `messy` names mix naming schemes,
+    decimal chapters and unpadded page numbers. The same spec and `seed` always
+    produce the same files.
+    """
+
+    series: int = 2
+    chapters: int = 30
+    pages: int = 20
+    width: int = 800
+    height: int = 1200
+    formats: tuple[str, ...] = ("jpg",)
+    layout: str = "flat"
+    messy: bool = False
+    seed: int = 0
+
+
+def render_page(rng: random.Random, width: int, height: int, fmt: str) -> bytes:
+    """
+    Encodes a deterministic page: coarse noise scaled up, so it compresses like a scan.
+    """
+    cells = (max(1, width // 16), max(1, height // 16))
+    noise = Image.frombytes("L", cells, rng.randbytes(cells[0] * cells[1]))
+    image = noise.resize((width, height), Image.BILINEAR)
+    output = io.BytesIO()
+    image.save(output, {"jpg": "JPEG"}.get(fmt, fmt.upper()))
+    return output.getvalue()
+
+
+def chapter_name(spec: CorpusSpec, series: str, chapter: int) -> str:
+    if not spec.messy:
+        return f"{series} Chapter {chapter}.cbz"
+    number = f"{chapter // 2}.5" if chapter % 7 == 0 else str(chapter)
+    pattern = _MESSY_CHAPTER_NAMES[chapter % len(_MESSY_CHAPTER_NAMES)]
+    return pattern.format(series=series, number=number)
+
+
+def page_name(spec: CorpusSpec, chapter: int, page: int, fmt: str) -> str:
+    if not spec.messy:
+        name = f"{page:03}.{fmt}"
+    else:
+        name = _MESSY_PAGE_NAMES[chapter % len(_MESSY_PAGE_NAMES)].format(
+            page=page + 1, ext=fmt
+        )
+    if spec.layout == "nested":
+        return f"Chapter {chapter}/images/{name}"
+    return name
+
+
+def generate_corpus(root: Path, spec: CorpusSpec) -> list[Path]:
+    """
+    Writes the library described by `spec` under `root` and returns its series folders.
+    """
+    rng = random.Random(spec.seed)
+    images = {
+        fmt: [
+            render_page(rng, spec.width, spec.height, fmt) for _ in range(IMAGE_VARIANTS)
+        ]
+        for fmt in spec.formats
+    }
+    folders = []
+    for series_number in range(spec.series):
+        series = f"Series {series_number + 1}"
+        folder = root / series
+        folder.mkdir(parents=True, exist_ok=True)
+        for chapter in range(1, spec.chapters + 1):
+            with zipfile.ZipFile(folder / chapter_name(spec, series, chapter), "w") as zipf:
+                for page in range(spec.pages):
+                    fmt = spec.formats[(chapter + page) % len(spec.formats)]
+                    data = images[fmt][(chapter * spec.pages + page) % IMAGE_VARIANTS]
+                    zipf.writestr(page_name(spec, chapter, page, fmt), data)
+        folders.append(folder)
+    return folders
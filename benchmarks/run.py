@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+import argparse
+from dataclasses import asdict
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+# Progress bars would dominate the timings of the small stages
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+# Determine the project root based on the script's location
+project_root = Path(__file__).resolve().parent.parent
+
+# Add the project root to sys.path
+sys.path.append(str(project_root))
+
+from benchmarks.corpus import CorpusSpec, generate_corpus
+from benchmarks.startup import DEFAULT_IMPORT_BUDGET, check_startup, measure_startup
+from scripts.fix_cbz import fix_cbz_structure
+from src.catalog import read_manifest
+from src.grouper import GroupingPolicy, combine_to_cbz, group_cbz_into_packs
+from src.parser import parse_chapter_number
+from src.state_manager import StatusStore
+from src.utils import get_sorted_cbz_files, natural_sort_key, zip_files
+
+DEFAULT_TOLERANCE = 0.15  # slowdown relative to the baseline reported as a regression
+
+# The pipeline logs every pack and odd file name; only the benchmark's own messages are shown
+logger = logging.getLogger("benchmarks")
+
+
+def best_time(func, repeat: int) -> float:
+    """
+    Runs `func` `repeat` times and returns the fastest wall-clock time in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def stage_result(seconds: float, items: int, pages: int = 0, size: int = 0) -> dict:
+    return {
+        "seconds": round(seconds, 6),
+        "items": items,
+        "items_per_s": round(items / seconds, 1) if seconds else None,
+        "pages_per_s": round(pages / seconds, 1) if seconds and pages else None,
+        "mb_per_s": round(size / 1e6 / seconds, 2) if seconds and size else None,
+    }
+
+
+def run_benchmarks(spec: CorpusSpec, work_dir: Path, repeat: int) -> dict:
+    """
+    Generates the corpus in `work_dir` and times every stage on it separately.
+    """
+    folders = generate_corpus(work_dir / "library", spec)
+    cbz_files = [cbz for folder in folders for cbz in sorted(folder.glob("*.cbz"))]
+    library_bytes = sum(cbz.stat().st_size for cbz in cbz_files)
+    page_count = len(cbz_files) * spec.pages
+    chapter_names = [cbz.name for cbz in cbz_files]
+    manifests = {cbz: read_manifest(cbz) for cbz in cbz_files}
+    page_names = [
+        page.name for manifest in manifests.values() for page in manifest.pages
+    ]
+    pages_policy = GroupingPolicy(mode="pages")
+    output_dir = work_dir / "output"
+    output_dir.mkdir()
+    status = StatusStore(work_dir / "status.sqlite3")
+
+    # Loose images for zip_files, as left behind by the extraction path
+    loose_dir = work_dir / "loose"
+    loose_dir.mkdir()
+    with zipfile.ZipFile(cbz_files[0]) as zipf:
+        for i, info in enumerate(zipf.infolist()):
+            (loose_dir / f"{i:05}{Path(info.filename).suffix}").write_bytes(
+                zipf.read(info)
+            )
+    loose_files = sorted(loose_dir.iterdir())
+    loose_bytes = sum(path.stat().st_size for path in loose_files)
+
+    def combine_all(in_memory: bool = False):
+        for folder in folders:
+            files = sorted(folder.glob("*.cbz"))
+            combine_to_cbz(
+                status,
+                "bench",
+                files,
+                output_dir / f"{folder.name}.cbz",
+                None,
+                metadata={"title": folder.name},
+                force=True,
+                in_memory=in_memory,
+            )
+
+    def fix_all():
+        for i, cbz in enumerate(cbz_files):
+            fix_cbz_structure(cbz, output_dir / f"fixed_{i}.cbz")
+
+    stages = {
+        "natural_sort_key": (
+            lambda: [natural_sort_key(name) for name in page_names + chapter_names],
+            dict(items=len(page_names) + len(chapter_names)),
+        ),
+        "parse_chapter_number": (
+            lambda: [parse_chapter_number(name) for name in chapter_names],
+            dict(items=len(chapter_names)),
+        ),
+        "get_sorted_cbz_files": (
+            lambda: [get_sorted_cbz_files(folder) for folder in folders],
+            dict(items=len(cbz_files)),
+        ),
+        "group_cbz_into_packs": (
+            lambda: [
+                group_cbz_into_packs(sorted(folder.glob("*.cbz")))
+                for folder in folders
+            ],
+            dict(items=len(cbz_files)),
+        ),
+        "group_cbz_into_packs[pages]": (
+            lambda: [
+                group_cbz_into_packs(
+                    sorted(folder.glob("*.cbz")), policy=pages_policy, manifests=manifests
+                )
+                for folder in folders
+            ],
+            dict(items=len(cbz_files), pages=page_count),
+        ),
+        "combine_to_cbz": (
+            combine_all,
+            dict(items=len(cbz_files), pages=page_count, size=library_bytes),
+        ),
+        "combine_to_cbz[in_memory]": (
+            lambda: combine_all(in_memory=True),
+            dict(items=len(cbz_files), pages=page_count, size=library_bytes),
+        ),
+        "zip_files": (
+            lambda: zip_files(output_dir / "zipped.cbz", loose_files),
+            dict(items=len(loose_files), pages=len(loose_files), size=loose_bytes),
+        ),
+        "fix_cbz_structure": (
+            fix_all,
+            dict(items=len(cbz_files), pages=page_count, size=library_bytes),
+        ),
+    }
+
+    results = {}
+    for name, (func, counts) in stages.items():
+        results[name] = stage_result(best_time(func, repeat), **counts)
+        logger.info(f"{name}: {results[name]['seconds']:.4f}s")
+    return {
+        "spec": asdict(spec),
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stages": results,
+    }
+
+
+def compare_to_baseline(
+    results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE
+) -> list[str]:
+    """
+    Returns a description of every stage that got slower than its baseline
+    timing by more than `tolerance`.
+    """
+    if baseline.get("spec") != results["spec"]:
+        logger.warning("The baseline was measured on a different corpus.")
+    regressions = []
+    for name, stage in results["stages"].items():
+        reference = baseline.get("stages", {}).get(name)
+        if not reference or not reference["seconds"]:
+            continue
+        ratio = stage["seconds"] / reference["seconds"]
+        logger.info(f"{name}: {ratio:.2f}x the baseline time")
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{name} took {stage['seconds']:.4f}s, {ratio:.2f}x the baseline ({reference['seconds']:.4f}s)"
+            )
+    return regressions
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments.
+
+    :return: Parsed arguments.
+    """
+    defaults = CorpusSpec()
+    parser = argparse.ArgumentParser(
+        description="Time the hot paths of the pipeline on a synthetic CBZ library."
+    )
+    parser.add_argument("--series", type=int, default=defaults.series)
+    parser.add_argument("--chapters", type=int, default=defaults.chapters)
+    parser.add_argument("--pages", type=int, default=defaults.pages)
+    parser.add_argument("--width", type=int, default=defaults.width)
+    parser.add_argument("--height", type=int, default=defaults.height)
+    parser.add_argument(
+        "--formats",
+        type=lambda value: tuple(value.split(",")),
+        default=defaults.formats,
+        help="Comma-separated image formats, e.g. 'jpg,png,webp'. Default: jpg",
+    )
+    parser.add_argument(
+        "--layout", choices=("flat", "nested"), default=defaults.layout
+    )
+    parser.add_argument(
+        "--messy", action="store_true", help="Use mixed, messy file names."
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per stage; the fastest counts."
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="Write the results to this JSON file."
+    )
+    parser.add_argument(
+        "--baseline", type=str, default=None, help="Compare against this results file."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Slowdown reported as a regression. Default: {DEFAULT_TOLERANCE}",
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the generated corpus."
+    )
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=DEFAULT_IMPORT_BUDGET,
+        help=f"Seconds a script may take to import. Default: {DEFAULT_IMPORT_BUDGET}",
+    )
+    parser.add_argument(
+        "--startup-only",
+        action="store_true",
+        help="Only check the startup of the scripts, without generating a corpus.",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger().setLevel(logging.ERROR)
+    logger.setLevel(logging.INFO)
+    args = parse_arguments()
+    spec = CorpusSpec(
+        series=args.series,
+        chapters=args.chapters,
+        pages=args.pages,
+        width=args.width,
+        height=args.height,
+        formats=args.formats,
+        layout=args.layout,
+        messy=args.messy,
+        seed=args.seed,
+    )
+
+    if args.startup_only:
+        results = {"python": platform.python_version(), "stages": {}}
+    else:
+        work_dir = Path(tempfile.mkdtemp(prefix="manga-bench-"))
+        try:
+            results = run_benchmarks(spec, work_dir, args.repeat)
+        finally:
+            if args.keep:
+                logger.info(f"Corpus kept in '{work_dir}'.")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    results["startup"] = measure_startup(args.repeat)
+    for name, startup in results["startup"].items():
+        logger.info(f"import {name}: {startup['seconds']:.4f}s")
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    startup_problems = check_startup(results["startup"], args.import_budget)
+    for problem in startup_problems:
+        logger.warning(f"Slow startup: {problem}")
+
+    if args.baseline and not args.startup_only:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        if regressions:
+            return 1
+        logger.info("No regressions against the baseline.")
+    return 1 if startup_problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
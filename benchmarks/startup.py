@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+import subprocess
+import sys
+
+project_root = Path(__file__).resolve().parent.parent
+
+# Scripts whose startup is measured; watch-mode triggers and per-folder runs pay it every time
+STARTUP_SCRIPTS = (
+    "combine_and_process_cbz.py",
+    "batch_combine_and_process_cbz.py",
+    "fix_cbz.py",
+    "conversion_queue.py",
+    "metadata_cache.py",
+    "title_index.py",
+    "import_to_calibre.py",
+)
+# Dependencies only the stages that use them may import: the terminal display,
+# the network clients, fuzzy matching and the optional page processing
+DEFERRED_MODULES = (
+    "rich",
+    "textual_image",
+    "jikanpy",
+    "fuzzywuzzy",
+    "rapidfuzz",
+    "requests",
+    "aiohttp",
+    "numpy",
+    "PIL",
+)
+DEFAULT_IMPORT_BUDGET = 0.5  # seconds to import one script, without running it
+
+# Runs in a fresh interpreter: imports a script without calling its main()
+_PROBE = """
+import json, os, runpy, sys, time
+script = sys.argv[1]
+sys.path.insert(0, os.path.dirname(script))
+started = time.perf_counter()
+runpy.run_path(script, run_name="startup_probe")
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+"""
+
+
+def probe_script(script: Path) -> dict:
+    """
+    Imports `script` in a new interpreter and returns how long the import took
+    and which deferred modules it loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE, str(script)],
+        capture_output=True,
+        text=True,
+        cwd=project_root,
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        raise RuntimeError(f"Cannot import '{script.name}': {error[-1] if error else ''}")
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    loaded = {module.split(".", 1)[0] for module in probe["modules"]}
+    return {
+        "seconds": probe["seconds"],
+        "deferred_loaded": [module for module in DEFERRED_MODULES if module in loaded],
+    }
+
+
+def measure_startup(repeat: int) -> dict:
+    """
+    Probes every script `repeat` times and keeps the fastest import of each.
+    """
+    results = {}
+    for name in STARTUP_SCRIPTS:
+        probes = [probe_script(project_root / "scripts" / name) for _ in range(repeat)]
+        fastest = min(probes, key=lambda probe: probe["seconds"])
+        results[name] = {
+            "seconds": round(fastest["seconds"], 6),
+            "deferred_loaded": fastest["deferred_loaded"],
+        }
+    return results
+
+
+def check_startup(startup: dict, budget: float = DEFAULT_IMPORT_BUDGET) -> list[str]:
+    """
+    Returns a description of every script that imports a deferred module or
+    takes longer than `budget` seconds to import.
+    """
+    problems = []
+    for name, result in startup.items():
+        if result["deferred_loaded"]:
+            problems.append(
+                f"{name} imports {', '.join(result['deferred_loaded'])} at startup"
+            )
+        if result["seconds"] > budget:
+            problems.append(
+                f"{name} took {result['seconds']:.3f}s to import, over the {budget:.3f}s budget"
+            )
+    return problems
@@ -0,0 +1,11 @@
+from .startup import STARTUP_SCRIPTS, check_startup, measure_startup
+
+
+def test_scripts_import_within_budget():
+    """
+    Every script imports within the default budget and defers its heavy dependencies.
+    """
+    startup = measure_startup(repeat=1)
+    assert set(startup) == set(STARTUP_SCRIPTS)
+    problems = check_startup(startup)
+    assert problems == [], "\n".join(problems)
@@ -1,23 +1,281 @@
 import argparse
+from concurrent.futures import Future
+from contextlib import nullcontext
 from pathlib import Path
 import logging
-from combine_and_process_cbz import process_manga_folder, setup_logging
+import threading
+from combine_and_process_cbz import (
+    MangaFolder,
+    PackJob,
+    combine_pack,
+    convert_pack,
+    display_manga_info,
+    fetch_metadata_and_cover,
+    log_dry_run_packs,
+    plan_pack_jobs,
+    prepare_manga_folder,
+    setup_logging,
+)
+from src.admission import (
+    DiskAdmission,
+    MemoryStaging,
+    set_disk_admission,
+    set_memory_staging,
+)
+from src.catalog import get_library_catalog
+from src.constants import CPU_WORKERS, DISK_WORKERS, NETWORK_WORKERS, WATCH_DEBOUNCE
+from src.manga_info import start_prefetch
+from src.dedupe import DedupeOptions
+from src.grouper import GroupingPolicy
+from src.parser import ChapterIndex
+from src.scheduler import CPU, DISK, NETWORK, ResourceScheduler
+from src.rasterizer import PageRasterizer
+from src.tracing import tracing
+from src.watcher import LibraryWatcher
+from src.utils import (
+    add_dedupe_arguments,
+    add_disk_arguments,
+    add_grouping_arguments,
+    add_rasterize_arguments,
+    add_tracing_arguments,
+    clean_cover_image,
+    natural_sort_key,
+)
 
+PRIORITY_POLICIES = ("name", "newest", "smallest")
 
-def process_all_manga_folders(parent_dir: Path, dry_run: bool):
+
+def folder_priority(cbz_files: list[Path], policy: str, position: int) -> tuple:
+    """
+    Orders series for the scheduler: 'newest' puts the series with the most recently
+    added chapter first, 'smallest' the series with the fewest bytes, 'name' keeps
+    directory order. `position` is the folder's place in directory order; it ends
+    every key, so each series keeps its own slot and its packs stay together.
+    """
+    if policy == "newest":
+        return (-max(cbz.stat().st_mtime for cbz in cbz_files), position)
+    if policy == "smallest":
+        return (sum(cbz.stat().st_size for cbz in cbz_files), position)
+    return (position,)
+
+
+def pack_priority(base: tuple, job: PackJob, policy: str) -> tuple:
+    """
+    Orders the packs of one series after `base`, the key of its folder, so every
+    pack of an earlier series runs first; with 'newest' the packs holding the latest
+    chapters go first.
+    """
+    if policy == "newest":
+        return base + (-max(cbz.stat().st_mtime for cbz in job.cbz_files),)
+    return base + (job.part_number,)
+
+
+def schedule_folder(
+    scheduler: ResourceScheduler,
+    subdir: Path,
+    chapter_index: ChapterIndex,
+    grouping: GroupingPolicy | None,
+    rasterizer: PageRasterizer | None,
+    dedupe: DedupeOptions | None,
+    dry_run: bool,
+    policy: str,
+    base: tuple,
+    prefetched: Future | None,
+) -> None:
+    """
+    Disk job: groups one folder and loads its status, then queues its metadata lookup.
+    """
+    folder = prepare_manga_folder(
+        subdir, chapter_index, grouping, rasterizer, dedupe, dry_run
+    )
+    if folder:
+        scheduler.submit(
+            NETWORK,
+            resolve_folder,
+            scheduler,
+            folder,
+            dry_run,
+            policy,
+            base,
+            prefetched,
+            priority=base,
+        )
+
+
+def resolve_folder(
+    scheduler: ResourceScheduler,
+    folder: MangaFolder,
+    dry_run: bool,
+    policy: str,
+    base: tuple,
+    prefetched: Future | None,
+) -> None:
+    """
+    Network job: fetches metadata and the cover, then queues the packs of the folder.
+    """
+    if prefetched:
+        # The bulk prefetch fills the metadata cache; failed names are simply looked up again
+        prefetched.result()
+    folder.metadata, folder.cover_image_path = fetch_metadata_and_cover(
+        folder.cbz_files, folder.manga_name, dry_run
+    )
+    if not folder.metadata:
+        logging.error(
+            f"Failed to retrieve manga information from Jikan API for '{folder.manga_name}'."
+        )
+        return
+
+    display_manga_info(folder.metadata, folder.cover_image_path)
+    jobs = plan_pack_jobs(folder, dry_run)
+    if dry_run:
+        log_dry_run_packs(folder, jobs)
+        return
+
+    remaining = [len(jobs)]
+    remaining_lock = threading.Lock()
+
+    def pack_done() -> None:
+        with remaining_lock:
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished:
+            clean_cover_image(dry_run, folder.cover_image_path)
+            logging.info(f"All parts of '{folder.manga_name}' have been processed.")
+
+    if not jobs:
+        clean_cover_image(dry_run, folder.cover_image_path)
+        return
+    for job in jobs:
+        priority = pack_priority(base, job, policy)
+        scheduler.submit(
+            DISK,
+            combine_job,
+            scheduler,
+            folder,
+            job,
+            pack_done,
+            priority,
+            priority=priority,
+        )
+
+
+def combine_job(
+    scheduler: ResourceScheduler,
+    folder: MangaFolder,
+    job: PackJob,
+    pack_done,
+    priority: tuple,
+) -> None:
+    """
+    Disk job: builds one combined CBZ and queues its conversion.
+    """
+    try:
+        combined = combine_pack(folder, job)
+    except Exception:
+        pack_done()
+        raise
+    if combined:
+        scheduler.submit(CPU, convert_job, folder, job, pack_done, priority=priority)
+    else:
+        pack_done()
+
+
+def convert_job(folder: MangaFolder, job: PackJob, pack_done) -> None:
+    """
+    CPU job: converts one combined CBZ to MOBI with KCC.
+    """
+    try:
+        convert_pack(folder, job)
+    finally:
+        pack_done()
+
+
+def process_all_manga_folders(
+    parent_dir: Path,
+    dry_run: bool,
+    network_workers: int = NETWORK_WORKERS,
+    disk_workers: int = DISK_WORKERS,
+    cpu_workers: int = CPU_WORKERS,
+    priority: str = "name",
+    grouping: GroupingPolicy | None = None,
+    rasterizer: PageRasterizer | None = None,
+    dedupe: DedupeOptions | None = None,
+    folders: list[Path] | None = None,
+):
     """
-    Iterates over all subdirectories in `parent_dir` and processes each as a manga folder.
+    Turns every subdirectory of `parent_dir` (or only `folders`) into scheduler jobs.
+    Folder scans and pack combining run on the disk pool, Jikan lookups and cover
+    downloads on the network pool and KCC conversions on the CPU pool, so many
+    series progress at once and a slow series or lookup only holds up its own work.
     """
-    logging.info(f"Processing all folders in '{parent_dir}'...")
-    for subdir in parent_dir.iterdir():
+    if folders is None:
+        logging.info(f"Processing all folders in '{parent_dir}'...")
+        folders = list(parent_dir.iterdir())
+    manga_folders = {}
+    for subdir in sorted(folders):
         if subdir.is_dir():
             # Check if the subdir has .cbz files (optional)
-            cbz_files = list(subdir.glob("*.cbz"))
+            cbz_files = sorted(
+                subdir.glob("*.cbz"), key=lambda x: natural_sort_key(x.name)
+            )
             if cbz_files:
-                process_manga_folder(subdir, dry_run)
+                manga_folders[subdir] = cbz_files
             else:
                 logging.info(f"Skipping folder (no CBZ files found): {subdir}")
 
+    catalog = get_library_catalog() if not dry_run else None
+    if catalog:
+        removed = catalog.forget_missing(parent_dir)
+        if removed:
+            logging.info(f"Removed {removed} deleted archives from the library catalog.")
+
+    chapter_indexes = {
+        subdir: ChapterIndex(subdir, cbz_files)
+        for subdir, cbz_files in manga_folders.items()
+    }
+    # Resolve every series' metadata in bulk while the folders are being scanned
+    prefetched = start_prefetch(
+        [chapter_index.series_name for chapter_index in chapter_indexes.values()]
+    )
+
+    scheduler = ResourceScheduler(
+        {NETWORK: network_workers, DISK: disk_workers, CPU: cpu_workers}
+    )
+    try:
+        for position, (subdir, cbz_files) in enumerate(manga_folders.items()):
+            base = folder_priority(cbz_files, priority, position)
+            scheduler.submit(
+                DISK,
+                schedule_folder,
+                scheduler,
+                subdir,
+                chapter_indexes[subdir],
+                grouping,
+                rasterizer,
+                dedupe,
+                dry_run,
+                priority,
+                base,
+                prefetched.get(chapter_indexes[subdir].series_name),
+                priority=base,
+            )
+        scheduler.wait()
+    finally:
+        scheduler.shutdown()
+
+
+def watch_library(watcher: LibraryWatcher, parent_dir: Path, **options) -> None:
+    """
+    Processes series folders as soon as new chapters in them have finished arriving.
+    Only the affected folders are scanned, and only their stale packs are rebuilt.
+    """
+    logging.info("Waiting for new chapters...")
+    while True:
+        folders = watcher.wait_for_folders()
+        logging.info(f"New chapters in: {', '.join(folder.name for folder in folders)}")
+        process_all_manga_folders(parent_dir, folders=folders, **options)
+        logging.info("Waiting for new chapters...")
+
 
 def parse_arguments():
     """
@@ -39,6 +297,51 @@ def parse_arguments():
         action="store_true",
         help="Simulate processing without making any changes.",
     )
+    parser.add_argument(
+        "--network-workers",
+        type=int,
+        default=NETWORK_WORKERS,
+        help=f"Concurrent Jikan lookups and cover downloads. Default: {NETWORK_WORKERS}",
+    )
+    parser.add_argument(
+        "--disk-workers",
+        type=int,
+        default=DISK_WORKERS,
+        help=f"Concurrent folder scans and pack combines. Default: {DISK_WORKERS}",
+    )
+    parser.add_argument(
+        "--cpu-workers",
+        type=int,
+        default=CPU_WORKERS,
+        help=f"Concurrent KCC conversions. Default: {CPU_WORKERS}",
+    )
+    parser.add_argument(
+        "--priority",
+        choices=PRIORITY_POLICIES,
+        default="name",
+        help="Which series to work on first: by folder name, newest chapters first, or smallest series first. Default: name",
+    )
+    add_grouping_arguments(parser)
+    add_rasterize_arguments(parser)
+    add_dedupe_arguments(parser)
+    add_disk_arguments(parser)
+    add_tracing_arguments(parser)
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="After processing the library, keep running and process series folders as new chapters arrive.",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=WATCH_DEBOUNCE,
+        help=f"Seconds a folder must stay unchanged before --watch processes it. Default: {WATCH_DEBOUNCE}",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Make --watch poll the library instead of using inotify.",
+    )
     return parser.parse_args()
 
 
@@ -47,9 +350,32 @@ def main():
     args = parse_arguments()
     dry_run = args.dry_run
     root_folder_path = Path(args.root_folder_path)
-    process_all_manga_folders(root_folder_path, dry_run=dry_run)
-
-    logging.info("All manga folders have been processed.")
+    set_disk_admission(DiskAdmission.from_args(args))
+    set_memory_staging(MemoryStaging.from_args(args))
+    with tracing(args.trace), (
+        PageRasterizer(workers=args.rasterize_workers)
+        if args.rasterize
+        else nullcontext()
+    ) as rasterizer, (
+        # Started before the first pass so chapters arriving during it are not missed
+        LibraryWatcher(root_folder_path, args.debounce, use_inotify=not args.poll)
+        if args.watch
+        else nullcontext()
+    ) as watcher:
+        options = dict(
+            dry_run=dry_run,
+            network_workers=args.network_workers,
+            disk_workers=args.disk_workers,
+            cpu_workers=args.cpu_workers,
+            priority=args.priority,
+            grouping=GroupingPolicy.from_args(args),
+            rasterizer=rasterizer,
+            dedupe=DedupeOptions.from_args(args) if args.dedupe else None,
+        )
+        process_all_manga_folders(root_folder_path, **options)
+        logging.info("All manga folders have been processed.")
+        if watcher:
+            watch_library(watcher, root_folder_path, **options)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
 import sys
 from pathlib import Path
+import time
 
 # Determine the project root based on the script's location
 project_root = Path(__file__).resolve().parent.parent
@@ -10,33 +14,54 @@ project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(project_root))
 
 import logging
-from src.constants import CHAPTERS_PER_PART, STATUS_FILE
-from src.cbz_convertor import convert_cbz_to_mobi
+from src.constants import (
+    CHAPTERS_PER_PART,
+    COMBINE_WORKERS,
+    CONVERT_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    STATUS_FILE,
+)
+from src.admission import (
+    DiskAdmission,
+    MemoryStaging,
+    combine_footprint,
+    convert_footprint,
+    get_disk_admission,
+    get_memory_staging,
+    set_disk_admission,
+    set_memory_staging,
+)
+from src.catalog import ArchiveManifest, load_manifests
+from src.cbz_convertor import build_kcc_options, convert_cbz_to_mobi
+from src.dedupe import DedupeOptions, find_duplicate_pages, log_removed_pages
 from src.extractor import extract_and_save_cover_image
-from src.grouper import combine_to_cbz, group_cbz_into_packs
-from src.parser import get_manga_name, parse_chapter_number
+from src.fingerprint import (
+    conversion_fingerprint,
+    describe_input_changes,
+    fingerprint_of,
+    pack_inputs,
+)
+from src.grouper import GroupingPolicy, combine_to_cbz, group_cbz_into_packs
+from src.job_queue import get_conversion_queue, run_conversion_job
+from src.parser import ChapterIndex
+from src.pipeline import run_pipeline
+from src.rasterizer import PageRasterizer
+from src.tracing import span, tracing
 from src.utils import (
     check_kcc_installed,
     clean_cover_image,
     create_output_folder,
-    generate_chapter_range,
     get_sorted_cbz_files,
     parse_arguments,
     setup_logging,
 )
 from src.manga_info import fetch_manga_info_jikan
 from src.state_manager import (
+    StatusStore,
     load_status,
-    part_already_converted_to_mobi,
     update_conversion_status,
     update_status,
 )
-from rich.console import Console
-from rich.table import Table
-from rich.text import Text
-from textual_image.renderable import Image
-
-console = Console()
 
 
 def create_ascii_art(image_path: Path):
@@ -59,6 +84,12 @@ def display_manga_info(metadata: dict, ascii_art_path):
         "cover_image_url": cover_image_url,
     }
     """
+    # Imported here: rich and textual_image are only needed once a folder is displayed
+    from rich.console import Console
+    from rich.table import Table
+    from rich.text import Text
+    from textual_image.renderable import Image
+
     table = Table(
         title="📚 Manga Information",
         show_header=True,
@@ -82,154 +113,544 @@ def display_manga_info(metadata: dict, ascii_art_path):
     table.add_row("ASCII Art", Image(ascii_art_path))
 
     # Display the table and ASCII art side by side
-    console.print(table)
+    Console().print(table)
     # Add additional fields as needed
     # Example: table.add_row("Publication Date", metadata.get("publication_date", "N/A"))
 
 
-def process_manga_folder(dir: Path, dry_run: bool) -> None:
+@dataclass
+class PackJob:
+    """
+    One pack of chapters on its way through the combine and convert stages.
+    """
+
+    part_number: int
+    total_parts: int
+    cbz_files: list[Path]
+    chapter_range: str
+    output_cbz_path: Path
+    title: str
+    # Taken from the library catalog; used to report and verify the combined CBZ
+    page_count: int = 0
+    image_bytes: int = 0
+    removed_pages: int = 0
+    # Filled in by assess_pack_job from the recorded fingerprints
+    needs_combine: bool = True
+    needs_convert: bool = True
+    inputs: dict | None = None
+    fingerprint: str | None = None
+    convert_fingerprint: str | None = None
+    reasons: list[str] = field(default_factory=list)
+
+
+@dataclass
+class MangaFolder:
+    """
+    Everything known about one manga folder while its packs are processed.
+    """
+
+    dir: Path
+    manga_name: str
+    cbz_files: list[Path]
+    chapter_index: ChapterIndex
+    cbz_packs: list[list[Path]]
+    converted_output_dir: Path
+    status: StatusStore
+    metadata: dict | None = None
+    cover_image_path: Path | None = None
+    manifests: dict[Path, ArchiveManifest] = field(default_factory=dict)
+    rasterizer: PageRasterizer | None = None
+    dedupe: DedupeOptions | None = None
+    # Page thumbnails per chapter, shared by the dedupe runs of every pack
+    page_thumbnails: dict = field(default_factory=dict)
+
+
+def find_manga(dir: Path) -> ChapterIndex | None:
+    """
+    Lists the CBZ files of a folder and indexes their chapter numbers and manga name.
+    Returns None if the folder cannot be processed.
+    """
     logging.info(f"Scanning directory: {dir}")
 
     cbz_files = get_sorted_cbz_files(dir)
     if not cbz_files:
         logging.error("No CBZ files found in the current directory.")
-        return
+        return None
 
-    manga_name = get_manga_name(dir, cbz_files)
-    if not manga_name:
+    chapter_index = ChapterIndex(dir, cbz_files)
+    if not chapter_index.series_name:
         logging.error("Unable to determine manga name from the CBZ files.")
-        return
-    logging.debug(f"Possible manga name: '{manga_name}'")
+        return None
+    logging.debug(f"Possible manga name: '{chapter_index.series_name}'")
+    return chapter_index
+
+
+def prepare_manga_folder(
+    dir: Path,
+    chapter_index: ChapterIndex,
+    grouping: GroupingPolicy | None = None,
+    rasterizer: PageRasterizer | None = None,
+    dedupe: DedupeOptions | None = None,
+    dry_run: bool = False,
+) -> MangaFolder:
+    """
+    Groups the chapters into packs, loads the processing status of the folder and
+    the page manifests of its chapters from the library catalog. A dry run only
+    reads the status and the catalog.
+    """
+    chapter_index.log_summary()
+    cbz_files = chapter_index.paths
+    with span("folder_scan", folder=chapter_index.series_name, chapters=len(cbz_files)):
+        manifests = load_manifests(cbz_files, dry_run)
+        cbz_packs = group_cbz_into_packs(
+            cbz_files,
+            chapters_per_part=CHAPTERS_PER_PART,
+            chapter_index=chapter_index,
+            policy=grouping,
+            manifests=manifests,
+        )
+    logging.info(
+        f"Catalogued {sum(m.page_count for m in manifests.values())} pages in {len(manifests)} chapters."
+    )
+
+    converted_output_folder = create_output_folder(dir)
+    status = load_status(dir, STATUS_FILE, dry_run)
+    processed_status = status.processed_parts() or "None"
+    converted_status = status.converted_parts() or "None"
+    logging.info(f"Processed: {processed_status}")
+    logging.info(f"Converted: {converted_status}")
+
+    return MangaFolder(
+        dir=dir,
+        manga_name=chapter_index.series_name,
+        cbz_files=cbz_files,
+        chapter_index=chapter_index,
+        cbz_packs=cbz_packs,
+        converted_output_dir=converted_output_folder,
+        status=status,
+        manifests=manifests,
+        rasterizer=rasterizer,
+        dedupe=dedupe,
+    )
+
+
+def fetch_metadata_and_cover(
+    cbz_files: list[Path], manga_name: str, dry_run: bool
+) -> tuple[dict | None, Path | None]:
+    """
+    Looks up the manga on Jikan and then fetches its cover image.
+    Returns a (metadata, cover_image_path) tuple; metadata is None if the lookup failed.
+    """
     logging.info(f"Fetching metadata on Jikan for '{manga_name}'...")
-    metadata = fetch_manga_info_jikan(manga_name)
+    with span("metadata_fetch", folder=manga_name):
+        metadata = fetch_manga_info_jikan(manga_name)
     if not metadata:
-        logging.error("Failed to retrieve manga information from Jikan API.")
-        return
+        return None, None
 
+    if dry_run:
+        return metadata, None
     # Get the cover image as a Path (from the first CBZ)
-    cover_image_path = (
-        extract_and_save_cover_image(
+    with span("cover_fetch", folder=manga_name):
+        cover_image_path = extract_and_save_cover_image(
             cbz_files,
             manga_name,
             fetch=True,
             cover_image_url=metadata["cover_image_url"],
         )
-        if not dry_run
-        else None
-    )
+    return metadata, cover_image_path
+
+
+def process_manga_folder(
+    dir: Path,
+    dry_run: bool,
+    combine_workers: int = COMBINE_WORKERS,
+    convert_workers: int = CONVERT_WORKERS,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    grouping: GroupingPolicy | None = None,
+    rasterizer: PageRasterizer | None = None,
+    dedupe: DedupeOptions | None = None,
+) -> None:
+    chapter_index = find_manga(dir)
+    if not chapter_index:
+        return
 
-    display_manga_info(metadata, cover_image_path)
-    cbz_packs = group_cbz_into_packs(cbz_files, chapters_per_part=CHAPTERS_PER_PART)
+    # The Jikan lookup and cover download run in the background while packs are grouped locally
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="metadata") as executor:
+        metadata_future = executor.submit(
+            fetch_metadata_and_cover,
+            chapter_index.paths,
+            chapter_index.series_name,
+            dry_run,
+        )
+        folder = prepare_manga_folder(
+            dir, chapter_index, grouping, rasterizer, dedupe, dry_run
+        )
+        folder.metadata, folder.cover_image_path = metadata_future.result()
 
-    total_num_of_packs = len(cbz_packs)
+    if not folder.metadata:
+        logging.error("Failed to retrieve manga information from Jikan API.")
+        return
 
-    converted_output_folder = create_output_folder(dir)
-    status, status_file_path = load_status(dir, STATUS_FILE)
-    processed_status = (
-        "None" if not status["processed_cbz_parts"] else status["processed_cbz_parts"]
-    )
-    converted_status = (
-        "None" if not status["converted_mobi_parts"] else status["converted_mobi_parts"]
-    )
-    logging.info(f"Processed: {processed_status}")
-    logging.info(f"Converted: {converted_status}")
+    display_manga_info(folder.metadata, folder.cover_image_path)
 
-    author_str = metadata["author"]
     process_packs(
+        folder,
         dry_run,
-        manga_name,
-        metadata,
-        author_str,
-        cbz_packs,
-        total_num_of_packs,
-        converted_output_folder,
-        status_file_path,
-        status,
-        cover_image_path,
+        combine_workers=combine_workers,
+        convert_workers=convert_workers,
+        queue_size=queue_size,
     )
 
-    clean_cover_image(dry_run, cover_image_path)
+    clean_cover_image(dry_run, folder.cover_image_path)
     logging.info("All parts have been processed and converted successfully.")
 
 
-def process_packs(
-    dry_run,
-    manga_name,
-    metadata,
-    author_str,
-    parts,
-    total_parts,
-    converted_output_dir,
-    status_file_path,
-    status,
-    cover_image_path,
-):
-    for part_number, part_cbz_files in enumerate(parts, start=1):
-        logging.info(
-            f"Processing Part {part_number}/{total_parts} with {len(part_cbz_files)} chapters."
+def plan_pack_jobs(folder: MangaFolder, dry_run: bool = False) -> list[PackJob]:
+    """
+    Works out the chapter range and output path of every pack, and which packs
+    are stale compared to what the status database recorded for them.
+    """
+    jobs = []
+    total_parts = len(folder.cbz_packs)
+    for part_number, part_cbz_files in enumerate(folder.cbz_packs, start=1):
+        chapter_range = folder.chapter_index.chapter_range(part_cbz_files, part_number)
+        title = f"{folder.manga_name} {chapter_range}"
+        jobs.append(
+            PackJob(
+                part_number=part_number,
+                total_parts=total_parts,
+                cbz_files=part_cbz_files,
+                chapter_range=chapter_range,
+                output_cbz_path=folder.converted_output_dir / f"{title}.cbz",
+                title=title,
+                page_count=sum(
+                    folder.manifests[cbz].page_count
+                    for cbz in part_cbz_files
+                    if cbz in folder.manifests
+                ),
+                image_bytes=sum(
+                    folder.manifests[cbz].image_bytes
+                    for cbz in part_cbz_files
+                    if cbz in folder.manifests
+                ),
+            )
         )
 
-        chapter_numbers = [
-            parse_chapter_number(cbz.name) or 0 for cbz in part_cbz_files
-        ]
+    for job in jobs:
+        assess_pack_job(folder, job, dry_run)
+        if job.reasons:
+            logging.info(
+                f"Part {job.part_number} ({job.chapter_range}) needs "
+                f"{'rebuilding' if job.needs_combine else 'converting'}: {'; '.join(job.reasons)}."
+            )
+    stale = sum(1 for job in jobs if job.needs_combine or job.needs_convert)
+    logging.info(f"{stale} of {len(jobs)} parts need work.")
+    return jobs
+
+
+def page_processing_settings(folder: MangaFolder) -> dict | None:
+    """
+    Describes the optional page stages that change a pack's contents, or None without any.
+    """
+    settings = dict(folder.rasterizer.settings) if folder.rasterizer else {}
+    if folder.dedupe:
+        settings["dedupe"] = folder.dedupe.settings
+    return settings or None
+
 
-        logging.info(f"Chapter numbers: {chapter_numbers}")
-        chapter_range = generate_chapter_range(chapter_numbers)
+def assess_pack_job(folder: MangaFolder, job: PackJob, dry_run: bool = False) -> None:
+    """
+    Fingerprints the inputs of a pack (chapter files, cover, metadata and KCC
+    arguments) and compares them with the recorded ones, so only stale packs are
+    combined or converted again. The reasons are kept on the job for reporting.
+    """
+    part = folder.status.part(job.chapter_range)
+    job.inputs = pack_inputs(
+        job.cbz_files,
+        folder.cover_image_path,
+        folder.metadata,
+        page_processing_settings(folder),
+    )
+    if dry_run and part and part["inputs"]:
+        # Covers are not fetched in dry runs; assume the recorded one is still current
+        job.inputs["cover"] = part["inputs"].get("cover")
+    job.fingerprint = fingerprint_of(job.inputs)
+    job.convert_fingerprint = conversion_fingerprint(
+        job.fingerprint, build_kcc_options(folder.metadata["author"], job.title)
+    )
 
-        output_cbz_name = f"{manga_name} {chapter_range}.cbz"
-        output_cbz_path = converted_output_dir / output_cbz_name
+    if not part or not part["processed"]:
+        job.reasons = ["new pack"]
+        return
+
+    if part["inputs"] is None:
+        # Recorded before fingerprints existed (e.g. migrated from JSON): trust the flags
+        job.needs_combine = False
+        job.needs_convert = not part["converted"]
+    elif part["fingerprint"] != job.fingerprint:
+        job.reasons = describe_input_changes(part["inputs"], job.inputs)
+        return
+    else:
+        job.needs_combine = False
+        job.needs_convert = (
+            not part["converted"]
+            or part["convert_fingerprint"] != job.convert_fingerprint
+        )
 
-        if dry_run:
-            if part_number in status.get("processed_cbz_parts", []):
-                logging.info(
-                    "[Dry Run] Already processed CBZ, would skip CBZ combining for this part."
+    if not job.needs_convert:
+        return
+    job.reasons = [
+        "not converted yet" if not part["converted"] else "converter arguments changed"
+    ]
+    if not job.output_cbz_path.exists():
+        job.needs_combine = True
+        job.reasons.append("combined CBZ missing")
+
+
+def log_dry_run_packs(folder: MangaFolder, jobs: list[PackJob]) -> None:
+    for job in jobs:
+        logging.info(
+            f"Processing Part {job.part_number}/{job.total_parts} with {len(job.cbz_files)} chapters, "
+            f"{job.page_count} pages ({job.image_bytes / 1024 / 1024:.1f} MB)."
+        )
+        if not job.needs_combine:
+            logging.info(
+                "[Dry Run] Already processed CBZ, would skip CBZ combining for this part."
+            )
+        if job.needs_combine or job.needs_convert:
+            logging.info(f"[Dry Run] Would process chapters {job.chapter_range}.")
+        else:
+            logging.info(f"[Dry Run] Chapters {job.chapter_range} are up to date.")
+
+
+def combine_pack(folder: MangaFolder, job: PackJob) -> bool:
+    """
+    Builds the combined CBZ of one pack and records it in the status file.
+    Returns True if the pack is ready for conversion.
+    """
+    with span("combine_pack", folder=folder.manga_name, pack=job.chapter_range):
+        logging.info(
+            f"Processing Part {job.part_number}/{job.total_parts} with {len(job.cbz_files)} chapters."
+        )
+        if not job.needs_combine:
+            logging.info(
+                f"Chapters {job.chapter_range} already combined into CBZ. Skipping CBZ combining."
+            )
+            return True
+
+        started = time.perf_counter()
+        skip_pages = set()
+        if folder.dedupe:
+            with span("dedupe"):
+                first_chapter = folder.cbz_files.index(job.cbz_files[0])
+                removed = find_duplicate_pages(
+                    job.cbz_files,
+                    folder.dedupe,
+                    folder.manifests,
+                    earlier_files=folder.cbz_files[:first_chapter],
+                    thumbnail_cache=folder.page_thumbnails,
                 )
-            logging.info(f"[Dry Run] Would process chapters {chapter_range}.")
-            continue
+            log_removed_pages(job.title, removed)
+            skip_pages = {(page.cbz_path, page.name) for page in removed}
+            job.removed_pages = len(skip_pages)
 
-        success = combine_to_cbz(
-            status,
-            status_file_path,
-            chapter_range,
-            part_cbz_files,
-            output_cbz_path,
-            output_cbz_name,
-            cover_image_path,
+        footprint = combine_footprint(
+            [folder.manifests[cbz] for cbz in job.cbz_files], folder.cover_image_path
         )
+        with get_disk_admission().reserve(
+            {job.output_cbz_path.parent: footprint}, job.output_cbz_path.name
+        ), get_memory_staging().stage(footprint) as in_memory:
+            success = combine_to_cbz(
+                folder.status,
+                job.chapter_range,
+                job.cbz_files,
+                job.output_cbz_path,
+                folder.cover_image_path,
+                metadata=folder.metadata,
+                force=True,
+                rasterizer=folder.rasterizer,
+                skip_pages=skip_pages,
+                in_memory=in_memory,
+            )
         if not success:
-            logging.error(f"Failed to create '{output_cbz_name}'.")
-            continue
+            logging.error(f"Failed to create '{job.output_cbz_path.name}'.")
+            return False
+        if not verify_pack_cbz(folder, job):
+            return False
 
         # Update status using chapter_range as key
-        update_status(status_file_path, status, chapter_range)
+        update_status(
+            folder.status,
+            job.chapter_range,
+            fingerprint=job.fingerprint,
+            inputs=job.inputs,
+            cbz_size=job.output_cbz_path.stat().st_size,
+            combine_seconds=time.perf_counter() - started,
+        )
+        retire_superseded_parts(folder, job)
+        return True
+
+
+def retire_superseded_parts(folder: MangaFolder, job: PackJob) -> None:
+    """
+    Removes the outputs and status of earlier packs whose chapters all belong to
+    `job` now, such as the previous last pack of a series that gained chapters,
+    so they are not left behind under an outdated chapter range.
+    """
+    chapters = {cbz.name for cbz in job.cbz_files}
+    for part in folder.status.parts():
+        if part["chapter_range"] == job.chapter_range or not part["inputs"]:
+            continue
+        names = {chapter["name"] for chapter in part["inputs"]["chapters"]}
+        if not names or not names <= chapters:
+            continue
+        old_cbz_path = (
+            folder.converted_output_dir
+            / f"{folder.manga_name} {part['chapter_range']}.cbz"
+        )
+        for path in (old_cbz_path, old_cbz_path.with_suffix(".mobi")):
+            path.unlink(missing_ok=True)
+        folder.status.forget(part["chapter_range"])
+        logging.info(
+            f"Removed part {part['chapter_range']}, superseded by {job.chapter_range}."
+        )
+
 
-        if part_already_converted_to_mobi(status, chapter_range):
+def verify_pack_cbz(folder: MangaFolder, job: PackJob) -> bool:
+    """
+    Checks that the combined CBZ holds every catalogued page of the pack (plus the
+    cover) by reading its central directory, which also catalogues the new archive.
+    Pages dropped as duplicates are not expected.
+    """
+    expected = job.page_count - job.removed_pages
+    if folder.cover_image_path and folder.cover_image_path.exists():
+        expected += 1
+    manifest = load_manifests([job.output_cbz_path])[job.output_cbz_path]
+    if manifest.error or manifest.page_count != expected:
+        logging.error(
+            f"'{job.output_cbz_path.name}' holds {manifest.page_count} images, expected {expected}."
+        )
+        return False
+    return True
+
+
+def convert_pack(folder: MangaFolder, job: PackJob) -> bool:
+    """
+    Converts the combined CBZ of one pack to MOBI unless an up-to-date conversion exists.
+    Returns True if the pack ends up converted.
+    """
+    with span("convert_pack", folder=folder.manga_name, pack=job.chapter_range):
+        if not job.needs_convert:
             logging.info(
-                f"Chapters {chapter_range} already converted to MOBI. Skipping conversion."
+                f"Chapters {job.chapter_range} already converted to MOBI. Skipping conversion."
             )
-            continue
+            return True
+
+        # KCC works next to the CBZ: its work folder, then the EPUB and the MOBI
+        footprint = convert_footprint(
+            job.image_bytes, job.output_cbz_path.stat().st_size
+        )
+        with get_disk_admission().reserve(
+            {job.output_cbz_path.parent: footprint}, job.output_cbz_path.name
+        ):
+            success = run_pack_conversion(folder, job)
 
+        if not success:
+            logging.error(f"Failed to convert Part {job.part_number} to MOBI.")
+        return success
+
+
+def run_pack_conversion(folder: MangaFolder, job: PackJob) -> bool:
+    """
+    Runs KCC on the combined CBZ of one pack, through the conversion queue when
+    it is available, and records the conversion in the status file.
+    """
+    queue = get_conversion_queue()
+    if queue is None:
+        started = time.perf_counter()
         success = convert_cbz_to_mobi(
             project_root,
-            output_cbz_path,
-            author=author_str,
-            title=f"{manga_name} {chapter_range}",
-            metadata=metadata,
+            job.output_cbz_path,
+            author=folder.metadata["author"],
+            title=job.title,
+            metadata=folder.metadata,
         )
-
         if success:
-            update_conversion_status(status_file_path, status, chapter_range)
-        else:
-            logging.error(f"Failed to convert Part {part_number} to MOBI.")
+            mobi_path = job.output_cbz_path.with_suffix(".mobi")
+            update_conversion_status(
+                folder.status,
+                job.chapter_range,
+                convert_fingerprint=job.convert_fingerprint,
+                mobi_size=mobi_path.stat().st_size if mobi_path.exists() else None,
+                convert_seconds=time.perf_counter() - started,
+            )
+    else:
+        queued = queue.enqueue(
+            job.output_cbz_path,
+            author=folder.metadata["author"],
+            title=job.title,
+            metadata=folder.metadata,
+            status_db=folder.status.path,
+            chapter_range=job.chapter_range,
+            convert_fingerprint=job.convert_fingerprint,
+        )
+        success = bool(queued) and run_conversion_job(
+            queue, queued, project_root, status=folder.status
+        )
+    return success
+
+
+def process_packs(
+    folder: MangaFolder,
+    dry_run: bool,
+    combine_workers: int = COMBINE_WORKERS,
+    convert_workers: int = CONVERT_WORKERS,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+):
+    """
+    Combines and converts every pack. Combining (disk-bound) and KCC conversion
+    (CPU-bound) run as separate pipeline stages, so the next pack is built while
+    the previous one is being converted.
+    """
+    jobs = plan_pack_jobs(folder, dry_run)
+
+    if dry_run:
+        log_dry_run_packs(folder, jobs)
+        return
+
+    run_pipeline(
+        jobs,
+        [
+            ("combine", lambda job: combine_pack(folder, job), combine_workers),
+            ("convert", lambda job: convert_pack(folder, job), convert_workers),
+        ],
+        queue_size=queue_size,
+    )
 
 
 def main() -> None:
     setup_logging(verbose=False)
-    check_kcc_installed(project_root)
     args = parse_arguments()
+    check_kcc_installed(project_root)
     directory = Path(args.root_folder_path).resolve()
     dry_run = args.dry_run
-    process_manga_folder(directory, dry_run)
+    set_disk_admission(DiskAdmission.from_args(args))
+    set_memory_staging(MemoryStaging.from_args(args))
+    with tracing(args.trace), (
+        PageRasterizer(workers=args.rasterize_workers)
+        if args.rasterize
+        else nullcontext()
+    ) as rasterizer:
+        process_manga_folder(
+            directory,
+            dry_run,
+            combine_workers=args.combine_workers,
+            convert_workers=args.convert_workers,
+            queue_size=args.queue_size,
+            grouping=GroupingPolicy.from_args(args),
+            rasterizer=rasterizer,
+            dedupe=DedupeOptions.from_args(args) if args.dedupe else None,
+        )
 
 
 if __name__ == "__main__":
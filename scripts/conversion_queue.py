@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import argparse
+from datetime import datetime
+import sys
+from pathlib import Path
+
+# Determine the project root based on the script's location
+project_root = Path(__file__).resolve().parent.parent
+
+# Add the project root to sys.path
+sys.path.append(str(project_root))
+
+from src.job_queue import (
+    FAILED,
+    JOB_STATES,
+    QUEUED,
+    ConversionQueue,
+    run_conversion_job,
+)
+from src.utils import check_kcc_installed, setup_logging
+
+
+def describe_job(job) -> str:
+    when = job.finished_at or job.started_at or job.created_at
+    timestamp = datetime.fromtimestamp(when).strftime("%Y-%m-%d %H:%M")
+    details = [f"attempt {job.attempts}/{job.max_attempts}"]
+    if job.owner:
+        details.append(f"by {job.owner}")
+    if job.error:
+        details.append(job.error)
+    return f"#{job.id} [{job.state}] {job.cbz_path.name} ({timestamp}, {', '.join(details)})"
+
+
+def list_jobs(queue: ConversionQueue, args) -> int:
+    jobs = queue.jobs(tuple(args.state) if args.state else None)
+    for job in jobs:
+        print(describe_job(job))
+    print(f"\n{len(jobs)} job{'' if len(jobs) == 1 else 's'}.")
+    return 0
+
+
+def show_job(queue: ConversionQueue, args) -> int:
+    job = queue.job(args.job_id)
+    if not job:
+        print(f"No job #{args.job_id}.")
+        return 1
+    print(describe_job(job))
+    print(f"CBZ: {job.cbz_path}")
+    if job.returncode is not None:
+        print(f"Exit code: {job.returncode}")
+    if job.output:
+        print(f"\n{job.output}")
+    return 0
+
+
+def requeue_jobs(queue: ConversionQueue, args) -> int:
+    job_ids = list(args.job_ids)
+    if args.failed:
+        job_ids += [job.id for job in queue.jobs((FAILED,))]
+    if not job_ids:
+        print("No jobs to requeue.")
+        return 1
+    print(f"Requeued {queue.requeue(job_ids)} jobs.")
+    return 0
+
+
+def run_jobs(queue: ConversionQueue, args) -> int:
+    check_kcc_installed(project_root)
+    queue.recover_orphans()
+    jobs = queue.jobs((QUEUED,))
+    if args.limit:
+        jobs = jobs[: args.limit]
+    failed = 0
+    for job in jobs:
+        if not run_conversion_job(queue, job, project_root):
+            failed += 1
+    print(f"Ran {len(jobs)} jobs, {failed} failed.")
+    return 1 if failed else 0
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments.
+
+    :return: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Inspect, requeue and resume KCC conversion jobs."
+    )
+    parser.add_argument(
+        "--queue-file",
+        type=str,
+        default=None,
+        help="Path to the queue database. Default: conversion_queue.sqlite3 in the cache directory.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="List conversion jobs.")
+    list_parser.add_argument(
+        "--state",
+        choices=JOB_STATES,
+        action="append",
+        help="Only list jobs in this state. May be repeated.",
+    )
+    list_parser.set_defaults(handler=list_jobs)
+
+    show_parser = subparsers.add_parser(
+        "show", help="Show a job with the captured KCC output of its last run."
+    )
+    show_parser.add_argument("job_id", type=int, help="Job number.")
+    show_parser.set_defaults(handler=show_job)
+
+    requeue_parser = subparsers.add_parser(
+        "requeue", help="Queue jobs again with a fresh set of attempts."
+    )
+    requeue_parser.add_argument("job_ids", type=int, nargs="*", help="Job numbers.")
+    requeue_parser.add_argument(
+        "--failed", action="store_true", help="Requeue every failed job."
+    )
+    requeue_parser.set_defaults(handler=requeue_jobs)
+
+    run_parser = subparsers.add_parser(
+        "run", help="Run queued jobs, including those interrupted by a crash."
+    )
+    run_parser.add_argument(
+        "--limit", type=int, default=None, help="Run at most this many jobs."
+    )
+    run_parser.set_defaults(handler=run_jobs)
+    return parser.parse_args()
+
+
+def main() -> int:
+    setup_logging(verbose=False)
+    args = parse_arguments()
+    queue = ConversionQueue(args.queue_file)
+    return args.handler(queue, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,65 +1,188 @@
-import os
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import sys
+from pathlib import Path
 import zipfile
-import shutil
+
+# Determine the project root based on the script's location
+project_root = Path(__file__).resolve().parent.parent
+
+# Add the project root to sys.path
+sys.path.append(str(project_root))
+
+from src.archive import ParallelZipWriter, get_sorted_image_entries
+from src.constants import FIX_WORKERS, ZIP_WORKERS
+from src.utils import natural_sort_key, setup_logging
+
+FIXED_SUFFIX = "_fixed"
+
+
+def is_flat(image_entries: list[zipfile.ZipInfo]) -> bool:
+    """
+    True if every image sits at the root of the archive, judging by the central directory only.
+    """
+    return all("/" not in info.filename.strip("/") for info in image_entries)
+
+
+def fix_cbz_structure(
+    input_cbz_path: Path, output_cbz_path: Path, zip_workers: int = ZIP_WORKERS
+) -> bool:
+    """
+    Streams the images of a CBZ into a flat archive, in natural reading order and
+    renamed sequentially ('0000.jpg', '0001.png', ...). Compressed data is copied
+    across without extracting anything to disk; entries in other compression
+    methods are re-encoded on a pool of `zip_workers` threads. The output is written next to its
+    final path and only moved into place once complete.
+    Returns True if a fixed archive was written.
+    """
+    partial_path = output_cbz_path.with_name(output_cbz_path.name + ".part")
+    try:
+        with zipfile.ZipFile(input_cbz_path, "r") as source, zipfile.ZipFile(
+            partial_path, "w"
+        ) as target, ParallelZipWriter(target, workers=zip_workers) as writer:
+            entries = get_sorted_image_entries(source)
+            if not entries:
+                logging.warning(f"No images found in '{input_cbz_path.name}'.")
+                return False
+            for i, info in enumerate(entries):
+                # Create sequential file names
+                writer.copy_entry(source, info, f"{i:04}{Path(info.filename).suffix}")
+        partial_path.replace(output_cbz_path)
+    except zipfile.BadZipFile:
+        logging.error(f"Failed to read '{input_cbz_path.name}': Bad zip file.")
+        return False
+    except Exception as e:
+        logging.error(f"Failed to fix '{input_cbz_path.name}': {e}")
+        return False
+    finally:
+        partial_path.unlink(missing_ok=True)
+
+    logging.info(f"Fixed CBZ file created at: {output_cbz_path}")
+    return True
 
 
-def fix_cbz_structure(input_cbz_path, output_cbz_path, temp_dir="temp_cbz"):
-    # Step 1: Extract the CBZ file
-    with zipfile.ZipFile(input_cbz_path, "r") as zip_ref:
-        zip_ref.extractall(temp_dir)
+def fix_cbz_file(
+    cbz_path: Path, in_place: bool, force: bool, zip_workers: int = ZIP_WORKERS
+) -> str:
+    """
+    Fixes one CBZ unless it is already flat (or already fixed).
+    Returns 'fixed', 'skipped' or 'failed'.
+    """
+    output_cbz_path = (
+        cbz_path if in_place else cbz_path.with_name(f"{cbz_path.stem}{FIXED_SUFFIX}.cbz")
+    )
+    if (
+        not force
+        and not in_place
+        and output_cbz_path.exists()
+        and output_cbz_path.stat().st_mtime >= cbz_path.stat().st_mtime
+    ):
+        logging.debug(f"'{cbz_path.name}' was already fixed, skipping.")
+        return "skipped"
 
-    # Step 2: Flatten the directory structure
-    all_images = []
-    for root, _, files in os.walk(temp_dir):
-        for file in files:
-            if file.lower().endswith((".jpg", ".jpeg", ".png", ".gif")):
-                all_images.append(os.path.join(root, file))
+    if not force:
+        try:
+            with zipfile.ZipFile(cbz_path, "r") as zip_ref:
+                flat = is_flat(get_sorted_image_entries(zip_ref))
+        except zipfile.BadZipFile:
+            logging.error(f"Failed to read '{cbz_path.name}': Bad zip file.")
+            return "failed"
+        if flat:
+            logging.debug(f"'{cbz_path.name}' is already flat, skipping.")
+            return "skipped"
 
-    # Step 3: Sort images by file name (to maintain reading order)
-    all_images.sort()
+    logging.info(f"Processing: {cbz_path}")
+    fixed = fix_cbz_structure(cbz_path, output_cbz_path, zip_workers)
+    return "fixed" if fixed else "failed"
 
-    # Step 4: Create a new flat folder for the fixed structure
-    fixed_dir = os.path.join(temp_dir, "fixed")
-    os.makedirs(fixed_dir, exist_ok=True)
 
-    for i, img_path in enumerate(all_images):
-        # Create sequential file names
-        ext = os.path.splitext(img_path)[1]
-        new_name = f"{i:04}{ext}"
-        shutil.copy(img_path, os.path.join(fixed_dir, new_name))
+def process_cbz_in_folder(
+    folder_path: Path,
+    workers: int = FIX_WORKERS,
+    in_place: bool = False,
+    force: bool = False,
+) -> dict[str, int]:
+    """
+    Fixes every CBZ of a folder with a pool of workers. The ZIP_WORKERS
+    compression threads are split between them, so concurrent archives do not
+    multiply the thread count.
+    Returns how many archives were fixed, skipped and failed.
+    """
+    # Get all .cbz files in the folder, leaving out the output of earlier runs
+    cbz_files = sorted(
+        (
+            cbz
+            for cbz in folder_path.glob("*.cbz")
+            if not cbz.stem.endswith(FIXED_SUFFIX)
+        ),
+        key=lambda x: natural_sort_key(x.name),
+    )
+    logging.info(f"Found {len(cbz_files)} CBZ files in '{folder_path}'.")
 
-    # Step 5: Create a new CBZ file
-    with zipfile.ZipFile(output_cbz_path, "w") as zip_ref:
-        for root, _, files in os.walk(fixed_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(
-                    file_path, fixed_dir
-                )  # Relative path inside the zip
-                zip_ref.write(file_path, arcname)
+    counts = {"fixed": 0, "skipped": 0, "failed": 0}
+    zip_workers = max(1, ZIP_WORKERS // max(1, workers))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fix") as executor:
+        for result in executor.map(
+            lambda cbz: fix_cbz_file(cbz, in_place, force, zip_workers), cbz_files
+        ):
+            counts[result] += 1
 
-    # Step 6: Clean up temporary files
-    shutil.rmtree(temp_dir)
-    print(f"Fixed CBZ file created at: {output_cbz_path}")
+    logging.info(
+        f"Fixed {counts['fixed']}, skipped {counts['skipped']} (already flat or fixed), "
+        f"{counts['failed']} failed."
+    )
+    return counts
 
 
-def process_cbz_in_folder(folder_path):
-    # Get all .cbz files in the folder
-    cbz_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".cbz")]
+def parse_arguments():
+    """
+    Parse command-line arguments.
 
-    for cbz_file in cbz_files:
-        input_cbz_path = os.path.join(folder_path, cbz_file)
-        output_cbz_path = os.path.join(
-            folder_path, f"{os.path.splitext(cbz_file)[0]}_fixed.cbz"
-        )
+    :return: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Flatten the folder structure of CBZ files and number their images in reading order."
+    )
+    parser.add_argument(
+        "folder_path",
+        type=str,
+        default=".",
+        nargs="?",
+        help="Folder containing the CBZ files. Default: current directory",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=FIX_WORKERS,
+        help=f"Number of archives fixed in parallel. Default: {FIX_WORKERS}",
+    )
+    parser.add_argument(
+        "--in-place",
+        action="store_true",
+        help="Replace each archive instead of writing '<name>_fixed.cbz' next to it.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rewrite archives even if they are already flat.",
+    )
+    return parser.parse_args()
 
-        print(f"Processing: {input_cbz_path}")
-        fix_cbz_structure(input_cbz_path, output_cbz_path)
-        print(f"Saved fixed CBZ: {output_cbz_path}")
 
+def main() -> int:
+    setup_logging(verbose=False)
+    args = parse_arguments()
+    counts = process_cbz_in_folder(
+        Path(args.folder_path),
+        workers=args.workers,
+        in_place=args.in_place,
+        force=args.force,
+    )
+    return 1 if counts["failed"] else 0
 
-# Folder containing the CBZ files
-folder = "."  # Replace with the folder containing your CBZ files
 
-# Run the processing function
-process_cbz_in_folder(folder)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,40 +1,347 @@
+import json
 import subprocess
+from dataclasses import dataclass
 from pathlib import Path
+import re
 import sys
 import argparse
 
+# Determine the project root based on the script's location
+project_root = Path(__file__).resolve().parent.parent
+
+# Add the project root to sys.path
+sys.path.append(str(project_root))
+
+from src.constants import (
+    CACHE_DIR,
+    CALIBRE_BATCH_SIZE,
+    CONVERSION_QUEUE_FILE,
+    IMPORT_INDEX_FILE,
+)
+from src.import_index import CHANGED, IMPORTED, ImportIndex
+from src.job_queue import ConversionQueue
 from src.utils import natural_sort_key
 
+ADDED_IDS_PATTERN = re.compile(r"Added book ids:\s*([\d,\s]+)")
+
+
+@dataclass
+class MobiBook:
+    """
+    A MOBI file with the metadata Calibre should store for it. `title` is only
+    passed to calibredb for single-file adds; batches take it from the file.
+    """
+
+    path: Path
+    title: str | None = None
+    author: str | None = None
+    series: str | None = None
+
+
+def open_conversion_queue() -> ConversionQueue | None:
+    """
+    Opens the conversion queue to look up book metadata. Returns None, without
+    creating it, when there is no queue yet.
+    """
+    if not (CACHE_DIR / CONVERSION_QUEUE_FILE).exists():
+        return None
+    try:
+        return ConversionQueue()
+    except Exception as e:
+        print(f"Conversion queue unavailable, using folder names as series: {e}")
+        return None
+
+
+def describe_mobi(mobi_file: Path, queue: ConversionQueue | None) -> MobiBook:
+    """
+    Looks up the title, author and series of a MOBI in the conversion job that
+    produced it. Files converted elsewhere fall back to the series folder name
+    ('<series>/Converted/<pack>.mobi').
+    """
+    job = queue.job_for(mobi_file.with_suffix(".cbz")) if queue else None
+    if job:
+        return MobiBook(
+            path=mobi_file,
+            title=job.title,
+            author=job.author,
+            series=job.metadata.get("title"),
+        )
+    series_folder = mobi_file.parent
+    if series_folder.name == "Converted":
+        series_folder = series_folder.parent
+    return MobiBook(path=mobi_file, title=mobi_file.stem, series=series_folder.name)
+
+
+def build_add_command(
+    calibredb_path: str,
+    library_path: Path,
+    books: list[MobiBook],
+) -> list[str]:
+    """
+    Builds one 'calibredb add' call for books sharing an author and series.
+    """
+    command = [str(calibredb_path), "add", "--library-path", str(library_path)]
+    first = books[0]
+    if first.author:
+        command += ["--authors", first.author]
+    if first.series:
+        command += ["--series", first.series]
+    if len(books) == 1 and first.title:
+        command += ["--title", first.title]
+    return command + [str(book.path) for book in books]
+
+
+def parse_add_output(output: str, books: list[MobiBook]) -> tuple[list[int], set[Path]]:
+    """
+    Returns the book ids calibredb reported as added and the files it skipped as
+    duplicates (listed by path in its output).
+    """
+    match = ADDED_IDS_PATTERN.search(output)
+    added_ids = (
+        [int(value) for value in re.findall(r"\d+", match.group(1))] if match else []
+    )
+    paths = {str(book.path): book.path for book in books}
+    duplicates = {
+        paths[line.strip()] for line in output.splitlines() if line.strip() in paths
+    }
+    return added_ids, duplicates
+
 
-def add_mobi_with_calibredb(calibredb_path: str, mobi_file: Path):
+def add_mobi_with_calibredb(
+    calibredb_path: str, library_path: Path, books: list[MobiBook]
+):
     """
-    Adds a .mobi file to Calibre library using calibredb add command.
+    Adds .mobi files to a Calibre library with a single calibredb add command.
 
     :param calibredb_path: Path to the calibredb executable.
     :param library_path: Path to the Calibre library.
-    :param mobi_file: Path to the .mobi file to be added.
-    :return: Tuple containing (success: bool, message: str)
+    :param books: MOBI files to add, sharing an author and series.
+    :return: Tuple containing (return code, output, added book ids, duplicate files)
+    """
+    command = build_add_command(calibredb_path, library_path, books)
+    return run_calibredb(command, books)
+
+
+def replace_format_with_calibredb(
+    calibredb_path: str, library_path: Path, book: MobiBook, book_id: int
+):
+    """
+    Replaces the MOBI of an existing Calibre book with a newer conversion.
+
+    :return: Tuple containing (return code, output)
     """
+    command = [
+        str(calibredb_path),
+        "add_format",
+        "--library-path",
+        str(library_path),
+        str(book_id),
+        str(book.path),
+    ]
+    returncode, output, _, _ = run_calibredb(command, [book])
+    return returncode, output
+
+
+def list_book_titles(
+    calibredb_path: str, library_path: Path, book_ids: list[int]
+) -> dict[int, str] | None:
+    """
+    Returns the title of each book id with one 'calibredb list' call, or None if
+    the list cannot be read.
+    """
+    command = [
+        str(calibredb_path),
+        "list",
+        "--for-machine",
+        "--fields",
+        "title",
+        "--library-path",
+        str(library_path),
+        "--search",
+        " or ".join(f"id:{book_id}" for book_id in book_ids),
+    ]
     try:
-        command = [
-            "calibredb",
-            str(calibredb_path),
-            "add",
-            str(mobi_file),
-        ]
-        print(command)
-        # Execute the command
         result = subprocess.run(
             command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
         )
+        if result.returncode != 0:
+            return None
+        return {book["id"]: book.get("title", "") for book in json.loads(result.stdout or "[]")}
+    except Exception:
+        return None
 
-        if result.returncode == 0:
-            return True, result.stdout.strip()
-        else:
-            return False, result.stderr.strip()
 
+def match_added_ids(
+    books: list[MobiBook], added_ids: list[int], titles: dict[int, str]
+) -> dict[Path, int] | None:
+    """
+    Pairs the files of a batch with the ids calibredb reported, in order, and
+    checks every pair against the title Calibre stored for the id (`titles`, empty
+    for a single file). Returns None when a title does not match, since the ids
+    cannot be told apart then.
+    """
+    pairs = dict(zip((book.path for book in books), added_ids))
+    if len(books) == 1:
+        return pairs
+    for book in books:
+        expected = (book.title or book.path.stem).casefold()
+        if titles.get(pairs[book.path], "").casefold() != expected:
+            return None
+    return pairs
+
+
+def remove_books_with_calibredb(
+    calibredb_path: str, library_path: Path, book_ids: list[int]
+) -> bool:
+    """
+    Removes books from the library. Returns True on success.
+    """
+    command = [
+        str(calibredb_path),
+        "remove",
+        "--library-path",
+        str(library_path),
+        ",".join(str(book_id) for book_id in book_ids),
+    ]
+    returncode, _, _, _ = run_calibredb(command, [])
+    return returncode == 0
+
+
+def run_calibredb(command: list[str], books: list[MobiBook]):
+    try:
+        result = subprocess.run(
+            command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
     except Exception as e:
-        return False, str(e)
+        return None, str(e), [], set()
+    added_ids, duplicates = parse_add_output(result.stdout, books)
+    return result.returncode, result.stdout.strip(), added_ids, duplicates
+
+
+def batch_books(books: list[MobiBook], batch_size: int) -> list[list[MobiBook]]:
+    """
+    Splits books into batches of at most `batch_size` that share an author and series.
+    """
+    batches = []
+    groups: dict[tuple, list[MobiBook]] = {}
+    for book in books:
+        groups.setdefault((book.author, book.series), []).append(book)
+    for group in groups.values():
+        for start in range(0, len(group), batch_size):
+            batches.append(group[start : start + batch_size])
+    return batches
+
+
+def import_books(
+    calibredb_path: str,
+    library_path: Path,
+    books: list[MobiBook],
+    batch_size: int,
+    replacements: dict[Path, int] | None = None,
+) -> dict[Path, tuple[str, int | None]]:
+    """
+    Adds books batch by batch. The ids calibredb reports for a batch are checked
+    against the titles Calibre stored; if they cannot be matched to the files, the
+    batch's books are removed again. When calibredb does not account for every file
+    of a batch, or its ids cannot be matched, the remaining files are added one by one.
+    Books listed in `replacements` replace the MOBI of that Calibre book id instead.
+    Returns the outcome ('added', 'duplicate' or 'failed') and book id of every file.
+    """
+    replacements = replacements or {}
+    results = {}
+    for book in books:
+        if book.path not in replacements:
+            continue
+        book_id = replacements[book.path]
+        print(f"Replacing the MOBI of book {book_id} with '{book.path.name}'...", end=" ")
+        returncode, output = replace_format_with_calibredb(
+            calibredb_path, library_path, book, book_id
+        )
+        if returncode == 0:
+            print("Success.")
+            results[book.path] = ("added", book_id)
+        else:
+            print(f"Failed.\n\tError: {output}")
+            results[book.path] = ("failed", None)
+
+    new_books = [book for book in books if book.path not in replacements]
+    for batch in batch_books(new_books, batch_size):
+        print(f"Adding {len(batch)} file(s) of '{batch[0].series}'...", end=" ")
+        returncode, output, added_ids, duplicates = add_mobi_with_calibredb(
+            calibredb_path, library_path, batch
+        )
+        remaining = [book for book in batch if book.path not in duplicates]
+        results.update((path, ("duplicate", None)) for path in duplicates)
+        if returncode == 0 and len(added_ids) == len(remaining):
+            # A single file needs no check: its title was passed to calibredb
+            titles = (
+                list_book_titles(calibredb_path, library_path, added_ids)
+                if len(remaining) > 1
+                else {}
+            )
+            matched = (
+                match_added_ids(remaining, added_ids, titles)
+                if titles is not None
+                else None
+            )
+            if matched is not None:
+                print(f"Success ({len(added_ids)} added, {len(duplicates)} already present).")
+                results.update((path, ("added", book_id)) for path, book_id in matched.items())
+                continue
+            if not remove_books_with_calibredb(calibredb_path, library_path, added_ids):
+                # Keep the books, but without ids that may belong to another file
+                print("Added, but the book ids could not be matched to the files.")
+                results.update((book.path, ("added", None)) for book in remaining)
+                continue
+            print("Book ids did not match the files, removed them.", end=" ")
+        elif len(batch) == 1:
+            print(f"Failed.\n\tError: {output}")
+            results.update((book.path, ("failed", None)) for book in remaining)
+            continue
+        else:
+            print("Incomplete.", end=" ")
+
+        # Retrying a file that did get added is harmless: calibredb reports it as a duplicate
+        print(f"Retrying {len(remaining)} file(s) individually.")
+        for book in remaining:
+            print(f"  Adding '{book.path.name}'...", end=" ")
+            returncode, output, added_ids, duplicates = add_mobi_with_calibredb(
+                calibredb_path, library_path, [book]
+            )
+            if returncode == 0 and added_ids:
+                print("Success.")
+                results[book.path] = ("added", added_ids[0])
+            elif returncode == 0 and duplicates:
+                print("Already present.")
+                results[book.path] = ("duplicate", None)
+            else:
+                print(f"Failed.\n\tError: {output}")
+                results[book.path] = ("failed", None)
+    return results
+
+
+def select_books_to_import(
+    index: ImportIndex, books: list[MobiBook]
+) -> tuple[list[MobiBook], dict[Path, int], dict[Path, tuple[int | None, str]]]:
+    """
+    Drops the books the index knows as imported. Returns the books left to import;
+    for those that changed since their import, the Calibre book id to update; and
+    the books recognized by hash or title, with the (book id, SHA-256) the index
+    should record for them.
+    """
+    pending = []
+    replacements = {}
+    recognized = {}
+    for book in books:
+        state, book_id, sha256 = index.classify(book.path, book.title)
+        if state == IMPORTED:
+            if sha256:
+                recognized[book.path] = (book_id, sha256)
+            continue
+        if state == CHANGED and book_id is not None:
+            replacements[book.path] = book_id
+        pending.append(book)
+    return pending, replacements, recognized
 
 
 def parse_arguments():
@@ -52,11 +359,35 @@ def parse_arguments():
         help="Path to the folder containing .mobi files to be added.",
     )
     parser.add_argument(
+        "--library-path",
         "--calibredb-path",
+        dest="library_path",
         type=str,
         default="C:/Users/giomartinelli/Calibre Library",
+        help="Path to the Calibre library. Default: C:/Users/giomartinelli/Calibre Library",
+    )
+    parser.add_argument(
+        "--calibredb",
+        type=str,
+        default="calibredb",
         help="Path to the calibredb executable. Default: calibredb",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=CALIBRE_BATCH_SIZE,
+        help=f"Files added per calibredb call. Default: {CALIBRE_BATCH_SIZE}",
+    )
+    parser.add_argument(
+        "--reseed",
+        action="store_true",
+        help="Re-read the library's book list with 'calibredb list' before importing.",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Submit every file, ignoring the index of already imported files.",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -70,7 +401,7 @@ def main():
 
     # Resolve paths
     root_folder_path = Path(args.root_folder_path).resolve()
-    calibre_library_path = Path(args.calibredb_path).resolve()
+    calibre_library_path = Path(args.library_path).resolve()
 
     # Validate Calibre library path
     if not calibre_library_path.exists():
@@ -89,26 +420,64 @@ def main():
 
     print(f"\nTotal .mobi files found: {len(all_mobi_files)}\n")
 
+    queue = open_conversion_queue()
+    books = [describe_mobi(mobi_file, queue) for mobi_file in all_mobi_files]
+
+    index = None
+    replacements = {}
+    recognized = {}
+    if args.no_index:
+        pass
+    elif args.dry_run and not (CACHE_DIR / IMPORT_INDEX_FILE).exists():
+        print("No import index yet, so every file would be submitted.")
+    else:
+        index = ImportIndex(calibre_library_path)
+        if args.dry_run:
+            if args.reseed or not index.seeded:
+                print("[DRY RUN] Would read the library's book list first.")
+        elif args.reseed or not index.seeded:
+            index.seed(args.calibredb)
+        books, replacements, recognized = select_books_to_import(index, books)
+        skipped = len(all_mobi_files) - len(books)
+        if skipped:
+            print(f"Skipping {skipped} .mobi file(s) already imported.")
+        if replacements:
+            print(f"{len(replacements)} .mobi file(s) changed since they were imported.")
+
     if args.dry_run:
         print("** Dry Run Enabled: No books will be added to the Calibre library. **\n")
-        for mobi_file in all_mobi_files:
-            print(f"[DRY RUN] Would add: File='{mobi_file.name}'")
+        for book in books:
+            if book.path in replacements:
+                print(
+                    f"[DRY RUN] Would replace the MOBI of book {replacements[book.path]}: File='{book.path.name}'"
+                )
+        for batch in batch_books(
+            [book for book in books if book.path not in replacements], args.batch_size
+        ):
+            print(
+                f"[DRY RUN] Would add {len(batch)} file(s): "
+                f"Author='{batch[0].author or '-'}', Series='{batch[0].series or '-'}'"
+            )
+            for book in batch:
+                print(f"\tFile='{book.path.name}'")
     else:
-        success_count = 0
-        failure_count = 0
-        for mobi_file in all_mobi_files:
-            print(f"Adding '{mobi_file.name}'...", end=" ")
-            success, message = add_mobi_with_calibredb(calibre_library_path, mobi_file)
-            if success:
-                print("Success.")
-                success_count += 1
-            else:
-                print(f"Failed.\n\tError: {message}")
-                failure_count += 1
-
-        print(f"\nSuccessfully added {success_count} .mobi file(s) to Calibre.")
-        if failure_count > 0:
-            print(f"Failed to add {failure_count} .mobi file(s). See errors above.")
+        titles = {book.path: book.title for book in books}
+        for path, (book_id, sha256) in recognized.items():
+            index.record(path, book_id, sha256)
+        results = import_books(
+            args.calibredb, calibre_library_path, books, args.batch_size, replacements
+        )
+        counts = {"added": 0, "duplicate": 0, "failed": 0}
+        for path, (outcome, book_id) in results.items():
+            counts[outcome] += 1
+            if index and outcome != "failed":
+                index.record(path, book_id, title=titles.get(path))
+        print(f"\nSuccessfully added {counts['added']} .mobi file(s) to Calibre.")
+        if counts["duplicate"] > 0:
+            print(f"Skipped {counts['duplicate']} .mobi file(s) already in the library.")
+        if counts["failed"] > 0:
+            print(f"Failed to add {counts['failed']} .mobi file(s). See errors above.")
+            sys.exit(1)
 
 
 if __name__ == "__main__":
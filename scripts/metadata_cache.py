@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Determine the project root based on the script's location
+project_root = Path(__file__).resolve().parent.parent
+
+# Add the project root to sys.path
+sys.path.append(str(project_root))
+
+from src.metadata_cache import MetadataCache
+from src.utils import setup_logging
+
+
+def describe_entry(cache: MetadataCache, entry) -> str:
+    fetched = datetime.fromtimestamp(entry.fetched_at).strftime("%Y-%m-%d %H:%M")
+    flags = []
+    if entry.pinned:
+        flags.append("pinned")
+    if entry.is_negative:
+        flags.append("no match")
+    if not cache.is_fresh(entry):
+        flags.append("expired")
+    title = entry.metadata.get("title", "?") if entry.metadata else "-"
+    suffix = f" [{', '.join(flags)}]" if flags else ""
+    return f"{entry.manga_name!r} -> {title!r} (fetched {fetched}){suffix}"
+
+
+def list_entries(cache: MetadataCache, args) -> int:
+    entries = cache.entries()
+    if args.expired:
+        entries = [entry for entry in entries if not cache.is_fresh(entry)]
+    for entry in entries:
+        print(describe_entry(cache, entry))
+    print(f"\n{len(entries)} entr{'y' if len(entries) == 1 else 'ies'}.")
+    return 0
+
+
+def show_entry(cache: MetadataCache, args) -> int:
+    entry = cache.lookup(args.manga_name)
+    if not entry:
+        print(f"No cache entry for '{args.manga_name}'.")
+        return 1
+    print(describe_entry(cache, entry))
+    if entry.metadata:
+        print(json.dumps(entry.metadata, indent=4, ensure_ascii=False))
+    return 0
+
+
+def refresh_entry(cache: MetadataCache, args) -> int:
+    # Imported lazily so that listing and pinning work without the Jikan dependencies
+    from src.manga_info import JikanUnavailableError, lookup_manga_info_jikan
+
+    try:
+        metadata = lookup_manga_info_jikan(args.manga_name)
+    except JikanUnavailableError as e:
+        print(f"Could not query Jikan, cache entry left unchanged: {e}")
+        return 1
+    if metadata is None:
+        print(f"No match found for '{args.manga_name}'.")
+    cache.put(args.manga_name, metadata)
+    print(describe_entry(cache, cache.lookup(args.manga_name)))
+    return 0 if metadata else 1
+
+
+def pin_entry(cache: MetadataCache, args) -> int:
+    if not cache.set_pinned(args.manga_name, not args.unpin):
+        print(f"No cache entry for '{args.manga_name}'. Run 'refresh' first.")
+        return 1
+    print(describe_entry(cache, cache.lookup(args.manga_name)))
+    return 0
+
+
+def forget_entry(cache: MetadataCache, args) -> int:
+    if not cache.forget(args.manga_name):
+        print(f"No cache entry for '{args.manga_name}'.")
+        return 1
+    print(f"Removed '{args.manga_name}' from the metadata cache.")
+    return 0
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments.
+
+    :return: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Inspect and manage the persistent Jikan metadata cache."
+    )
+    parser.add_argument(
+        "--cache-file",
+        type=str,
+        default=None,
+        help="Path to the cache database. Default: metadata_cache.sqlite3 in the cache directory.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="List cached entries.")
+    list_parser.add_argument(
+        "--expired", action="store_true", help="Only list expired entries."
+    )
+    list_parser.set_defaults(handler=list_entries)
+
+    for name, handler, help_text in (
+        ("show", show_entry, "Show the cached metadata of a manga."),
+        ("refresh", refresh_entry, "Query Jikan again and replace the entry."),
+        ("pin", pin_entry, "Keep an entry forever, regardless of its age."),
+        ("forget", forget_entry, "Delete an entry."),
+    ):
+        command_parser = subparsers.add_parser(name, help=help_text)
+        command_parser.add_argument("manga_name", type=str, help="Manga name.")
+        command_parser.set_defaults(handler=handler)
+    subparsers.choices["pin"].add_argument(
+        "--unpin", action="store_true", help="Remove the pin instead."
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    setup_logging(verbose=False)
+    args = parse_arguments()
+    cache = MetadataCache(args.cache_file)
+    return args.handler(cache, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
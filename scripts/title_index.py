@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Determine the project root based on the script's location
+project_root = Path(__file__).resolve().parent.parent
+
+# Add the project root to sys.path
+sys.path.append(str(project_root))
+
+from src.title_index import TitleIndex
+from src.utils import setup_logging
+
+
+def build_index(index: TitleIndex, args) -> int:
+    count = index.build(Path(args.dump))
+    print(f"Indexed {count} manga ({len(index)} titles) into '{index.path}'.")
+    return 0 if count else 1
+
+
+def match_names(index: TitleIndex, args) -> int:
+    names = list(args.names)
+    if args.library:
+        names += sorted(
+            folder.name for folder in Path(args.library).iterdir() if folder.is_dir()
+        )
+    started = time.perf_counter()
+    matches = index.match_many(names)
+    elapsed = time.perf_counter() - started
+    for name, match in matches.items():
+        if match is None:
+            print(f"{name!r} -> no match")
+            continue
+        confidence = "" if match.is_confident() else " [low, ask Jikan]"
+        print(
+            f"{name!r} -> {match.title!r} (MAL {match.record['mal_id']}, score {match.score}, ratio {match.ratio}){confidence}"
+        )
+    print(f"\nMatched {len(matches)} names in {elapsed * 1000:.1f} ms.")
+    return 0
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments.
+
+    :return: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Build and query the offline title index used to match folder names."
+    )
+    parser.add_argument(
+        "--index-file",
+        type=str,
+        default=None,
+        help="Path to the index database. Default: title_index.sqlite3 in the cache directory.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser(
+        "build", help="Replace the index with the records of a Jikan dump."
+    )
+    build_parser.add_argument(
+        "dump",
+        type=str,
+        help="JSON list, Jikan response or JSON lines of manga records, optionally .gz.",
+    )
+    build_parser.set_defaults(handler=build_index)
+
+    match_parser = subparsers.add_parser(
+        "match", help="Show the best indexed title for names or library folders."
+    )
+    match_parser.add_argument("names", nargs="*", help="Manga names.")
+    match_parser.add_argument(
+        "--library",
+        type=str,
+        default=None,
+        help="Also match every folder of this library.",
+    )
+    match_parser.set_defaults(handler=match_names)
+    return parser.parse_args()
+
+
+def main() -> int:
+    setup_logging(verbose=False)
+    args = parse_arguments()
+    index = TitleIndex(args.index_file)
+    return args.handler(index, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
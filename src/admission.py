@@ -0,0 +1,254 @@
+from collections import deque
+from contextlib import contextmanager
+import itertools
+import logging
+import os
+from pathlib import Path
+import shutil
+import threading
+
+from .catalog import ArchiveManifest
+from .constants import (
+    ADMISSION_RECHECK_INTERVAL,
+    DISK_BUDGET,
+    DISK_FREE_RESERVE,
+    KCC_OUTPUT_FACTOR,
+    KCC_WORK_FACTOR,
+    RAM_STAGING_LIMIT,
+    RAM_STAGING_MAX_PACK,
+    ZIP_ENTRY_OVERHEAD,
+)
+
+
+def combine_footprint(
+    manifests: list[ArchiveManifest], cover_path: Path | None = None
+) -> int:
+    """
+    Estimates the size of a combined CBZ from the zip metadata of its chapters:
+    pages are copied as stored, so the result is about the sum of their
+    compressed sizes.
+    """
+    size = sum(
+        page.compress_size + ZIP_ENTRY_OVERHEAD
+        for manifest in manifests
+        for page in manifest.pages
+    )
+    if cover_path and cover_path.exists():
+        size += cover_path.stat().st_size + ZIP_ENTRY_OVERHEAD
+    return size
+
+
+def convert_footprint(image_bytes: int, cbz_size: int) -> int:
+    """
+    Estimates the disk space KCC uses next to the CBZ it converts: its work
+    folder of extracted and processed pages, then the EPUB and MOBI it writes.
+    """
+    return int(image_bytes * KCC_WORK_FACTOR + cbz_size * KCC_OUTPUT_FACTOR)
+
+
+def _existing_path(path: Path) -> Path:
+    path = Path(path).absolute()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+class DiskAdmission:
+    """
+    Admission control for work that writes large files. Each pack reserves its
+    estimated peak footprint on the volumes it writes to before it starts, and
+    waits while the reservations on a volume would exceed its budget or eat into
+    the free space kept in reserve. Free space is measured again on every check,
+    so files left behind by finished packs (and by other programs) count.
+    A pack that is alone on its volume is always admitted, so a pack larger than
+    the budget runs by itself instead of waiting forever. Packs are admitted in
+    the order they asked, so smaller packs cannot starve a large one.
+    """
+
+    def __init__(
+        self,
+        budget: int | None = DISK_BUDGET,
+        free_reserve: int = DISK_FREE_RESERVE,
+        recheck_interval: float = ADMISSION_RECHECK_INTERVAL,
+    ):
+        self.budget = budget
+        self.free_reserve = free_reserve
+        self.recheck_interval = recheck_interval
+        self._condition = threading.Condition()
+        self._reserved: dict[int, int] = {}
+        self._waiting = deque()
+        self._tickets = itertools.count()
+
+    @classmethod
+    def from_args(cls, args) -> "DiskAdmission":
+        return cls(
+            budget=(
+                int(args.disk_budget_gb * 1024**3) if args.disk_budget_gb else None
+            ),
+            free_reserve=int(args.disk_reserve_gb * 1024**3),
+        )
+
+    def _volumes(self, needs: dict[Path, int]) -> dict[int, tuple[Path, int]]:
+        volumes = {}
+        for path, size in needs.items():
+            path = _existing_path(path)
+            device = os.stat(path).st_dev
+            known_path, known_size = volumes.get(device, (path, 0))
+            volumes[device] = (known_path, known_size + max(0, size))
+        return volumes
+
+    def _fits(self, device: int, path: Path, size: int) -> bool:
+        reserved = self._reserved.get(device, 0)
+        if reserved == 0:
+            return True
+        if self.budget is not None and reserved + size > self.budget:
+            return False
+        try:
+            free = shutil.disk_usage(path).free
+        except OSError:
+            return True
+        return reserved + size <= free - self.free_reserve
+
+    @contextmanager
+    def reserve(self, needs: dict[Path, int], label: str = ""):
+        """
+        Blocks until `needs` (bytes to be written under each path) fits on every
+        volume involved, and holds the reservation for the enclosed block.
+        """
+        volumes = self._volumes(needs)
+        with self._condition:
+            ticket = next(self._tickets)
+            self._waiting.append(ticket)
+            waited = False
+            try:
+                while self._waiting[0] != ticket or not all(
+                    self._fits(device, path, size)
+                    for device, (path, size) in volumes.items()
+                ):
+                    if not waited:
+                        logging.info(
+                            f"Waiting for disk space before processing '{label}' "
+                            f"({sum(size for _, size in volumes.values()) / 1024 / 1024:.0f} MB)."
+                        )
+                        waited = True
+                    # Also woken by the timeout, in case other programs free space meanwhile
+                    self._condition.wait(timeout=self.recheck_interval)
+            except BaseException:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+                raise
+            self._waiting.popleft()
+            self._condition.notify_all()
+            for device, (path, size) in volumes.items():
+                if self._reserved.get(device, 0) == 0:
+                    self._warn_if_short(path, size, label)
+                self._reserved[device] = self._reserved.get(device, 0) + size
+        try:
+            yield
+        finally:
+            with self._condition:
+                for device, (_, size) in volumes.items():
+                    self._reserved[device] -= size
+                self._condition.notify_all()
+
+    def _warn_if_short(self, path: Path, size: int, label: str) -> None:
+        try:
+            free = shutil.disk_usage(path).free
+        except OSError:
+            return
+        if size > free - self.free_reserve:
+            logging.warning(
+                f"'{label}' needs about {size / 1024 / 1024:.0f} MB on the volume of "
+                f"'{path}', which has {free / 1024 / 1024:.0f} MB free."
+            )
+
+
+class MemoryStaging:
+    """
+    Decides which packs are assembled in RAM: a pack qualifies when its estimated
+    size is at most `max_pack` bytes and the packs already staged in memory leave
+    room for it under `limit`. Packs that do not qualify are never delayed; they
+    are streamed to disk instead. Staging is off by default (`max_pack` of 0).
+    """
+
+    def __init__(
+        self, max_pack: int = RAM_STAGING_MAX_PACK, limit: int = RAM_STAGING_LIMIT
+    ):
+        self.max_pack = max_pack
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._used = 0
+
+    @classmethod
+    def from_args(cls, args) -> "MemoryStaging":
+        # Without a limit of its own, one pack at a time may be staged
+        limit_mb = args.ram_staging_mb if args.ram_limit_mb is None else args.ram_limit_mb
+        return cls(
+            max_pack=int(args.ram_staging_mb * 1024 * 1024),
+            limit=int(limit_mb * 1024 * 1024),
+        )
+
+    @contextmanager
+    def stage(self, size: int):
+        """
+        Yields True if a pack of `size` bytes may be assembled in memory, holding
+        its share of the limit for the enclosed block, or False otherwise.
+        """
+        with self._lock:
+            staged = 0 < size <= self.max_pack and self._used + size <= self.limit
+            if staged:
+                self._used += size
+        try:
+            yield staged
+        finally:
+            if staged:
+                with self._lock:
+                    self._used -= size
+
+
+_default_admission = None
+_default_admission_lock = threading.Lock()
+
+
+def get_disk_admission() -> DiskAdmission:
+    """
+    Returns the admission control shared by every pack of this process.
+    """
+    global _default_admission
+    with _default_admission_lock:
+        if _default_admission is None:
+            _default_admission = DiskAdmission()
+        return _default_admission
+
+
+def set_disk_admission(admission: DiskAdmission) -> None:
+    """
+    Replaces the shared admission control; call it before any pack starts.
+    """
+    global _default_admission
+    with _default_admission_lock:
+        _default_admission = admission
+
+
+_default_staging = None
+_default_staging_lock = threading.Lock()
+
+
+def get_memory_staging() -> MemoryStaging:
+    """
+    Returns the in-memory staging limits shared by every pack of this process.
+    """
+    global _default_staging
+    with _default_staging_lock:
+        if _default_staging is None:
+            _default_staging = MemoryStaging()
+        return _default_staging
+
+
+def set_memory_staging(staging: MemoryStaging) -> None:
+    """
+    Replaces the shared in-memory staging limits; call it before any pack starts.
+    """
+    global _default_staging
+    with _default_staging_lock:
+        _default_staging = staging
@@ -0,0 +1,378 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import struct
+import time
+import zipfile
+import zlib
+
+from .constants import IMAGE_EXTENSIONS, STORED_EXTENSIONS, ZIP_WORKERS
+from .utils import natural_sort_key
+
+COPY_CHUNK_SIZE = 1024 * 1024
+# Encrypted entries cannot be copied raw: their data is useless without the key
+_MASK_ENCRYPTED = 0x01
+# Undocumented zipfile internals the raw copy relies on; without them every entry goes
+# through the public read and write API instead
+_RAW_MODULE_NAMES = (
+    "_FH_SIGNATURE",
+    "_FH_FILENAME_LENGTH",
+    "_FH_EXTRA_FIELD_LENGTH",
+    "sizeFileHeader",
+    "structFileHeader",
+    "stringFileHeader",
+)
+_RAW_ARCHIVE_ATTRIBUTES = (
+    "fp",
+    "_lock",
+    "_writing",
+    "_seekable",
+    "start_dir",
+    "_writecheck",
+    "_didModify",
+    "_strict_timestamps",
+)
+_RAW_MODULE_SUPPORTED = all(hasattr(zipfile, name) for name in _RAW_MODULE_NAMES)
+
+
+def compress_type_for(name: str) -> int:
+    """
+    Picks the compression method for an entry based on its file extension.
+    Already-compressed image formats are stored, everything else is deflated.
+    """
+    if name.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def get_sorted_image_entries(zip_ref: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    """
+    Returns the image entries of an open archive, sorted naturally by name.
+    Only the central directory is consulted; no entry data is read.
+    """
+    return sorted(
+        [
+            info
+            for info in zip_ref.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith("__MACOSX/")
+            and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+        ],
+        key=lambda info: natural_sort_key(info.filename),
+    )
+
+
+def _can_copy_raw(info: zipfile.ZipInfo) -> bool:
+    return (
+        not info.flag_bits & _MASK_ENCRYPTED
+        and info.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+        and info.file_size < zipfile.ZIP64_LIMIT
+        and info.compress_size < zipfile.ZIP64_LIMIT
+    )
+
+
+def supports_raw_write(target: zipfile.ZipFile) -> bool:
+    """
+    Tells whether write_raw_entry can append to `target`: the ZipFile internals it
+    uses exist, and the archive can seek back over an entry that fails its check.
+    """
+    return (
+        all(hasattr(target, name) for name in _RAW_ARCHIVE_ATTRIBUTES)
+        and bool(target._seekable)
+        and hasattr(target.fp, "truncate")
+    )
+
+
+def _supports_raw_copy(source: zipfile.ZipFile, target: zipfile.ZipFile) -> bool:
+    return (
+        _RAW_MODULE_SUPPORTED
+        and hasattr(source, "fp")
+        and hasattr(source, "_lock")
+        and supports_raw_write(target)
+    )
+
+
+def _seek_to_entry_data(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """
+    Positions the archive's file pointer at the first byte of the entry's compressed data.
+    """
+    zip_ref.fp.seek(info.header_offset)
+    header = zip_ref.fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader:
+        raise zipfile.BadZipFile(f"Truncated file header for '{info.filename}'")
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad magic number for file header of '{info.filename}'")
+    zip_ref.fp.seek(
+        fields[zipfile._FH_FILENAME_LENGTH] + fields[zipfile._FH_EXTRA_FIELD_LENGTH],
+        1,
+    )
+
+
+def write_raw_entry(target: zipfile.ZipFile, zinfo: zipfile.ZipInfo, chunks) -> None:
+    """
+    Appends an entry whose compressed bytes, CRC and sizes are already known.
+    `zinfo` must carry compress_type, CRC, compress_size and file_size;
+    `chunks` yields the compressed data exactly as it should appear on disk.
+    If writing fails, including `chunks` raising, the entry is cut off the archive
+    again. Requires supports_raw_write.
+    """
+    zinfo.flag_bits = 0x00
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16
+
+    with target._lock:
+        if target._writing:
+            raise ValueError(
+                "Can't write to ZIP archive while an open writing handle exists."
+            )
+        if target._seekable:
+            target.fp.seek(target.start_dir)
+        zinfo.header_offset = target.fp.tell()
+        target._writecheck(zinfo)
+        target._didModify = True
+
+        try:
+            target.fp.write(zinfo.FileHeader(False))
+            written = 0
+            for chunk in chunks:
+                target.fp.write(chunk)
+                written += len(chunk)
+            if written != zinfo.compress_size:
+                raise zipfile.BadZipFile(
+                    f"Wrote {written} bytes for '{zinfo.filename}', expected {zinfo.compress_size}"
+                )
+        except BaseException:
+            # ZipFile only truncates in append mode; stale bytes past the end
+            # record could otherwise be read back as a second end record
+            target.fp.seek(target.start_dir)
+            target.fp.truncate()
+            raise
+
+        target.filelist.append(zinfo)
+        target.NameToInfo[zinfo.filename] = zinfo
+        target.start_dir = target.fp.tell()
+
+
+def _iter_raw_data(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo):
+    """
+    Yields the compressed bytes of an entry, then checks the data they hold against
+    the entry's CRC-32 and size; deflated data is inflated chunk by chunk for the
+    check. Raises BadZipFile when the entry is truncated or corrupt.
+    """
+    inflater = (
+        zlib.decompressobj(-zlib.MAX_WBITS)
+        if info.compress_type == zipfile.ZIP_DEFLATED
+        else None
+    )
+    crc = 0
+    size = 0
+    remaining = info.compress_size
+    try:
+        while remaining > 0:
+            chunk = zip_ref.fp.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated data for '{info.filename}'")
+            remaining -= len(chunk)
+            data = inflater.decompress(chunk, COPY_CHUNK_SIZE) if inflater else chunk
+            while data:
+                crc = zlib.crc32(data, crc)
+                size += len(data)
+                data = (
+                    inflater.decompress(inflater.unconsumed_tail, COPY_CHUNK_SIZE)
+                    if inflater and inflater.unconsumed_tail
+                    else b""
+                )
+            yield chunk
+        if inflater:
+            data = inflater.flush()
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            if not inflater.eof:
+                raise zipfile.BadZipFile(f"Truncated deflate stream for '{info.filename}'")
+    except zlib.error as e:
+        raise zipfile.BadZipFile(f"Corrupt data for '{info.filename}': {e}") from e
+    if crc != info.CRC or size != info.file_size:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for '{info.filename}'")
+
+
+def copy_zip_entry(
+    source: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    target: zipfile.ZipFile,
+    arcname: str,
+) -> None:
+    """
+    Copies one entry from `source` into `target` under `arcname` without touching disk.
+    When the entry is stored or deflated its compressed bytes are copied unchanged,
+    and checked against its CRC-32 on the way; otherwise, or when the zipfile
+    internals this needs are missing, it is decompressed and written with the
+    policy from compress_type_for. A corrupt entry raises BadZipFile either way.
+    """
+    zinfo = zipfile.ZipInfo(arcname, date_time=info.date_time)
+    zinfo.external_attr = info.external_attr
+
+    if _can_copy_raw(info) and _supports_raw_copy(source, target):
+        zinfo.compress_type = info.compress_type
+        zinfo.CRC = info.CRC
+        zinfo.compress_size = info.compress_size
+        zinfo.file_size = info.file_size
+        with source._lock:
+            _seek_to_entry_data(source, info)
+            write_raw_entry(target, zinfo, _iter_raw_data(source, info))
+        return
+
+    # Read whole first, so a corrupt entry fails before anything is written
+    zinfo.compress_type = compress_type_for(arcname)
+    target.writestr(zinfo, read_entry(source, info))
+
+
+def read_entry(source: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+    """
+    Reads and decompresses one entry, raising BadZipFile for any kind of corrupt
+    or truncated data.
+    """
+    try:
+        return source.read(info)
+    except (EOFError, zlib.error) as e:
+        raise zipfile.BadZipFile(f"Corrupt data for '{info.filename}': {e}") from e
+
+
+def _encode_entry(zinfo: zipfile.ZipInfo, data: bytes) -> tuple[zipfile.ZipInfo, bytes]:
+    """
+    Fills in the CRC and sizes of `zinfo` and returns the data as it goes on disk,
+    deflated if the entry asks for it. zlib releases the GIL while it works.
+    """
+    zinfo.CRC = zlib.crc32(data)
+    zinfo.file_size = len(data)
+    if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        data = compressor.compress(data) + compressor.flush()
+    zinfo.compress_size = len(data)
+    return zinfo, data
+
+
+def _encode_file(zinfo: zipfile.ZipInfo, file_path) -> tuple[zipfile.ZipInfo, bytes]:
+    with open(file_path, "rb") as f:
+        return _encode_entry(zinfo, f.read())
+
+
+class ParallelZipWriter:
+    """
+    Adds entries to an open ZipFile in the order they are given while hashing and
+    deflating them on a thread pool. The compression method of every entry comes
+    from compress_type_for, so images are stored and XML is deflated. Entries are
+    written by the calling thread only, sequentially; at most `window` entries
+    wait in memory, so memory use stays bounded for large archives. Without the
+    zipfile internals write_raw_entry needs, entries are written one by one with
+    the public API instead.
+    """
+
+    def __init__(
+        self,
+        target: zipfile.ZipFile,
+        workers: int = ZIP_WORKERS,
+        window: int | None = None,
+    ):
+        self.target = target
+        self.window = window or max(2, workers * 2)
+        self._raw = supports_raw_write(target)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="zip"
+        )
+        self._pending: deque = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        return False
+
+    def add_bytes(self, data: bytes, arcname: str, date_time=None) -> None:
+        zinfo = zipfile.ZipInfo(
+            arcname, date_time=date_time or time.localtime(time.time())[:6]
+        )
+        zinfo.compress_type = compress_type_for(arcname)
+        if not self._raw:
+            self.target.writestr(zinfo, data)
+            return
+        self._submit(self._executor.submit(_encode_entry, zinfo, data))
+
+    def add_file(self, file_path, arcname: str) -> None:
+        if not self._raw:
+            self.target.write(file_path, arcname, compress_type=compress_type_for(arcname))
+            return
+        zinfo = zipfile.ZipInfo.from_file(
+            file_path, arcname, strict_timestamps=self.target._strict_timestamps
+        )
+        zinfo.compress_type = compress_type_for(arcname)
+        self._submit(self._executor.submit(_encode_file, zinfo, file_path))
+
+    def copy_entry(
+        self, source: zipfile.ZipFile, info: zipfile.ZipInfo, arcname: str
+    ) -> None:
+        """
+        Adds one entry of another archive. Stored or deflated entries are copied raw
+        right away, after the entries queued before them; others are decompressed
+        here and re-encoded on the pool. Either way `source` is no longer needed
+        once this returns.
+        """
+        if _can_copy_raw(info):
+            self.flush()
+            copy_zip_entry(source, info, self.target, arcname)
+            return
+        zinfo = zipfile.ZipInfo(arcname, date_time=info.date_time)
+        zinfo.external_attr = info.external_attr
+        zinfo.compress_type = compress_type_for(arcname)
+        data = read_entry(source, info)
+        if not self._raw:
+            self.target.writestr(zinfo, data)
+            return
+        self._submit(self._executor.submit(_encode_entry, zinfo, data))
+
+    def _submit(self, future: Future) -> None:
+        self._pending.append(future)
+        # Write whatever is ready at the head; block only once the window is full
+        while self._pending and (
+            len(self._pending) > self.window or self._pending[0].done()
+        ):
+            self._write_next()
+
+    def _write_next(self) -> None:
+        zinfo, data = self._pending.popleft().result()
+        write_raw_entry(self.target, zinfo, (data,))
+
+    def flush(self) -> None:
+        """
+        Writes every queued entry.
+        """
+        while self._pending:
+            self._write_next()
+
+    def mark(self) -> tuple[int, int] | None:
+        """
+        Writes every queued entry and returns a point the archive can be cut back to
+        with rollback(), or None when the public-API fallback is in use.
+        """
+        self.flush()
+        if not self._raw:
+            return None
+        return len(self.target.filelist), self.target.start_dir
+
+    def rollback(self, mark: tuple[int, int]) -> None:
+        """
+        Drops every entry queued or written since `mark`.
+        """
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        count, start_dir = mark
+        for zinfo in self.target.filelist[count:]:
+            self.target.NameToInfo.pop(zinfo.filename, None)
+        del self.target.filelist[count:]
+        self.target.start_dir = start_dir
+        self.target.fp.seek(start_dir)
+        self.target.fp.truncate()
+
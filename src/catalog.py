@@ -0,0 +1,291 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import json
+import logging
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+import zipfile
+
+from .archive import get_sorted_image_entries
+from .constants import CACHE_DIR, CATALOG_SCAN_WORKERS, LIBRARY_CATALOG_FILE
+from .sqlite_store import init_db, open_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    pages TEXT,
+    error TEXT,
+    scanned_at REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class PageEntry:
+    """
+    One image of an archive as described by its central directory entry.
+    """
+
+    name: str
+    file_size: int
+    compress_size: int
+    compress_type: int
+    crc: int
+
+
+@dataclass
+class ArchiveManifest:
+    """
+    The sorted pages of one CBZ, valid for the file size and mtime it was read at.
+    `error` is set instead of pages when the archive could not be read.
+    """
+
+    path: Path
+    size: int
+    mtime_ns: int
+    pages: list[PageEntry] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def image_bytes(self) -> int:
+        return sum(page.file_size for page in self.pages)
+
+    @property
+    def first_page(self) -> PageEntry | None:
+        return self.pages[0] if self.pages else None
+
+
+def read_manifest(cbz_path: Path) -> ArchiveManifest:
+    """
+    Builds the manifest of a CBZ from its central directory; no entry data is read.
+    """
+    stat = cbz_path.stat()
+    manifest = ArchiveManifest(
+        path=cbz_path, size=stat.st_size, mtime_ns=stat.st_mtime_ns
+    )
+    try:
+        with zipfile.ZipFile(cbz_path, "r") as zip_ref:
+            manifest.pages = [
+                PageEntry(
+                    name=info.filename,
+                    file_size=info.file_size,
+                    compress_size=info.compress_size,
+                    compress_type=info.compress_type,
+                    crc=info.CRC,
+                )
+                for info in get_sorted_image_entries(zip_ref)
+            ]
+    except (zipfile.BadZipFile, OSError) as e:
+        manifest.error = str(e) or type(e).__name__
+    return manifest
+
+
+def _missing_manifest(cbz_path: Path, error: OSError) -> ArchiveManifest:
+    return ArchiveManifest(
+        path=cbz_path, size=0, mtime_ns=0, error=str(error) or type(error).__name__
+    )
+
+
+def _scan_manifest(cbz_path: Path) -> tuple[ArchiveManifest, bool]:
+    """
+    Reads the manifest of `cbz_path`; the flag is False if the file is gone.
+    """
+    try:
+        return read_manifest(cbz_path), True
+    except FileNotFoundError as e:
+        return _missing_manifest(cbz_path, e), False
+
+
+class LibraryCatalog:
+    """
+    SQLite catalog of the page manifests of every CBZ seen so far, keyed by
+    resolved path and only trusted while the file's size and mtime are unchanged.
+    Refreshing a folder costs one stat per file; only new or modified archives
+    are opened, and then only their central directory is read.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else CACHE_DIR / LIBRARY_CATALOG_FILE
+        self._lock = threading.Lock()
+        init_db(self.path, _SCHEMA)
+
+    def _load(self, keys: list[str]) -> dict[str, tuple]:
+        rows = {}
+        with self._lock, open_db(self.path) as conn:
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                rows.update(
+                    (row[0], row)
+                    for row in conn.execute(
+                        f"""
+                        SELECT path, size, mtime_ns, pages, error FROM archives
+                        WHERE path IN ({', '.join('?' for _ in batch)})
+                        """,
+                        batch,
+                    )
+                )
+        return rows
+
+    def _store(self, manifests: list[ArchiveManifest]) -> None:
+        with self._lock, open_db(self.path) as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO archives (path, size, mtime_ns, pages, error, scanned_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        str(manifest.path.resolve()),
+                        manifest.size,
+                        manifest.mtime_ns,
+                        json.dumps(
+                            [
+                                [
+                                    page.name,
+                                    page.file_size,
+                                    page.compress_size,
+                                    page.compress_type,
+                                    page.crc,
+                                ]
+                                for page in manifest.pages
+                            ]
+                        ),
+                        manifest.error,
+                        time.time(),
+                    )
+                    for manifest in manifests
+                ],
+            )
+
+    def _forget(self, keys: list[str]) -> None:
+        with self._lock, open_db(self.path) as conn:
+            conn.executemany(
+                "DELETE FROM archives WHERE path = ?", [(key,) for key in keys]
+            )
+
+    def refresh(
+        self, cbz_files: list[Path], persist: bool = True
+    ) -> dict[Path, ArchiveManifest]:
+        """
+        Returns the manifest of every file in `cbz_files`, re-reading the central
+        directory of archives that are new or whose size or mtime changed.
+        Files that no longer exist get a manifest with `error` set and their
+        entries are dropped. Without `persist` the catalog is only read.
+        """
+        manifests = {}
+        stats = {}
+        missing = []
+        for cbz in cbz_files:
+            try:
+                stats[cbz] = cbz.stat()
+            except FileNotFoundError as e:
+                # Deleted or renamed since the folder was listed
+                manifests[cbz] = _missing_manifest(cbz, e)
+                missing.append(cbz)
+        rows = self._load([str(cbz.resolve()) for cbz in stats])
+
+        stale = []
+        for cbz, stat in stats.items():
+            row = rows.get(str(cbz.resolve()))
+            if row and row[1] == stat.st_size and row[2] == stat.st_mtime_ns:
+                manifests[cbz] = _row_to_manifest(cbz, row)
+            else:
+                stale.append(cbz)
+
+        if stale:
+            logging.debug(f"Reading the central directory of {len(stale)} archives...")
+            with ThreadPoolExecutor(
+                max_workers=CATALOG_SCAN_WORKERS, thread_name_prefix="catalog"
+            ) as executor:
+                scanned = list(executor.map(_scan_manifest, stale))
+            for manifest, present in scanned:
+                manifests[manifest.path] = manifest
+                if not present:
+                    missing.append(manifest.path)
+            if persist:
+                self._store([manifest for manifest, present in scanned if present])
+
+        if missing and persist:
+            self._forget([str(cbz.resolve()) for cbz in missing])
+
+        for manifest in manifests.values():
+            if manifest.error:
+                logging.warning(
+                    f"Unreadable archive '{manifest.path.name}': {manifest.error}"
+                )
+        return {cbz: manifests[cbz] for cbz in cbz_files}
+
+    def forget_missing(self, directory: Path) -> int:
+        """
+        Drops the entries of archives under `directory` that no longer exist.
+        Returns how many were removed.
+        """
+        prefix = os.path.join(str(directory.resolve()), "")
+        with self._lock, open_db(self.path) as conn:
+            paths = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT path FROM archives WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix),
+                )
+            ]
+        missing = [path for path in paths if not Path(path).exists()]
+        self._forget(missing)
+        return len(missing)
+
+
+def _row_to_manifest(cbz_path: Path, row) -> ArchiveManifest:
+    _, size, mtime_ns, pages, error = row
+    return ArchiveManifest(
+        path=cbz_path,
+        size=size,
+        mtime_ns=mtime_ns,
+        pages=[PageEntry(*page) for page in json.loads(pages or "[]")],
+        error=error,
+    )
+
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+
+def get_library_catalog(create: bool = True) -> LibraryCatalog | None:
+    """
+    Returns the shared catalog in CACHE_DIR, or None if it cannot be opened.
+    Without `create`, None is also returned while no catalog file exists yet.
+    """
+    global _default_catalog
+    with _default_catalog_lock:
+        if _default_catalog is None:
+            if not create and not (CACHE_DIR / LIBRARY_CATALOG_FILE).exists():
+                return None
+            try:
+                _default_catalog = LibraryCatalog()
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"Library catalog unavailable, reading archives: {e}")
+                return None
+        return _default_catalog
+
+
+def load_manifests(
+    cbz_files: list[Path], dry_run: bool = False
+) -> dict[Path, ArchiveManifest]:
+    """
+    Returns the manifests of `cbz_files` from the shared catalog, or read straight
+    from the archives if the catalog is unavailable. A dry run reads the catalog
+    if there is one but never creates or updates it.
+    """
+    catalog = get_library_catalog(create=not dry_run)
+    if catalog:
+        return catalog.refresh(cbz_files, persist=not dry_run)
+    return {cbz: _scan_manifest(cbz)[0] for cbz in cbz_files}
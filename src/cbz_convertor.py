@@ -1,41 +1,44 @@
+from dataclasses import dataclass
 import logging
+import os
 from pathlib import Path
 import subprocess
+import tempfile
 import zipfile
 
-from .utils import create_comic_info_xml
+from .constants import COMIC_INFO_NAME, DEVICE_PROFILE, KCC_OUTPUT_LIMIT, KCC_TIMEOUT
+from .tracing import span
+from .utils import build_comic_info_xml
 
 
-def convert_cbz_to_mobi(
-    project_root: Path, cbz_path: Path, author, title, metadata: dict
-) -> bool:
+def ensure_comic_info(cbz_path: Path, metadata: dict) -> bool:
     """
-    Calls KCC via subprocess to convert a .cbz file to Kindle format (MOBI).
-    Adds metadata (author, title, etc.), uses KPW5 profile, etc.
-    Returns True if conversion is successful, False otherwise.
+    Adds ComicInfo.xml to the CBZ unless it is already present.
+    Returns True if the CBZ ends up containing ComicInfo.xml, False otherwise.
     """
-    # Generate ComicInfo.xml and add it to the CBZ
-    comic_info_path = cbz_path.parent / "ComicInfo.xml"
-
-    if not create_comic_info_xml(metadata, comic_info_path):
-        logging.error("Failed to create ComicInfo.xml. Skipping KCC conversion.")
-        return False
-
-    # Ensure ComicInfo.xml is inside the CBZ
     try:
-        with zipfile.ZipFile(cbz_path, "a") as zipf:
-            zipf.write(comic_info_path, "ComicInfo.xml")
+        with zipfile.ZipFile(cbz_path, "r") as zipf:
+            if COMIC_INFO_NAME in zipf.namelist():
+                logging.debug(f"'{cbz_path.name}' already contains ComicInfo.xml.")
+                return True
+        with span("comic_info", output=cbz_path.name), zipfile.ZipFile(
+            cbz_path, "a", zipfile.ZIP_DEFLATED
+        ) as zipf:
+            zipf.writestr(COMIC_INFO_NAME, build_comic_info_xml(metadata))
         logging.debug(f"Added ComicInfo.xml to '{cbz_path.name}'.")
+        return True
     except Exception as e:
         logging.error(f"Failed to add ComicInfo.xml to '{cbz_path.name}': {e}")
         return False
 
-    kcc_path = str(project_root / "bin" / "kcc.exe")
-    # Define the KCC command
-    kcc_cmd = [
-        kcc_path,
+
+def build_kcc_options(author, title) -> list[str]:
+    """
+    Returns the KCC arguments used for every conversion, minus the executable and input file.
+    """
+    return [
         "-p",
-        "KPW5",  # Profile for Kindle Paperwhite
+        DEVICE_PROFILE,  # Profile for Kindle Paperwhite
         "-f",
         "MOBI",
         "-m",  # Manga mode (right-to-left)
@@ -45,21 +48,96 @@ def convert_cbz_to_mobi(
         "--title",
         title,
         "--dedupecover",
-        str(cbz_path),
     ]
 
+
+@dataclass
+class KccResult:
+    """
+    Outcome of one KCC run; truthy when the conversion succeeded.
+    `output` holds the combined stdout and stderr, trimmed to KCC_OUTPUT_LIMIT.
+    """
+
+    success: bool
+    returncode: int | None = None
+    output: str = ""
+    error: str | None = None
+
+    def __bool__(self) -> bool:
+        return self.success
+
+
+def _read_output(output_file) -> str:
+    output_file.seek(0, os.SEEK_END)
+    output_file.seek(max(0, output_file.tell() - KCC_OUTPUT_LIMIT))
+    return output_file.read().decode("utf-8", errors="replace")
+
+
+def convert_cbz_to_mobi(
+    project_root: Path,
+    cbz_path: Path,
+    author,
+    title,
+    metadata: dict,
+    timeout: float | None = KCC_TIMEOUT,
+) -> KccResult:
+    """
+    Calls KCC via subprocess to convert a .cbz file to Kindle format (MOBI).
+    Adds metadata (author, title, etc.), uses KPW5 profile, etc.
+    KCC is killed if it runs longer than `timeout` seconds; its output is captured
+    and returned with the result instead of being printed.
+    """
+    # Ensure ComicInfo.xml is inside the CBZ; packs built by write_pack_cbz already carry it
+    if not ensure_comic_info(cbz_path, metadata):
+        logging.error("Failed to add ComicInfo.xml. Skipping KCC conversion.")
+        return KccResult(False, error="Failed to add ComicInfo.xml")
+
+    kcc_path = str(project_root / "bin" / "kcc.exe")
+    # Define the KCC command
+    kcc_cmd = [kcc_path, *build_kcc_options(author, title), str(cbz_path)]
+
     logging.info(f"Running KCC command: {' '.join(kcc_cmd)}")
-    try:
-        subprocess.run(kcc_cmd, check=True)
-        logging.info(f"KCC conversion succeeded for '{cbz_path.name}'.")
-        if comic_info_path.exists():
-            comic_info_path.unlink()
-            logging.debug(f"Deleted temporary ComicInfo.xml file: {comic_info_path}")
-        return True
-    except subprocess.CalledProcessError as e:
-        logging.error(f"KCC conversion failed for '{cbz_path.name}': {e}")
-    except FileNotFoundError:
+    # Output goes to a file rather than a pipe: a pipe kept open by a child process of
+    # KCC would block the wait after a timeout kill
+    with tempfile.TemporaryFile() as output_file:
+        try:
+            with span("kcc_run", output=cbz_path.name) as kcc_span:
+                completed = subprocess.run(
+                    kcc_cmd,
+                    stdout=output_file,
+                    stderr=subprocess.STDOUT,
+                    stdin=subprocess.DEVNULL,
+                    timeout=timeout,
+                )
+                kcc_span.set(returncode=completed.returncode)
+        except subprocess.TimeoutExpired:
+            logging.error(
+                f"KCC conversion of '{cbz_path.name}' timed out after {timeout:g} seconds."
+            )
+            return KccResult(
+                False,
+                output=_read_output(output_file),
+                error=f"Timed out after {timeout:g}s",
+            )
+        except FileNotFoundError:
+            logging.error(
+                "KCC executable not found. Please ensure KCC is installed and in your PATH."
+            )
+            return KccResult(False, error="KCC executable not found")
+        output = _read_output(output_file)
+
+    if completed.returncode != 0:
         logging.error(
-            "KCC executable not found. Please ensure KCC is installed and in your PATH."
+            f"KCC conversion failed for '{cbz_path.name}' with exit code {completed.returncode}."
+        )
+        if output:
+            logging.error(f"KCC output:\n{output[-2000:]}")
+        return KccResult(
+            False,
+            returncode=completed.returncode,
+            output=output,
+            error=f"Exit code {completed.returncode}",
         )
-    return False
+    logging.debug(f"KCC output:\n{output}")
+    logging.info(f"KCC conversion succeeded for '{cbz_path.name}'.")
+    return KccResult(True, returncode=0, output=output)
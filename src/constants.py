@@ -1,5 +1,92 @@
+import os
+from pathlib import Path
+
 # Constants
 CHAPTERS_PER_PART = 15
+# Pack grouping: 'chapters' (fixed count), or balanced by 'pages' or uncompressed 'bytes'
+GROUPING_MODES = ("chapters", "pages", "bytes")
+GROUPING_MODE = "chapters"
+PAGES_PER_PART = 400
+BYTES_PER_PART = 150 * 1024 * 1024
+MIN_CHAPTERS_PER_PART = 1
+MAX_CHAPTERS_PER_PART = 60
 IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
 FORCE_OVERWRITE = False
-STATUS_FILE = "processing_status.json"
+STATUS_FILE = "processing_status.json"  # legacy format, migrated into STATUS_DB on load
+STATUS_DB = "processing_status.sqlite3"
+# Already-compressed image formats are stored as-is inside CBZs; deflating them again gains nothing
+STORED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+COMIC_INFO_NAME = "ComicInfo.xml"
+# Pipeline: workers per stage and how many finished packs may wait between stages
+COMBINE_WORKERS = 1
+CONVERT_WORKERS = 1
+PIPELINE_QUEUE_SIZE = 1
+# Library scheduler: concurrent jobs per resource pool
+NETWORK_WORKERS = 2
+DISK_WORKERS = 2
+CPU_WORKERS = 4
+# Persistent caches shared by every run; override the location with MANGA_CACHE_DIR
+CACHE_DIR = Path(
+    os.environ.get("MANGA_CACHE_DIR", Path.home() / ".cache" / "manga-processing")
+)
+METADATA_CACHE_FILE = "metadata_cache.sqlite3"
+METADATA_CACHE_TTL = 30 * 24 * 60 * 60  # seconds a successful Jikan lookup is reused
+METADATA_NEGATIVE_TTL = 24 * 60 * 60  # seconds a failed lookup is remembered
+COVER_CACHE_DIR = CACHE_DIR / "covers"
+COVER_REVALIDATE_AFTER = 24 * 60 * 60  # seconds before a cached cover URL is revalidated
+LIBRARY_CATALOG_FILE = "library_catalog.sqlite3"
+CATALOG_SCAN_WORKERS = 8  # archives whose central directory is read concurrently
+# Device profile used by KCC and by the optional pre-rasterization stage (screen width, height)
+DEVICE_PROFILE = "KPW5"
+DEVICE_PROFILES = {
+    "KPW": (1072, 1448),
+    "KPW5": (1236, 1648),
+    "KO": (1264, 1680),
+    "KS": (1860, 2480),
+}
+RASTERIZE_WORKERS = os.cpu_count() or 1
+RASTERIZE_JPEG_QUALITY = 90
+TRIM_TOLERANCE = 16  # shade difference still treated as margin
+TRIM_MIN_KEEP = 0.5  # never trim a page to less than this fraction of its width or height
+# Duplicate page removal (credit pages, banners): Hamming distance between 64-bit dHashes,
+# chapters a page must repeat in, pages hashed at each end of a chapter (0 = all), and
+# the largest share of a pack's pages that may be dropped before the pack is left whole
+DEDUPE_MAX_DISTANCE = 4
+DEDUPE_MIN_REPEATS = 3
+DEDUPE_EDGE_PAGES = 3
+DEDUPE_MAX_SHARE = 0.25
+DEDUPE_WORKERS = os.cpu_count() or 1
+DEDUPE_ALLOWLIST_FILE = CACHE_DIR / "dedupe_allowlist.txt"
+FIX_WORKERS = 4  # archives repaired in parallel by scripts/fix_cbz.py
+WATCH_DEBOUNCE = 30  # seconds a series folder must stay unchanged before --watch processes it
+WATCH_POLL_INTERVAL = 10  # seconds between library scans when inotify is unavailable
+WATCH_MIN_WAIT = 0.5  # shortest wait between watch checks, so a debounce of 0 does not spin
+# Conversion queue: seconds before a KCC run is killed, runs per job and captured output kept
+CONVERSION_QUEUE_FILE = "conversion_queue.sqlite3"
+KCC_TIMEOUT = 60 * 60
+KCC_MAX_ATTEMPTS = 2
+KCC_OUTPUT_LIMIT = 64 * 1024
+CALIBRE_BATCH_SIZE = 50  # MOBI files passed to a single 'calibredb add'
+IMPORT_INDEX_FILE = "import_index.sqlite3"  # files already added to each Calibre library
+# Disk admission: bytes packs may reserve at once per volume (None = limited by free space
+# only), free space always left untouched and seconds between checks while a pack waits
+DISK_BUDGET = None
+DISK_FREE_RESERVE = 1024 * 1024 * 1024
+ADMISSION_RECHECK_INTERVAL = 5
+ZIP_ENTRY_OVERHEAD = 128  # local header, central directory record and file name, roughly
+KCC_WORK_FACTOR = 1.5  # KCC's work folder relative to the pack's uncompressed pages
+KCC_OUTPUT_FACTOR = 2.0  # EPUB plus MOBI written by KCC relative to the combined CBZ
+# Packs whose combined CBZ is estimated at most RAM_STAGING_MAX_PACK bytes are assembled in
+# memory and written with one sequential write, while all staged packs fit in RAM_STAGING_LIMIT.
+# Off (0) unless enabled with --ram-staging-mb; 512 MB per pack and 2 GB in total suit most machines
+RAM_STAGING_MAX_PACK = 0
+RAM_STAGING_LIMIT = 0
+ZIP_WORKERS = os.cpu_count() or 1  # threads hashing and deflating entries for ParallelZipWriter
+# Offline title index built from a Jikan dump (scripts/title_index.py); matches scoring at least
+# TITLE_INDEX_MIN_SCORE (WRatio) and TITLE_INDEX_MIN_RATIO (plain ratio, so a title that merely
+# contains the name is not enough) skip the network. Words shared by more titles than
+# TITLE_INDEX_MAX_POSTINGS are too common to pick fuzzy match candidates with
+TITLE_INDEX_FILE = "title_index.sqlite3"
+TITLE_INDEX_MIN_SCORE = 90
+TITLE_INDEX_MIN_RATIO = 80
+TITLE_INDEX_MAX_POSTINGS = 2000
@@ -0,0 +1,195 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+
+from .archive import get_sorted_image_entries
+from .constants import COVER_CACHE_DIR, COVER_REVALIDATE_AFTER
+from .sqlite_store import init_db, open_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS covers (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    suffix TEXT NOT NULL,
+    source_entry TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+class CoverCache:
+    """
+    Persistent, content-addressed store of cover images shared by every pack and run.
+    Images are stored once under the SHA-256 of their bytes and looked up either by
+    URL (revalidated with ETag/If-Modified-Since) or by source CBZ, in which case the
+    key includes the archive's size and mtime so a replaced chapter is re-read.
+    The returned paths point into the cache and must not be deleted by callers.
+    """
+
+    def __init__(self, root: Path | None = None):
+        self.root = Path(root) if root else COVER_CACHE_DIR
+        self.blob_dir = self.root / "blobs"
+        self.db_path = self.root / "covers.sqlite3"
+        self._lock = threading.Lock()
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        init_db(self.db_path, _SCHEMA)
+
+    def _blob_path(self, digest: str, suffix: str) -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}{suffix}"
+
+    def _store_blob(self, data: bytes, suffix: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest, suffix)
+        if not blob_path.exists():
+            blob_path.parent.mkdir(exist_ok=True)
+            # Written under a temporary name so concurrent readers never see a partial image
+            fd, tmp_name = tempfile.mkstemp(dir=blob_path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            Path(tmp_name).replace(blob_path)
+        return digest
+
+    def _lookup(self, key: str):
+        with self._lock, open_db(self.db_path) as conn:
+            return conn.execute(
+                "SELECT digest, suffix, etag, last_modified, checked_at FROM covers WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+    def _record(
+        self,
+        key: str,
+        digest: str,
+        suffix: str,
+        source_entry: str | None = None,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        with self._lock, open_db(self.db_path) as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO covers
+                    (key, digest, suffix, source_entry, etag, last_modified, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, digest, suffix, source_entry, etag, last_modified, time.time()),
+            )
+
+    def _touch(self, key: str) -> None:
+        with self._lock, open_db(self.db_path) as conn:
+            conn.execute(
+                "UPDATE covers SET checked_at = ? WHERE key = ?", (time.time(), key)
+            )
+
+    def fetch_url(self, url: str, session, timeout: float) -> Path | None:
+        """
+        Returns the cached cover for `url`, downloading it with `session` (a
+        requests.Session) if it is new. Known URLs older than COVER_REVALIDATE_AFTER
+        are revalidated with a conditional request; if the server is unreachable the
+        cached copy is used as is.
+        """
+        key = f"url:{url}"
+        row = self._lookup(key)
+        cached_path = self._blob_path(row[0], row[1]) if row else None
+        if cached_path and not cached_path.exists():
+            row, cached_path = None, None
+
+        if row and time.time() - row[4] < COVER_REVALIDATE_AFTER:
+            logging.debug(f"Using cached cover image '{cached_path}'.")
+            return cached_path
+
+        headers = {}
+        if row and row[2]:
+            headers["If-None-Match"] = row[2]
+        if row and row[3]:
+            headers["If-Modified-Since"] = row[3]
+
+        try:
+            response = session.get(url, headers=headers, timeout=timeout)
+            if response.status_code == 304 and cached_path:
+                self._touch(key)
+                logging.debug(f"Cover image unchanged, using '{cached_path}'.")
+                return cached_path
+            response.raise_for_status()
+        except Exception as e:
+            if cached_path:
+                logging.warning(
+                    f"Could not revalidate cover image, using cached copy: {e}"
+                )
+                return cached_path
+            raise
+
+        suffix = Path(url.split("?", 1)[0]).suffix or ".jpg"
+        digest = self._store_blob(response.content, suffix)
+        self._record(
+            key,
+            digest,
+            suffix,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        logging.debug(f"Cover image downloaded into cache for '{url}'.")
+        return self._blob_path(digest, suffix)
+
+    def extract_from_cbz(
+        self, cbz_path: Path, entry_name: str | None = None
+    ) -> Path | None:
+        """
+        Returns the first image of `cbz_path` (or `entry_name`, when the caller
+        already knows it), reading the archive only if this exact file (same path,
+        size and mtime) has not been seen before.
+        """
+        stat = cbz_path.stat()
+        key = f"cbz:{cbz_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+        row = self._lookup(key)
+        if row:
+            cached_path = self._blob_path(row[0], row[1])
+            if cached_path.exists():
+                logging.debug(f"Using cached cover image '{cached_path}'.")
+                return cached_path
+
+        with zipfile.ZipFile(cbz_path, "r") as cbz:
+            entries = (
+                [cbz.getinfo(entry_name)] if entry_name else get_sorted_image_entries(cbz)
+            )
+            if not entries:
+                logging.warning(f"No image files found in '{cbz_path}'.")
+                return None
+            first_image = entries[0]
+            data = cbz.read(first_image)
+
+        suffix = Path(first_image.filename).suffix
+        digest = self._store_blob(data, suffix)
+        self._record(key, digest, suffix, source_entry=first_image.filename)
+        logging.info(
+            f"Extracted cover image from '{cbz_path.name}' into the cover cache."
+        )
+        return self._blob_path(digest, suffix)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cover_cache() -> CoverCache | None:
+    """
+    Returns the shared cover cache in COVER_CACHE_DIR, or None if it cannot be opened.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = CoverCache()
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"Cover cache unavailable, using temporary files: {e}")
+                return None
+        return _default_cache
+
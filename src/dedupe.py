@@ -0,0 +1,251 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import io
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING
+import zipfile
+
+from .catalog import ArchiveManifest, load_manifests
+from .constants import (
+    DEDUPE_ALLOWLIST_FILE,
+    DEDUPE_EDGE_PAGES,
+    DEDUPE_MAX_DISTANCE,
+    DEDUPE_MAX_SHARE,
+    DEDUPE_MIN_REPEATS,
+    DEDUPE_WORKERS,
+)
+
+# numpy and Pillow are imported by the functions that hash pages, so runs
+# without --dedupe never load them
+if TYPE_CHECKING:
+    import numpy as np
+
+HASH_SIZE = 8  # dHash of a 9x8 thumbnail -> 64 bits
+UNIFORM_PAGE_STDDEV = 3.0  # thumbnails flatter than this are blank pages, never "repeated"
+
+
+@dataclass
+class DedupeOptions:
+    """
+    Which pages count as duplicates: those within `max_distance` bits of an
+    allow-listed hash, or repeated in at least `min_repeats` chapters of a series.
+    Only the first and last `edge_pages` pages of each chapter are hashed
+    (0 hashes every page), which is where credit pages and banners live. A pack
+    that would lose more than `max_share` of its pages is left whole.
+    """
+
+    max_distance: int = DEDUPE_MAX_DISTANCE
+    min_repeats: int = DEDUPE_MIN_REPEATS
+    edge_pages: int = DEDUPE_EDGE_PAGES
+    max_share: float = DEDUPE_MAX_SHARE
+    allowlist: list[int] = field(default_factory=list)
+
+    @classmethod
+    def from_args(cls, args) -> "DedupeOptions":
+        return cls(
+            max_distance=args.dedupe_distance,
+            min_repeats=args.dedupe_min_repeats,
+            edge_pages=args.dedupe_edge_pages,
+            max_share=args.dedupe_max_share,
+            allowlist=load_allowlist(),
+        )
+
+    @property
+    def settings(self) -> dict:
+        """
+        Everything that affects which pages are dropped, for pack fingerprints.
+        """
+        return {
+            "max_distance": self.max_distance,
+            "min_repeats": self.min_repeats,
+            "edge_pages": self.edge_pages,
+            "max_share": self.max_share,
+            "allowlist": sorted(f"{value:016x}" for value in self.allowlist),
+        }
+
+
+@dataclass
+class RemovedPage:
+    cbz_path: Path
+    name: str
+    page_hash: int
+    reason: str
+
+
+def load_allowlist(path: Path = DEDUPE_ALLOWLIST_FILE) -> list[int]:
+    """
+    Reads hex dHashes (one per line, '#' starts a comment) of pages that are always dropped.
+    """
+    if not path.exists():
+        return []
+    hashes = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        value = line.split("#", 1)[0].strip()
+        if not value:
+            continue
+        try:
+            hashes.append(int(value, 16))
+        except ValueError:
+            logging.warning(f"Ignoring invalid hash '{value}' in '{path}'.")
+    return hashes
+
+
+def page_thumbnail(data: bytes) -> "np.ndarray":
+    """
+    Decodes a page straight to the small grayscale thumbnail the hash is computed on.
+    JPEGs are decoded at a reduced scale, which is much cheaper than a full decode.
+    """
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        thumbnail = image.convert("L").resize(
+            (HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR
+        )
+    return np.asarray(thumbnail, dtype=np.int16)
+
+
+def dhash_batch(thumbnails: "np.ndarray") -> "np.ndarray":
+    """
+    Computes the 64-bit difference hashes of a (N, 8, 9) stack of thumbnails at once.
+    """
+    import numpy as np
+
+    bits = thumbnails[:, :, 1:] > thumbnails[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(thumbnails), -1), axis=1)
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+
+def hamming_distances(left: "np.ndarray", right: "np.ndarray") -> "np.ndarray":
+    """
+    Returns the (len(left), len(right)) matrix of bit differences between two hash arrays.
+    """
+    import numpy as np
+
+    return np.bitwise_count(left[:, None] ^ right[None, :])
+
+
+def _edge_page_names(manifest: ArchiveManifest, edge_pages: int) -> list[str]:
+    names = [page.name for page in manifest.pages]
+    if edge_pages <= 0 or len(names) <= edge_pages * 2:
+        return names
+    return names[:edge_pages] + names[-edge_pages:]
+
+
+def _read_thumbnails(
+    cbz_path: Path, names: list[str]
+) -> list[tuple[str, "np.ndarray"]]:
+    thumbnails = []
+    try:
+        with zipfile.ZipFile(cbz_path, "r") as zip_ref:
+            for name in names:
+                try:
+                    thumbnails.append((name, page_thumbnail(zip_ref.read(name))))
+                except Exception as e:
+                    logging.debug(f"Cannot hash '{name}' in '{cbz_path.name}': {e}")
+    except zipfile.BadZipFile:
+        logging.error(f"Failed to read '{cbz_path.name}': Bad zip file.")
+    return thumbnails
+
+
+def find_duplicate_pages(
+    cbz_files: list[Path],
+    options: DedupeOptions,
+    manifests: dict[Path, ArchiveManifest] | None = None,
+    earlier_files: list[Path] | None = None,
+    thumbnail_cache: dict | None = None,
+) -> list[RemovedPage]:
+    """
+    Hashes the edge pages of every chapter of a pack and returns the ones to drop:
+    pages close to an allow-listed hash, and pages repeated (within the Hamming
+    distance) in at least `min_repeats` different chapters, except the first copy.
+    Repeats are counted over the pack and the `earlier_files` of the series before
+    it, so small and last packs are deduped too, and the result for a pack does not
+    change when chapters are appended. Blank pages are only dropped when
+    allow-listed. If more than `max_share` of the pack's pages would be dropped,
+    nothing is and a warning is logged.
+    Thumbnails are kept in `thumbnail_cache` ({chapter path: thumbnails}) when it
+    is given, so the earlier chapters are read once per series, not once per pack.
+    """
+    import numpy as np
+
+    earlier_files = list(earlier_files or [])
+    series_files = earlier_files + list(cbz_files)
+    if manifests is None:
+        manifests = load_manifests(series_files)
+    cache = thumbnail_cache if thumbnail_cache is not None else {}
+
+    missing = [cbz for cbz in series_files if cbz not in cache]
+    if missing:
+        with ThreadPoolExecutor(
+            max_workers=DEDUPE_WORKERS, thread_name_prefix="dedupe"
+        ) as executor:
+            thumbnails = executor.map(
+                lambda cbz: _read_thumbnails(
+                    cbz, _edge_page_names(manifests[cbz], options.edge_pages)
+                ),
+                missing,
+            )
+            cache.update(zip(missing, thumbnails))
+
+    pages = [
+        (cbz, name, chapter_number)
+        for chapter_number, cbz in enumerate(series_files)
+        for name, _ in cache[cbz]
+    ]
+    # Only the pack's own pages, which come after those of the earlier chapters, can go
+    first = sum(len(cache[cbz]) for cbz in earlier_files)
+    if first == len(pages):
+        return []
+    thumbnails = np.stack([thumbnail for cbz in series_files for _, thumbnail in cache[cbz]])
+    hashes = dhash_batch(thumbnails)
+    uniform = thumbnails.reshape(len(thumbnails), -1).std(axis=1) < UNIFORM_PAGE_STDDEV
+    pack_hashes = hashes[first:]
+
+    # Distinct chapters holding a page close to each page of the pack
+    chapter_ids = np.array([chapter_number for _, _, chapter_number in pages])
+    close = hamming_distances(pack_hashes, hashes) <= options.max_distance
+    repeats = np.array([len(np.unique(chapter_ids[row])) for row in close])
+    # The first copy of a repeated page stays; only pages with an earlier copy go
+    positions = np.arange(first, len(pages))
+    has_earlier_copy = (close & (np.arange(len(pages)) < positions[:, None])).any(axis=1)
+    repeated = (repeats >= options.min_repeats) & ~uniform[first:] & has_earlier_copy
+
+    reasons = np.full(len(pack_hashes), "", dtype=object)
+    reasons[repeated] = [f"repeated in {count} chapters" for count in repeats[repeated]]
+
+    if options.allowlist:
+        allowlist = np.array(options.allowlist, dtype=np.uint64)
+        allowed = (
+            hamming_distances(pack_hashes, allowlist) <= options.max_distance
+        ).any(axis=1)
+        reasons[allowed] = "allow-listed"
+
+    removed = [
+        RemovedPage(cbz_path=cbz, name=name, page_hash=int(page_hash), reason=reason)
+        for (cbz, name, _), page_hash, reason in zip(pages[first:], pack_hashes, reasons)
+        if reason
+    ]
+    page_count = sum(manifests[cbz].page_count for cbz in cbz_files)
+    if len(removed) > options.max_share * page_count:
+        logging.warning(
+            f"Dedupe would drop {len(removed)} of {page_count} pages, more than "
+            f"{options.max_share:.0%}; keeping every page of this pack."
+        )
+        return []
+    return removed
+
+
+def log_removed_pages(pack_title: str, removed: list[RemovedPage]) -> None:
+    """
+    Reports the dropped pages with their hashes, which can be copied into the allow-list.
+    """
+    if not removed:
+        return
+    logging.info(f"Removing {len(removed)} duplicate pages from '{pack_title}':")
+    for page in removed:
+        logging.info(
+            f"  {page.cbz_path.name}/{page.name} [{page.page_hash:016x}] ({page.reason})"
+        )
@@ -4,26 +4,10 @@ import shutil
 import tempfile
 import zipfile
 
-from .constants import IMAGE_EXTENSIONS
+from .archive import get_sorted_image_entries
+from .catalog import load_manifests
+from .cover_cache import get_cover_cache
 from .manga_info import download_cover_image
-from .utils import natural_sort_key
-
-
-def extract_cbz(cbz_path: Path, extract_to: Path) -> bool:
-    """
-    Extracts a CBZ file to the specified directory.
-    Returns True if extraction is successful, False otherwise.
-    """
-    try:
-        with zipfile.ZipFile(cbz_path, "r") as zip_ref:
-            zip_ref.extractall(extract_to)
-        logging.debug(f"Extracted '{cbz_path.name}' to '{extract_to}'.")
-        return True
-    except zipfile.BadZipFile:
-        logging.error(f"Failed to extract '{cbz_path.name}': Bad zip file.")
-    except Exception as e:
-        logging.error(f"Failed to extract '{cbz_path.name}': {e}")
-    return False
 
 
 def extract_and_save_cover_image(
@@ -44,24 +28,42 @@ def extract_and_save_cover_image(
     return extract_first_cover_image(cbz_files)
 
 
+def select_cover_source(cbz_files: list[Path]) -> tuple[Path, str | None]:
+    """
+    Picks the first chapter that has any pages according to the library catalog,
+    along with the name of its first page, without opening the archives.
+    """
+    manifests = load_manifests(cbz_files)
+    for cbz in cbz_files:
+        first_page = manifests[cbz].first_page
+        if first_page:
+            return cbz, first_page.name
+    return cbz_files[0], None
+
+
 def extract_first_cover_image(cbz_files: list[Path]) -> Path | None:
-    first_chapter = cbz_files[0]
+    first_chapter, first_page = select_cover_source(cbz_files)
+    cover_cache = get_cover_cache()
+    if cover_cache:
+        try:
+            return cover_cache.extract_from_cbz(first_chapter, first_page)
+        except zipfile.BadZipFile:
+            logging.error(f"Invalid CBZ file: {first_chapter}")
+            return None
+        except Exception as e:
+            logging.error(f"Error extracting cover image from '{first_chapter}': {e}")
+            return None
+
     try:
         with zipfile.ZipFile(first_chapter, "r") as cbz:
-            file_list = cbz.namelist()
-
-            # Filter image files only
-            image_files = sorted(
-                [file for file in file_list if file.lower().endswith(IMAGE_EXTENSIONS)],
-                key=natural_sort_key,
-            )
+            image_entries = get_sorted_image_entries(cbz)
 
-            if not image_files:
+            if not image_entries:
                 logging.warning(f"No image files found in '{first_chapter}'.")
                 return None
 
-            first_image_file = image_files[0]
-            image_extension = Path(first_image_file).suffix
+            first_image_file = image_entries[0]
+            image_extension = Path(first_image_file.filename).suffix
 
             with tempfile.NamedTemporaryFile(
                 delete=False, suffix=image_extension
@@ -0,0 +1,98 @@
+import hashlib
+import json
+from pathlib import Path
+
+
+def describe_chapter_files(cbz_files: list[Path]) -> list[dict]:
+    """
+    Lists the identity of every chapter file of a pack: name, size and mtime.
+    """
+    chapters = []
+    for cbz in cbz_files:
+        stat = cbz.stat()
+        chapters.append(
+            {"name": cbz.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        )
+    return chapters
+
+
+def file_digest(path: Path | None) -> str | None:
+    """
+    Returns the SHA-256 of a (small) file such as a cover image, or None without one.
+    """
+    if not path or not path.exists():
+        return None
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def fingerprint_of(components) -> str:
+    """
+    Hashes any JSON-serializable description of inputs into a short, stable fingerprint.
+    """
+    payload = json.dumps(components, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def pack_inputs(
+    cbz_files: list[Path],
+    cover_image_path: Path | None,
+    metadata: dict | None,
+    page_processing: dict | None = None,
+) -> dict:
+    """
+    Describes everything the combined CBZ of a pack is built from: the chapter
+    files, the cover image, the ComicInfo.xml fields and, when pages are
+    pre-rasterized, the rasterizer settings.
+    """
+    metadata = metadata or {}
+    inputs = {
+        "chapters": describe_chapter_files(cbz_files),
+        "cover": file_digest(cover_image_path),
+        "comic_info": {
+            "title": metadata.get("title"),
+            "summary": metadata.get("summary"),
+        },
+    }
+    # Only recorded when enabled, so packs built without it keep their fingerprints
+    if page_processing:
+        inputs["page_processing"] = page_processing
+    return inputs
+
+
+def conversion_fingerprint(input_fingerprint: str, converter_args: list[str]) -> str:
+    """
+    Fingerprints a conversion: the combined CBZ's inputs plus the converter arguments.
+    """
+    return fingerprint_of({"inputs": input_fingerprint, "converter": converter_args})
+
+
+def describe_input_changes(previous: dict | None, current: dict) -> list[str]:
+    """
+    Explains in words how the inputs of a pack differ from the recorded ones.
+    """
+    if not previous:
+        return ["inputs were not recorded"]
+
+    reasons = []
+    old_chapters = {chapter["name"]: chapter for chapter in previous.get("chapters", [])}
+    new_chapters = {chapter["name"]: chapter for chapter in current["chapters"]}
+    added = [name for name in new_chapters if name not in old_chapters]
+    removed = [name for name in old_chapters if name not in new_chapters]
+    changed = [
+        name
+        for name in new_chapters
+        if name in old_chapters and new_chapters[name] != old_chapters[name]
+    ]
+    if added:
+        reasons.append(f"chapter(s) added: {', '.join(added)}")
+    if removed:
+        reasons.append(f"chapter(s) removed: {', '.join(removed)}")
+    if changed:
+        reasons.append(f"chapter(s) changed: {', '.join(changed)}")
+    if previous.get("cover") != current["cover"]:
+        reasons.append("cover image changed")
+    if previous.get("comic_info") != current["comic_info"]:
+        reasons.append("metadata changed")
+    if previous.get("page_processing") != current.get("page_processing"):
+        reasons.append("page processing changed")
+    return reasons or ["inputs changed"]
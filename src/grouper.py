@@ -1,158 +1,346 @@
+from contextlib import closing
+from dataclasses import dataclass
+import io
+from itertools import chain
 import logging
 from pathlib import Path
-import shutil
-import tempfile
+import zipfile
 
 from tqdm import tqdm
+from .archive import ParallelZipWriter, get_sorted_image_entries, read_entry
+from .catalog import ArchiveManifest, load_manifests
 from .constants import (
+    BYTES_PER_PART,
     CHAPTERS_PER_PART,
-    IMAGE_EXTENSIONS,
+    COMIC_INFO_NAME,
+    GROUPING_MODE,
+    MAX_CHAPTERS_PER_PART,
+    MIN_CHAPTERS_PER_PART,
+    PAGES_PER_PART,
 )
-
-from .extractor import extract_cbz
-from .parser import parse_chapter_number
+from .parser import ChapterIndex
 from .state_manager import part_already_processed
-from .utils import natural_sort_key, zip_files
-
-
-def create_combined_cbz(temp_dir: Path, output_cbz_path: Path) -> bool:
-    """
-    Creates a combined CBZ file from all images in temp_dir.
-    Returns True if creation is successful, False otherwise.
-    """
-    files_to_zip = sorted(temp_dir.glob("*"), key=lambda x: natural_sort_key(x.name))
-    total_files = len(files_to_zip)
-
-    if total_files == 0:
-        logging.error("No files to add to the combined CBZ.")
-        return False
-
-    logging.info(
-        f"Creating combined CBZ with {total_files} files as '{output_cbz_path.name}'."
-    )
-    try:
-        zip_files(output_cbz_path, files_to_zip)
-    except Exception as e:
-        logging.error(f"Failed to create combined CBZ '{output_cbz_path.name}': {e}")
-        return False
-
-    logging.info(f"Successfully created '{output_cbz_path.name}'.")
-    return True
+from .tracing import span
+from .utils import build_comic_info_xml
 
 
 def combine_to_cbz(
     status,
-    status_file,
     chapter_range,
     part_cbz_files,
     output_cbz_path,
-    output_cbz_name,
     cover_image_path,
+    metadata: dict = None,
+    force: bool = False,
+    rasterizer=None,
+    skip_pages: set[tuple[Path, str]] | None = None,
+    in_memory: bool = False,
 ) -> bool:
     # Check if this part has already been processed for CBZ combining
-    if part_already_processed(status, chapter_range):
+    if not force and part_already_processed(status, chapter_range):
         logging.info(
             f"Chapters {chapter_range} already combined into CBZ. Skipping CBZ combining."
         )
         return True
 
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        logging.info(f"Chapter range: {chapter_range}")
-        temp_dir_path = Path(tmp_dir)
+    logging.info(f"Chapter range: {chapter_range}")
+    image_count = write_pack_cbz(
+        part_cbz_files,
+        output_cbz_path,
+        cover_image_path=cover_image_path,
+        metadata=metadata,
+        rasterizer=rasterizer,
+        skip_pages=skip_pages,
+        in_memory=in_memory,
+    )
 
-        logging.debug(
-            f"Collecting chapter images for chapters {chapter_range} in temporary directory: {temp_dir_path}"
-        )
+    if image_count == 0:
+        logging.error("No images collected; skipping this part.")
+        return False
+    return True
 
-        insert_cover = cover_image_path is not None
 
-        image_count = get_pack_images_to_tmp_dir(
-            part_cbz_files,
-            temp_dir_path,
-            cover_image_path=cover_image_path,
-            insert_cover=insert_cover,
-        )
+def write_pack_cbz(
+    part_cbz_files: list[Path],
+    output_cbz_path: Path,
+    cover_image_path: Path = None,
+    metadata: dict = None,
+    rasterizer=None,
+    skip_pages: set[tuple[Path, str]] | None = None,
+    in_memory: bool = False,
+) -> int:
+    """
+    Streams the pages of every chapter in `part_cbz_files` straight into `output_cbz_path`.
+    Pages are renamed to a sequential '00001_<name>' scheme, with the cover first;
+    compressed bytes are copied across unchanged, and the cover and ComicInfo.xml are
+    written in the same pass. Everything goes through a ParallelZipWriter, which
+    hashes and compresses new entries on its pool. With a `rasterizer` (see
+    src.rasterizer.PageRasterizer) every page is decoded and re-encoded for the
+    device profile instead of copied.
+    Pages listed in `skip_pages` as (chapter path, entry name) are left out.
+    A chapter that is missing or cannot be read is logged and left out whole.
+    The archive is built next to the output and only moved into place once complete.
+    With `in_memory`, every chapter is read with a single sequential read and the
+    archive is assembled in RAM, then written out in one go; reads and writes no
+    longer alternate, which matters on slow disks (see src.admission.MemoryStaging).
+    Returns the total number of images written, or 0 on failure.
+    """
+    partial_path = output_cbz_path.with_name(output_cbz_path.name + ".part")
+    buffer = io.BytesIO() if in_memory else None
+    cover_name = _pack_cover_name(cover_image_path)
+    image_count = 0
+    try:
+        with span(
+            "zip_write",
+            output=output_cbz_path.name,
+            chapters=len(part_cbz_files),
+            in_memory=in_memory,
+        ) as write_span, zipfile.ZipFile(
+            buffer if buffer is not None else partial_path, "w"
+        ) as target, ParallelZipWriter(target) as writer, closing(
+            _iter_pack_chapters(part_cbz_files, skip_pages, in_memory)
+        ) as chapters:
+            first_number = 2 if cover_name else 1
+            if rasterizer is not None:
+                with span("rasterize"):
+                    page_data = _read_pack_pages(chapters, first_number)
+                    if cover_name:
+                        page_data = chain(
+                            [(cover_name, cover_image_path.read_bytes())], page_data
+                        )
+                    for arcname, data in rasterizer.map_pages(page_data):
+                        writer.add_bytes(data, arcname)
+                        image_count += 1
+            else:
+                if cover_name:
+                    writer.add_file(cover_image_path, cover_name)
+                    image_count += 1
+                    logging.debug("Inserted cover image at the start of this part.")
+                image_count += _copy_pack_pages(writer, chapters, first_number)
+
+            if metadata is not None:
+                with span("comic_info"):
+                    writer.add_bytes(build_comic_info_xml(metadata), COMIC_INFO_NAME)
+            writer.flush()
+            write_span.set(pages=image_count)
 
         if image_count == 0:
-            logging.error("No images collected; skipping this part.")
-            return
+            return 0
+        if buffer is not None:
+            with span("staged_write", size=buffer.tell()), open(
+                partial_path, "wb"
+            ) as output:
+                output.write(buffer.getbuffer())
+        partial_path.replace(output_cbz_path)
+    except Exception as e:
+        logging.error(f"Failed to create combined CBZ '{output_cbz_path.name}': {e}")
+        return 0
+    finally:
+        # Gone already once the pack is complete; removed on any failure or interrupt
+        partial_path.unlink(missing_ok=True)
 
-        success = create_combined_cbz(temp_dir_path, output_cbz_path)
-        return success
+    logging.info(
+        f"Successfully created '{output_cbz_path.name}' with {image_count} images."
+    )
+    return image_count
 
 
-def get_pack_images_to_tmp_dir(
-    part_cbz_files: list[Path],
-    temp_dir: Path,
-    cover_image_path: Path = None,
-    insert_cover: bool = False,
-) -> int:
+def _pack_cover_name(cover_image_path: Path | None) -> str | None:
     """
-    Extracts and collects all images from the chapters in `part_cbz_files` into `temp_dir`.
-    If cover_image_path is provided and insert_cover is True, this cover image is inserted once at the start of the final sequence.
-    Returns the total number of images collected.
+    Returns the name of the cover inside a pack, where it is the very first image,
+    or None if the pack has no cover.
     """
-    image_count = 0
+    if cover_image_path and cover_image_path.exists():
+        return f"{1:05d}_cover{cover_image_path.suffix}"
+    return None
 
-    # Insert cover as the *very first image* of the entire sequence (once only)
-    if cover_image_path and insert_cover and cover_image_path.exists():
-        image_count += 1
-        cover_dest = temp_dir / f"{image_count:05d}_cover{cover_image_path.suffix}"
-        try:
-            shutil.copy2(cover_image_path, cover_dest)
-            logging.debug("Inserted cover image at the start of this part.")
-        except Exception as e:
-            logging.error(f"Failed to copy cover image: {e}")
 
+def _open_chapter(cbz: Path, in_memory: bool = False) -> zipfile.ZipFile:
+    """
+    Opens a chapter archive, optionally loading the whole file with one read first.
+    """
+    if in_memory:
+        return zipfile.ZipFile(io.BytesIO(cbz.read_bytes()), "r")
+    return zipfile.ZipFile(cbz, "r")
+
+
+def _iter_pack_chapters(
+    part_cbz_files: list[Path],
+    skip_pages: set[tuple[Path, str]] | None = None,
+    in_memory: bool = False,
+):
+    """
+    Yields (chapter path, chapter archive, page entries) for every chapter of a pack
+    in reading order. Pages listed in `skip_pages` are left out. A chapter archive
+    is closed when the next one is requested. Chapters that are missing or cannot
+    be opened are logged and skipped.
+    """
     for cbz in tqdm(part_cbz_files, desc="Processing Chapters", unit="chapter"):
-        chapter_extract_dir = temp_dir / cbz.stem
-        success = extract_cbz(cbz, chapter_extract_dir)
-        if not success:
+        try:
+            source = _open_chapter(cbz, in_memory)
+        except (zipfile.BadZipFile, OSError) as e:
+            logging.error(f"Failed to read '{cbz.name}': {e}")
             continue
+        with span("page_copy", chapter=cbz.name), source:
+            entries = get_sorted_image_entries(source)
+            if not entries:
+                logging.warning(f"No images found in '{cbz.name}'.")
+                continue
+            if skip_pages:
+                entries = [info for info in entries if (cbz, info.filename) not in skip_pages]
+            yield cbz, source, entries
+
+
+def _page_name(number: int, info: zipfile.ZipInfo) -> str:
+    return f"{number:05d}_{Path(info.filename).name}"
 
-        # Get all image files in the chapter directory, sorted naturally
-        images = get_sorted_images(chapter_extract_dir)
 
-        if not images:
-            logging.warning(f"No images found in '{cbz.name}'.")
+def _copy_pack_pages(writer: ParallelZipWriter, chapters, first_number: int) -> int:
+    """
+    Copies the pages of every chapter into the pack, numbered from `first_number`.
+    A chapter whose pages cannot be read is cut back out of the archive and
+    skipped. Returns the number of pages copied.
+    """
+    number = first_number
+    for cbz, source, entries in chapters:
+        mark = writer.mark()
+        try:
+            for index, info in enumerate(entries):
+                writer.copy_entry(source, info, _page_name(number + index, info))
+        except (zipfile.BadZipFile, OSError) as e:
+            if mark is None:
+                raise
+            writer.rollback(mark)
+            logging.error(f"Failed to read '{cbz.name}', leaving it out: {e}")
             continue
+        number += len(entries)
+    return number - first_number
 
-        for img in images:
-            image_count += 1
-            new_name = f"{image_count:05d}_{img.name}"
-            destination = temp_dir / new_name
-            try:
-                shutil.copy2(img, destination)
-            except Exception as e:
-                logging.error(f"Failed to copy image '{img.name}': {e}")
 
-    logging.info(f"Total images collected for this part: {image_count}")
-    return image_count
+def _read_pack_pages(chapters, first_number: int):
+    """
+    Yields (arcname, data) for every page of the pack, numbered from `first_number`.
+    Each chapter is read whole before any of its pages is yielded, so a chapter
+    whose pages cannot be read is skipped entirely.
+    """
+    number = first_number
+    for cbz, source, entries in chapters:
+        try:
+            pages = [
+                (_page_name(number + index, info), read_entry(source, info))
+                for index, info in enumerate(entries)
+            ]
+        except (zipfile.BadZipFile, OSError) as e:
+            logging.error(f"Failed to read '{cbz.name}', leaving it out: {e}")
+            continue
+        number += len(pages)
+        yield from pages
 
 
-def get_sorted_images(chapter_extract_dir):
-    return sorted(
-        [
-            image
-            for image in chapter_extract_dir.iterdir()
-            if image.suffix.lower() in IMAGE_EXTENSIONS
-        ],
-        key=lambda x: natural_sort_key(x.name),
-    )
+@dataclass
+class GroupingPolicy:
+    """
+    How chapters are split into packs. 'chapters' uses a fixed chapter count;
+    'pages' and 'bytes' fill each pack up to a target number of pages or
+    uncompressed image bytes, keeping each pack within the chapter bounds.
+    """
+
+    mode: str = GROUPING_MODE
+    chapters_per_part: int = CHAPTERS_PER_PART
+    pages_per_part: int = PAGES_PER_PART
+    bytes_per_part: int = BYTES_PER_PART
+    min_chapters: int = MIN_CHAPTERS_PER_PART
+    max_chapters: int = MAX_CHAPTERS_PER_PART
+
+    @classmethod
+    def from_args(cls, args) -> "GroupingPolicy":
+        return cls(
+            mode=args.group_by,
+            chapters_per_part=args.chapters_per_part,
+            pages_per_part=args.pages_per_part,
+            bytes_per_part=int(args.mb_per_part * 1024 * 1024),
+            min_chapters=args.min_chapters,
+            max_chapters=args.max_chapters,
+        )
+
+
+def split_balanced(
+    items: list, weights: list[int], target: int, min_items: int, max_items: int
+) -> list[list]:
+    """
+    Splits `items` in order into runs whose total weight is close to `target`.
+    Runs are filled greedily from the start: a run is closed when the next item
+    would take it further from `target` than it already is. A run's boundaries
+    depend only on the items before it, so appending items only ever changes the
+    last run, and packs recorded by earlier runs keep their chapter ranges.
+    Runs hold between `min_items` and `max_items` items, except the last one,
+    which grows as items are appended.
+    """
+    if not items:
+        return []
+    min_items = max(1, min_items)
+    max_items = max(min_items, max_items)
+
+    parts, current, current_weight = [], [], 0
+    for item, weight in zip(items, weights):
+        if current:
+            overshoots = abs(current_weight + weight - target) > abs(
+                current_weight - target
+            )
+            if len(current) >= max_items or (len(current) >= min_items and overshoots):
+                parts.append(current)
+                current, current_weight = [], 0
+        current.append(item)
+        current_weight += weight
+    parts.append(current)
+    return parts
 
 
 def group_cbz_into_packs(
-    cbz_files: list[Path], chapters_per_part: int = CHAPTERS_PER_PART
+    cbz_files: list[Path],
+    chapters_per_part: int = CHAPTERS_PER_PART,
+    chapter_index: ChapterIndex | None = None,
+    policy: GroupingPolicy | None = None,
+    manifests: dict[Path, ArchiveManifest] | None = None,
 ) -> list[list[Path]]:
     """
-    Groups CBZ files into parts, each containing up to chapters_per_part chapters.
+    Groups CBZ files into parts, each containing up to chapters_per_part chapters,
+    or balanced by pages or bytes when `policy` asks for it. Page counts and sizes
+    come from `manifests` (the library catalog when not given), so no archive is
+    extracted. Chapters are ordered by `chapter_index` (built here if not given),
+    which puts files without a chapter number last.
     Returns a list of lists, where each sublist contains CBZ Path objects.
     """
+    if chapter_index is None:
+        chapter_index = ChapterIndex(cbz_files[0].parent if cbz_files else Path(), cbz_files)
     # Sort CBZ files based on chapter number
-    sorted_cbz_files = sorted(
-        cbz_files, key=lambda cbz: parse_chapter_number(cbz.name) or 0
-    )
+    sorted_cbz_files = chapter_index.paths
+
+    if policy is not None and policy.mode != "chapters":
+        if manifests is None:
+            manifests = load_manifests(sorted_cbz_files)
+        if policy.mode == "pages":
+            weights = [manifests[cbz].page_count for cbz in sorted_cbz_files]
+            target, unit = policy.pages_per_part, "pages"
+        else:
+            weights = [manifests[cbz].image_bytes for cbz in sorted_cbz_files]
+            target, unit = policy.bytes_per_part, "bytes"
+        cbz_packs = split_balanced(
+            sorted_cbz_files,
+            weights,
+            target,
+            policy.min_chapters,
+            policy.max_chapters,
+        )
+        sizes = [sum(manifests[cbz].page_count for cbz in pack) for pack in cbz_packs]
+        logging.info(
+            f"Organized CBZ files into {len(cbz_packs)} parts balanced by {unit} "
+            f"({min(sizes, default=0)} to {max(sizes, default=0)} pages each)."
+        )
+        return cbz_packs
 
+    if policy is not None:
+        chapters_per_part = policy.chapters_per_part
     cbz_packs = [
         sorted_cbz_files[i : i + chapters_per_part]
         for i in range(0, len(sorted_cbz_files), chapters_per_part)
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+import subprocess
+import threading
+import time
+
+from .constants import CACHE_DIR, IMPORT_INDEX_FILE
+from .sqlite_store import init_db, open_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    library TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    book_id INTEGER,
+    imported_at REAL NOT NULL,
+    PRIMARY KEY (library, path)
+);
+CREATE INDEX IF NOT EXISTS files_hash ON files (library, sha256);
+CREATE TABLE IF NOT EXISTS books (
+    library TEXT NOT NULL,
+    book_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    PRIMARY KEY (library, book_id)
+);
+CREATE INDEX IF NOT EXISTS books_title ON books (library, title);
+CREATE TABLE IF NOT EXISTS libraries (
+    library TEXT PRIMARY KEY,
+    seeded_at REAL NOT NULL
+);
+"""
+
+NEW = "new"
+CHANGED = "changed"
+IMPORTED = "imported"
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Returns the SHA-256 of a file, read in chunks so large books are never held in memory.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImportIndex:
+    """
+    SQLite index of the files already imported into each Calibre library, keyed
+    by path and by content hash. A file whose size and mtime match its entry is
+    known without being read; otherwise it is hashed, so moved or copied files are
+    recognized too. The titles of the library's books, seeded once from
+    'calibredb list', catch books imported before the index existed.
+    """
+
+    def __init__(self, library_path: Path, path: Path | None = None):
+        self.library = str(library_path.resolve())
+        self.path = Path(path) if path else CACHE_DIR / IMPORT_INDEX_FILE
+        self._lock = threading.Lock()
+        init_db(self.path, _SCHEMA)
+
+    @property
+    def seeded(self) -> bool:
+        with self._lock, open_db(self.path) as conn:
+            row = conn.execute(
+                "SELECT 1 FROM libraries WHERE library = ?", (self.library,)
+            ).fetchone()
+        return row is not None
+
+    def seed(self, calibredb_path: str) -> bool:
+        """
+        Replaces the known books of the library with a single 'calibredb list' export.
+        Returns True if the export could be read.
+        """
+        command = [
+            str(calibredb_path),
+            "list",
+            "--for-machine",
+            "--fields",
+            "title",
+            "--library-path",
+            self.library,
+        ]
+        try:
+            result = subprocess.run(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+            )
+            if result.returncode != 0:
+                logging.error(f"calibredb list failed: {result.stderr.strip()}")
+                return False
+            books = json.loads(result.stdout or "[]")
+        except Exception as e:
+            logging.error(f"Failed to list the books of '{self.library}': {e}")
+            return False
+
+        with self._lock, open_db(self.path) as conn:
+            conn.execute("DELETE FROM books WHERE library = ?", (self.library,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO books (library, book_id, title) VALUES (?, ?, ?)",
+                [
+                    (self.library, book["id"], book["title"].casefold())
+                    for book in books
+                    if "id" in book and book.get("title")
+                ],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO libraries (library, seeded_at) VALUES (?, ?)",
+                (self.library, time.time()),
+            )
+        logging.info(f"Indexed {len(books)} books of '{self.library}'.")
+        return True
+
+    def classify(
+        self, path: Path, title: str | None = None
+    ) -> tuple[str, int | None, str | None]:
+        """
+        Tells whether a file still needs importing: 'new', 'changed' (imported
+        before from the same path, with different content) or 'imported'.
+        Returns the state, the Calibre book id, when known, and the file's SHA-256
+        if it was hashed. Nothing is written: a file found 'imported' through its
+        hash or title is remembered only once the caller records it.
+        """
+        stat = path.stat()
+        key = str(path.resolve())
+        with self._lock, open_db(self.path) as conn:
+            row = conn.execute(
+                """
+                SELECT size, mtime_ns, sha256, book_id FROM files
+                WHERE library = ? AND path = ?
+                """,
+                (self.library, key),
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return IMPORTED, row[3], None
+
+        sha256 = hash_file(path)
+        if row and row[2] == sha256:
+            return IMPORTED, row[3], sha256
+        with self._lock, open_db(self.path) as conn:
+            same_content = conn.execute(
+                "SELECT book_id FROM files WHERE library = ? AND sha256 = ? LIMIT 1",
+                (self.library, sha256),
+            ).fetchone()
+            same_title = (
+                conn.execute(
+                    "SELECT book_id FROM books WHERE library = ? AND title = ? LIMIT 1",
+                    (self.library, title.casefold()),
+                ).fetchone()
+                # A changed file recorded without a book id is found by its title
+                if title and (not row or row[3] is None)
+                else None
+            )
+        if same_content:
+            return IMPORTED, same_content[0], sha256
+        if row:
+            book_id = row[3]
+            if book_id is None and same_title:
+                book_id = same_title[0]
+            return CHANGED, book_id, sha256
+        if same_title:
+            return IMPORTED, same_title[0], sha256
+        return NEW, None, sha256
+
+    def record(
+        self,
+        path: Path,
+        book_id: int | None,
+        sha256: str | None = None,
+        title: str | None = None,
+    ) -> None:
+        """
+        Remembers a file as imported into the library (as book `book_id`, if known).
+        The book's `title` is remembered too, so a later change to a file recorded
+        without a book id can still find its book.
+        """
+        stat = path.stat()
+        with self._lock, open_db(self.path) as conn:
+            if book_id is not None and title:
+                conn.execute(
+                    "INSERT OR REPLACE INTO books (library, book_id, title) VALUES (?, ?, ?)",
+                    (self.library, book_id, title.casefold()),
+                )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO files
+                    (library, path, size, mtime_ns, sha256, book_id, imported_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    self.library,
+                    str(path.resolve()),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    sha256 or hash_file(path),
+                    book_id,
+                    time.time(),
+                ),
+            )
@@ -0,0 +1,213 @@
+import asyncio
+import atexit
+import json
+import logging
+import random
+import threading
+import time
+
+JIKAN_API_URL = "https://api.jikan.moe/v4"
+# Jikan allows 3 requests per second and 60 per minute
+JIKAN_RATE_LIMITS = ((3, 1.0), (60, 60.0))
+JIKAN_REQUEST_TIMEOUT = 20  # seconds per attempt
+JIKAN_MAX_RETRIES = 4
+JIKAN_BACKOFF_BASE = 1.0  # seconds; doubled on every retry
+JIKAN_MAX_CONNECTIONS = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class JikanUnavailableError(Exception):
+    """
+    Raised when Jikan could not be queried, as opposed to returning no good match.
+    """
+
+
+class TokenBucket:
+    """
+    Token bucket holding up to `capacity` tokens, refilled over `period` seconds.
+    Reservations are made under a thread lock and the caller sleeps outside it,
+    so one bucket can be shared by several threads and event loops.
+    """
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes one token and returns how long the caller must wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Combines several token buckets; a request waits until every bucket allows it.
+    """
+
+    def __init__(self, limits=JIKAN_RATE_LIMITS):
+        self._buckets = [TokenBucket(capacity, period) for capacity, period in limits]
+
+    async def acquire(self) -> None:
+        delay = max(bucket.reserve() for bucket in self._buckets)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Shared by every client in the process so concurrent workers respect one budget
+jikan_rate_limiter = RateLimiter()
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status}")
+        retry_after = response.headers.get("Retry-After", "")
+        self.retry_after = float(retry_after) if retry_after.isdigit() else None
+
+
+class JikanClient:
+    """
+    Asynchronous Jikan client with pooled keep-alive connections, per-request
+    timeouts, a shared rate limiter and retries with exponential backoff on
+    429 and 5xx responses. Use as an async context manager; aiohttp is only
+    imported when the first client is created.
+    """
+
+    def __init__(
+        self,
+        timeout: float = JIKAN_REQUEST_TIMEOUT,
+        max_retries: int = JIKAN_MAX_RETRIES,
+        max_connections: int = JIKAN_MAX_CONNECTIONS,
+        rate_limiter: RateLimiter = jikan_rate_limiter,
+    ):
+        import aiohttp
+
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self.rate_limiter = rate_limiter
+        self._session = None
+
+    async def __aenter__(self):
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections, keepalive_timeout=30
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector, timeout=self.timeout
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    async def _request(
+        self, url: str, params: dict | None, rate_limited: bool
+    ) -> bytes:
+        import aiohttp
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = JIKAN_BACKOFF_BASE * 2 ** (attempt - 1)
+                retry_after = getattr(last_error, "retry_after", None)
+                await asyncio.sleep(max(delay, retry_after or 0) + random.random() / 4)
+            if rate_limited:
+                await self.rate_limiter.acquire()
+            try:
+                async with self._session.get(url, params=params) as response:
+                    if response.status in RETRY_STATUSES:
+                        last_error = _RetryableStatus(response)
+                        logging.debug(
+                            f"Jikan returned {response.status} for '{url}', retrying..."
+                        )
+                        continue
+                    response.raise_for_status()
+                    return await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientResponseError):
+                    raise JikanUnavailableError(f"{url}: {e}") from e
+                last_error = e
+                logging.debug(f"Request to '{url}' failed ({e!r}), retrying...")
+        raise JikanUnavailableError(
+            f"{url}: giving up after {self.max_retries + 1} attempts ({last_error})"
+        )
+
+    async def search_manga(self, manga_name: str, limit: int = 5) -> list[dict]:
+        """
+        Returns the raw Jikan manga records matching `manga_name`.
+        Raises JikanUnavailableError if Jikan could not be queried.
+        """
+        body = await self._request(
+            f"{JIKAN_API_URL}/manga",
+            {"q": manga_name, "limit": limit, "page": 1},
+            rate_limited=True,
+        )
+        try:
+            search_results = json.loads(body)
+        except ValueError as e:
+            raise JikanUnavailableError(f"Invalid response from Jikan: {e}") from e
+        return search_results.get("data", [])
+
+
+# One client on a background event loop serves every blocking lookup, so they
+# share its pooled keep-alive connections; aiohttp sessions belong to one loop
+_sync_loop = None
+_sync_client = None
+_sync_lock = threading.Lock()
+
+
+def _get_sync_client() -> tuple[asyncio.AbstractEventLoop, JikanClient]:
+    global _sync_loop, _sync_client
+    with _sync_lock:
+        if _sync_client is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="jikan-sync", daemon=True
+            ).start()
+            client = JikanClient()
+            asyncio.run_coroutine_threadsafe(client.__aenter__(), loop).result()
+            _sync_loop, _sync_client = loop, client
+            atexit.register(_close_sync_client)
+        return _sync_loop, _sync_client
+
+
+def _close_sync_client() -> None:
+    global _sync_loop, _sync_client
+    with _sync_lock:
+        loop, client = _sync_loop, _sync_client
+        _sync_loop = _sync_client = None
+    if client is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(client.__aexit__(None, None, None), loop).result(
+            timeout=5
+        )
+    except Exception as e:
+        logging.debug(f"Closing the Jikan session failed: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def search_manga_sync(manga_name: str, limit: int = 5) -> list[dict]:
+    """
+    Blocking wrapper around JikanClient.search_manga for callers outside an event loop.
+    Every call goes through the same long-lived client.
+    """
+    loop, client = _get_sync_client()
+    return asyncio.run_coroutine_threadsafe(
+        client.search_manga(manga_name, limit=limit), loop
+    ).result()
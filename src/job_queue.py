@@ -0,0 +1,432 @@
+import ctypes
+from dataclasses import dataclass, field
+import json
+import logging
+import os
+from pathlib import Path
+import socket
+import sqlite3
+import threading
+import time
+
+from .cbz_convertor import KccResult, convert_cbz_to_mobi
+from .constants import CACHE_DIR, CONVERSION_QUEUE_FILE, KCC_MAX_ATTEMPTS, KCC_TIMEOUT
+from .sqlite_store import init_db, open_db
+from .state_manager import StatusStore, update_conversion_status
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+JOB_STATES = (QUEUED, RUNNING, DONE, FAILED)
+
+# A running job whose owner vanished without this much slack past its timeout is orphaned
+LEASE_GRACE = 5 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cbz_path TEXT NOT NULL UNIQUE,
+    title TEXT,
+    author TEXT,
+    metadata TEXT,
+    status_db TEXT,
+    chapter_range TEXT,
+    convert_fingerprint TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    timeout REAL,
+    owner TEXT,
+    lease_expires_at REAL,
+    returncode INTEGER,
+    output TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+_JOB_COLUMNS = (
+    "id",
+    "cbz_path",
+    "title",
+    "author",
+    "metadata",
+    "status_db",
+    "chapter_range",
+    "convert_fingerprint",
+    "state",
+    "attempts",
+    "max_attempts",
+    "timeout",
+    "owner",
+    "lease_expires_at",
+    "returncode",
+    "output",
+    "error",
+    "created_at",
+    "started_at",
+    "finished_at",
+)
+
+
+@dataclass
+class ConversionJob:
+    """
+    One KCC conversion: what to convert, where to record the result, and how its
+    runs went so far. `owner` is 'host:pid' of the process running it.
+    """
+
+    id: int
+    cbz_path: Path
+    title: str
+    author: str
+    metadata: dict = field(default_factory=dict)
+    status_db: Path | None = None
+    chapter_range: str | None = None
+    convert_fingerprint: str | None = None
+    state: str = QUEUED
+    attempts: int = 0
+    max_attempts: int = KCC_MAX_ATTEMPTS
+    timeout: float | None = KCC_TIMEOUT
+    owner: str | None = None
+    lease_expires_at: float | None = None
+    returncode: int | None = None
+    output: str | None = None
+    error: str | None = None
+    created_at: float = 0.0
+    started_at: float | None = None
+    finished_at: float | None = None
+
+
+def _row_to_job(row) -> ConversionJob:
+    values = dict(zip(_JOB_COLUMNS, row))
+    values["cbz_path"] = Path(values["cbz_path"])
+    values["metadata"] = json.loads(values["metadata"]) if values["metadata"] else {}
+    values["status_db"] = Path(values["status_db"]) if values["status_db"] else None
+    return ConversionJob(**values)
+
+
+def _owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        process_query_limited_information = 0x1000
+        still_active = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == still_active
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_orphaned(job: ConversionJob) -> bool:
+    """
+    True if a running job's owner is gone: its lease ran out, or it was started on
+    this host by a process that no longer exists.
+    """
+    if job.state != RUNNING:
+        return False
+    if job.lease_expires_at is not None and job.lease_expires_at < time.time():
+        return True
+    host, _, pid = (job.owner or "").rpartition(":")
+    return host == socket.gethostname() and pid.isdigit() and not _process_alive(int(pid))
+
+
+class ConversionQueue:
+    """
+    Durable queue of KCC conversions kept in a SQLite database in WAL mode, one
+    job per CBZ. Jobs move from queued to running to done or failed; a failed run
+    is queued again until `max_attempts` runs were made, and the output of the
+    last run is kept for inspection. Jobs left running by a process that crashed
+    or was killed are put back in the queue by `recover_orphans`.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else CACHE_DIR / CONVERSION_QUEUE_FILE
+        self._lock = threading.Lock()
+        init_db(self.path, _SCHEMA)
+
+    def _select(self, conn, where: str = "", params=()) -> list[ConversionJob]:
+        return [
+            _row_to_job(row)
+            for row in conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs {where}", params
+            )
+        ]
+
+    def enqueue(
+        self,
+        cbz_path: Path,
+        author: str,
+        title: str,
+        metadata: dict,
+        status_db: Path | None = None,
+        chapter_range: str | None = None,
+        convert_fingerprint: str | None = None,
+        timeout: float | None = KCC_TIMEOUT,
+        max_attempts: int = KCC_MAX_ATTEMPTS,
+    ) -> ConversionJob | None:
+        """
+        Queues the conversion of a CBZ, replacing any earlier job for the same file.
+        Returns None if another live process is converting that file right now.
+        """
+        key = str(cbz_path.resolve())
+        with self._lock, open_db(self.path) as conn:
+            existing = self._select(conn, "WHERE cbz_path = ?", (key,))
+            if existing and existing[0].state == RUNNING and not is_orphaned(existing[0]):
+                logging.warning(
+                    f"'{cbz_path.name}' is already being converted by {existing[0].owner}."
+                )
+                return None
+            conn.execute(
+                """
+                INSERT INTO jobs (
+                    cbz_path, title, author, metadata, status_db, chapter_range,
+                    convert_fingerprint, state, attempts, max_attempts, timeout, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)
+                ON CONFLICT(cbz_path) DO UPDATE SET
+                    title = excluded.title,
+                    author = excluded.author,
+                    metadata = excluded.metadata,
+                    status_db = excluded.status_db,
+                    chapter_range = excluded.chapter_range,
+                    convert_fingerprint = excluded.convert_fingerprint,
+                    state = excluded.state,
+                    attempts = 0,
+                    max_attempts = excluded.max_attempts,
+                    timeout = excluded.timeout,
+                    owner = NULL,
+                    lease_expires_at = NULL,
+                    returncode = NULL,
+                    output = NULL,
+                    error = NULL,
+                    created_at = excluded.created_at,
+                    started_at = NULL,
+                    finished_at = NULL
+                """,
+                (
+                    key,
+                    title,
+                    author,
+                    json.dumps(metadata, ensure_ascii=False),
+                    str(status_db) if status_db else None,
+                    chapter_range,
+                    convert_fingerprint,
+                    QUEUED,
+                    max_attempts,
+                    timeout,
+                    time.time(),
+                ),
+            )
+            return self._select(conn, "WHERE cbz_path = ?", (key,))[0]
+
+    def claim(self, job_id: int) -> ConversionJob | None:
+        """
+        Marks a queued job as running in this process and counts the attempt.
+        Returns the updated job, or None if it is not queued (anymore).
+        """
+        now = time.time()
+        with self._lock, open_db(self.path) as conn:
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET
+                    state = ?, attempts = attempts + 1, owner = ?, started_at = ?,
+                    lease_expires_at = ? + COALESCE(timeout, ?) + ?, finished_at = NULL
+                WHERE id = ? AND state = ?
+                """,
+                (RUNNING, _owner_id(), now, now, KCC_TIMEOUT, LEASE_GRACE, job_id, QUEUED),
+            )
+            if cursor.rowcount != 1:
+                return None
+            return self._select(conn, "WHERE id = ?", (job_id,))[0]
+
+    def finish(self, job: ConversionJob, result: KccResult) -> str:
+        """
+        Records the outcome of a run. Failed runs are queued again while attempts remain.
+        Returns the new state of the job.
+        """
+        if result:
+            state = DONE
+        elif job.attempts < job.max_attempts:
+            state = QUEUED
+        else:
+            state = FAILED
+        with self._lock, open_db(self.path) as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET
+                    state = ?, owner = NULL, lease_expires_at = NULL, returncode = ?,
+                    output = ?, error = ?, finished_at = ?
+                WHERE id = ?
+                """,
+                (
+                    state,
+                    result.returncode,
+                    result.output,
+                    result.error,
+                    time.time(),
+                    job.id,
+                ),
+            )
+        return state
+
+    def recover_orphans(self) -> int:
+        """
+        Puts running jobs whose process is gone back in the queue, or fails them if
+        they used up their attempts. Returns how many jobs were recovered.
+        """
+        with self._lock, open_db(self.path) as conn:
+            orphans = [
+                job
+                for job in self._select(conn, "WHERE state = ?", (RUNNING,))
+                if is_orphaned(job)
+            ]
+            for job in orphans:
+                conn.execute(
+                    """
+                    UPDATE jobs SET
+                        state = ?, owner = NULL, lease_expires_at = NULL,
+                        error = ?, finished_at = ?
+                    WHERE id = ?
+                    """,
+                    (
+                        QUEUED if job.attempts < job.max_attempts else FAILED,
+                        f"Interrupted while running in {job.owner}",
+                        time.time(),
+                        job.id,
+                    ),
+                )
+        for job in orphans:
+            logging.warning(
+                f"Recovered interrupted conversion of '{job.cbz_path.name}' from {job.owner}."
+            )
+        return len(orphans)
+
+    def jobs(self, states: tuple[str, ...] | None = None) -> list[ConversionJob]:
+        with self._lock, open_db(self.path) as conn:
+            if not states:
+                return self._select(conn, "ORDER BY id")
+            return self._select(
+                conn,
+                f"WHERE state IN ({', '.join('?' for _ in states)}) ORDER BY id",
+                states,
+            )
+
+    def job(self, job_id: int) -> ConversionJob | None:
+        with self._lock, open_db(self.path) as conn:
+            jobs = self._select(conn, "WHERE id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def job_for(self, cbz_path: Path) -> ConversionJob | None:
+        """
+        Returns the job that converted (or is converting) a CBZ, if any.
+        """
+        with self._lock, open_db(self.path) as conn:
+            jobs = self._select(conn, "WHERE cbz_path = ?", (str(cbz_path.resolve()),))
+        return jobs[0] if jobs else None
+
+    def requeue(self, job_ids: list[int]) -> int:
+        """
+        Queues finished or failed jobs again with a fresh set of attempts.
+        Running jobs are left alone. Returns how many jobs were requeued.
+        """
+        with self._lock, open_db(self.path) as conn:
+            cursor = conn.executemany(
+                """
+                UPDATE jobs SET state = ?, attempts = 0, error = NULL, finished_at = NULL
+                WHERE id = ? AND state != ?
+                """,
+                [(QUEUED, job_id, RUNNING) for job_id in job_ids],
+            )
+            return cursor.rowcount
+
+
+def run_conversion_job(
+    queue: ConversionQueue,
+    job: ConversionJob,
+    project_root: Path,
+    status: StatusStore | None = None,
+) -> bool:
+    """
+    Runs a queued job until it succeeds or runs out of attempts, and records a
+    successful conversion in the folder's status (`status`, or the job's status_db).
+    Returns True if the CBZ was converted.
+    """
+    while True:
+        running = queue.claim(job.id)
+        if running is None:
+            return False
+        started = time.perf_counter()
+        result = convert_cbz_to_mobi(
+            project_root,
+            running.cbz_path,
+            author=running.author,
+            title=running.title,
+            metadata=running.metadata,
+            timeout=running.timeout,
+        )
+        state = queue.finish(running, result)
+        if state == DONE:
+            break
+        if state == FAILED:
+            logging.error(
+                f"Giving up on '{running.cbz_path.name}' after {running.attempts} attempts: {result.error}"
+            )
+            return False
+        logging.warning(
+            f"Retrying conversion of '{running.cbz_path.name}' "
+            f"(attempt {running.attempts + 1} of {running.max_attempts})..."
+        )
+
+    if status is None and running.status_db:
+        status = StatusStore(running.status_db)
+    if status is not None and running.chapter_range:
+        mobi_path = running.cbz_path.with_suffix(".mobi")
+        update_conversion_status(
+            status,
+            running.chapter_range,
+            convert_fingerprint=running.convert_fingerprint,
+            mobi_size=mobi_path.stat().st_size if mobi_path.exists() else None,
+            convert_seconds=time.perf_counter() - started,
+        )
+    return True
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_conversion_queue() -> ConversionQueue | None:
+    """
+    Returns the shared queue in CACHE_DIR, or None if it cannot be opened.
+    Interrupted jobs of earlier runs are recovered when it is first opened.
+    """
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            try:
+                _default_queue = ConversionQueue()
+                _default_queue.recover_orphans()
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"Conversion queue unavailable, converting directly: {e}")
+                _default_queue = None
+                return None
+        return _default_queue
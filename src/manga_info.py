@@ -1,17 +1,39 @@
+import asyncio
+from concurrent.futures import Future
 from pathlib import Path
 import shutil
 import tempfile
-from jikanpy import Jikan
-from fuzzywuzzy import process
+import threading
 import logging
 
-import requests
+from .constants import TITLE_INDEX_MIN_RATIO, TITLE_INDEX_MIN_SCORE
+from .cover_cache import get_cover_cache
+from .jikan_client import JikanClient, JikanUnavailableError, search_manga_sync
+from .metadata_cache import get_metadata_cache
+from .title_index import get_title_index, record_titles
 
 NSFW = False
 FUZZY_MATCH_THRESHOLD = 85
-# Initialize the Jikan API
-jikan = Jikan()
-logging.basicConfig(level=logging.INFO)
+COVER_DOWNLOAD_TIMEOUT = 30  # seconds
+PREFETCH_CONCURRENCY = 8
+
+# Shared so that cover downloads reuse pooled keep-alive connections
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Returns the requests session shared by cover downloads, created on first use
+    so that importing this module does not load requests.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+
+            _http_session = requests.Session()
+        return _http_session
 
 
 def search_manga_jikan(manga_name):
@@ -19,43 +41,35 @@ def search_manga_jikan(manga_name):
     Searches for a manga title using the Jikan API with fuzzy matching.
     Returns the best matching manga data if found.
     """
+    try:
+        return _search_manga_jikan(manga_name)
+    except JikanUnavailableError:
+        return None
+
+
+def _search_manga_jikan(manga_name):
     try:
         # Perform a search query using Jikan
-        search_results = jikan.search(
-            "manga",
-            manga_name,
-            page=1,
-            parameters={
-                "limit": 5,
-            },
-        )
-    except Exception as e:
+        manga_list = search_manga_sync(manga_name, limit=5)
+    except JikanUnavailableError as e:
         logging.error(f"Error fetching data from Jikan API: {e}")
-        return None
+        raise
+    return select_best_match(manga_name, manga_list)
 
-    # Extract manga data from the response
-    manga_list = search_results.get("data", [])
+
+def select_best_match(manga_name, manga_list):
+    """
+    Fuzzy matches `manga_name` against every title of the Jikan records in `manga_list`.
+    Returns a (manga, matched_title) tuple, or None if no title scores high enough.
+    """
     if not manga_list:
         logging.warning(f"No matches found on Jikan for '{manga_name}'.")
         return None
 
-    # Extract all possible titles for fuzzy matching
-    titles = []
-    for manga in manga_list:
-        # Add main title
-        titles.append((manga.get("title", ""), manga))
+    from fuzzywuzzy import process
 
-        # Add titles from the 'titles' list
-        for title_entry in manga.get("titles", []):
-            titles.append((title_entry.get("title", ""), manga))
-
-        # Add synonyms if available
-        for synonym in manga.get("title_synonyms", []):
-            titles.append((synonym, manga))
-
-        # Add English title if available
-        if manga.get("title_english"):
-            titles.append((manga.get("title_english"), manga))
+    # Extract all possible titles for fuzzy matching
+    titles = [(title, manga) for manga in manga_list for title in record_titles(manga)]
 
     title_names = [title for title, _ in titles]
     # Perform fuzzy matching
@@ -70,19 +84,73 @@ def search_manga_jikan(manga_name):
         return None
 
 
-def fetch_manga_info_jikan(manga_name):
+def fetch_manga_info_jikan(manga_name, use_cache: bool = True):
     """
-    Fetches detailed manga information using the Jikan API.
+    Fetches detailed manga information using the Jikan API, or from the local
+    title index when it holds a confident match. Results, including failed matches, are kept in the persistent metadata cache,
+    so folders seen before do not hit the network until their entry expires.
     Returns a dictionary containing relevant metadata.
     """
+    cache = get_metadata_cache() if use_cache else None
+    if cache:
+        entry = cache.get(manga_name)
+        if entry:
+            logging.info(
+                f"Using cached metadata for '{manga_name}'"
+                + (" (no match)." if entry.is_negative else ".")
+            )
+            return entry.metadata
+
+    metadata = match_manga_offline([manga_name]).get(manga_name)
+    if metadata is None:
+        try:
+            metadata = lookup_manga_info_jikan(manga_name)
+        except JikanUnavailableError:
+            # Network and API errors are not remembered; only real "no match" answers are
+            return None
+
+    if cache:
+        cache.put(manga_name, metadata)
+    return metadata
+
+
+def match_manga_offline(manga_names) -> dict[str, dict]:
+    """
+    Matches `manga_names` against the local title index in one batch.
+    Returns {manga_name: metadata} for the names matched with at least
+    TITLE_INDEX_MIN_SCORE and TITLE_INDEX_MIN_RATIO; the others are left to Jikan. Empty without an index.
+    """
+    index = get_title_index() if manga_names else None
+    if index is None:
+        return {}
+    resolved = {}
+    for manga_name, match in index.match_many(
+        manga_names, TITLE_INDEX_MIN_SCORE, TITLE_INDEX_MIN_RATIO
+    ).items():
+        if match:
+            logging.info(
+                f"Best match in the title index: {match.title} (Score: {match.score}, ratio: {match.ratio})"
+            )
+            resolved[manga_name] = build_manga_metadata(match.record, match.title)
+    return resolved
+
+
+def lookup_manga_info_jikan(manga_name):
+    """
+    Queries Jikan for `manga_name` without consulting the cache.
+    Returns the metadata dictionary, or None if there is no good match.
+    Raises JikanUnavailableError if Jikan could not be queried.
+    """
     # Perform fuzzy search with Jikan
     logging.debug(f"Trying to match '{manga_name}'...")
-    search_result = search_manga_jikan(manga_name)
-    if not search_result:
-        return None
+    search_result = _search_manga_jikan(manga_name)
+    return build_manga_metadata(*search_result) if search_result else None
 
-    manga_result, manga_title = search_result
 
+def build_manga_metadata(manga_result: dict, manga_title: str) -> dict:
+    """
+    Extracts the fields used by the rest of the suite from a Jikan manga record.
+    """
     # Extract relevant details
     authors = manga_result.get("authors", [])
     author_names = (
@@ -116,9 +184,123 @@ def fetch_manga_info_jikan(manga_name):
     }
 
 
+async def fetch_manga_info_async(client: JikanClient, manga_name, use_cache=True):
+    """
+    Asynchronous counterpart of fetch_manga_info_jikan sharing its cache.
+    Raises JikanUnavailableError if Jikan could not be queried.
+    """
+    cache = get_metadata_cache() if use_cache else None
+    if cache:
+        entry = cache.get(manga_name)
+        if entry:
+            return entry.metadata
+
+    search_result = select_best_match(
+        manga_name, await client.search_manga(manga_name, limit=5)
+    )
+    metadata = build_manga_metadata(*search_result) if search_result else None
+    if cache:
+        cache.put(manga_name, metadata)
+    return metadata
+
+
+async def prefetch_manga_info_async(manga_names, futures: dict | None = None) -> dict:
+    """
+    Resolves many manga names concurrently over one pooled, rate-limited client.
+    Names the local title index matches confidently are resolved first, in one
+    batch, and never reach the network.
+    Returns a {manga_name: metadata} dictionary; names whose lookup failed map to None.
+    If `futures` is given, each name's concurrent.futures.Future is completed as soon
+    as that name is resolved.
+    """
+    results = {}
+    names = list(dict.fromkeys(manga_names))
+    cache = get_metadata_cache()
+    # Every name the title index knows is resolved at once, without the network
+    offline = match_manga_offline(
+        [name for name in names if not (cache and cache.get(name))]
+    )
+    for manga_name, metadata in offline.items():
+        if cache:
+            cache.put(manga_name, metadata)
+        results[manga_name] = metadata
+        if futures and manga_name in futures:
+            futures[manga_name].set_result(metadata)
+    names = [name for name in names if name not in offline]
+    if not names:
+        return results
+
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+    async with JikanClient() as client:
+
+        async def resolve(manga_name):
+            async with semaphore:
+                try:
+                    results[manga_name] = await fetch_manga_info_async(
+                        client, manga_name
+                    )
+                except JikanUnavailableError as e:
+                    logging.warning(f"Prefetch failed for '{manga_name}': {e}")
+                    results[manga_name] = None
+            if futures and manga_name in futures:
+                futures[manga_name].set_result(results[manga_name])
+
+        await asyncio.gather(*(resolve(name) for name in names))
+    return results
+
+
+def prefetch_manga_info(manga_names) -> dict:
+    """
+    Blocking wrapper around prefetch_manga_info_async.
+    """
+    return asyncio.run(prefetch_manga_info_async(manga_names))
+
+
+def start_prefetch(manga_names) -> dict[str, Future]:
+    """
+    Starts resolving `manga_names` on a background thread and returns immediately.
+    Returns a {manga_name: Future} dictionary; each future completes with the
+    metadata (or None) as soon as that name is resolved, and the results are
+    also written to the metadata cache so fetch_manga_info_jikan finds them.
+    """
+    futures = {name: Future() for name in dict.fromkeys(manga_names)}
+
+    def run():
+        try:
+            asyncio.run(prefetch_manga_info_async(list(futures), futures))
+        except Exception as e:
+            logging.error(f"Metadata prefetch failed: {e}")
+        finally:
+            for future in futures.values():
+                if not future.done():
+                    future.set_result(None)
+
+    threading.Thread(target=run, name="jikan-prefetch", daemon=True).start()
+    return futures
+
+
 def download_cover_image(cover_image_url: str, manga_name: str) -> Path | None:
+    """
+    Returns a local copy of the cover image at `cover_image_url`.
+    The copy comes from the persistent cover cache when it is available
+    (and must not be deleted); otherwise it is a temporary file.
+    """
+    import requests
+
+    cover_cache = get_cover_cache()
+    if cover_cache:
+        try:
+            return cover_cache.fetch_url(
+                cover_image_url, get_http_session(), COVER_DOWNLOAD_TIMEOUT
+            )
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error downloading cover image: {e}")
+            return None
+
     try:
-        response = requests.get(cover_image_url, stream=True)
+        response = get_http_session().get(
+            cover_image_url, stream=True, timeout=COVER_DOWNLOAD_TIMEOUT
+        )
         response.raise_for_status()
 
         image_extension = Path(cover_image_url).suffix
@@ -138,4 +320,5 @@ def download_cover_image(cover_image_url: str, manga_name: str) -> Path | None:
 
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     result = fetch_manga_info_jikan("Berserk Prologue")
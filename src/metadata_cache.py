@@ -0,0 +1,184 @@
+from dataclasses import dataclass
+import json
+import logging
+from pathlib import Path
+import re
+import sqlite3
+import threading
+import time
+
+from .constants import (
+    CACHE_DIR,
+    METADATA_CACHE_FILE,
+    METADATA_CACHE_TTL,
+    METADATA_NEGATIVE_TTL,
+)
+from .sqlite_store import init_db, open_db
+
+_NON_WORD_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    manga_name TEXT NOT NULL,
+    metadata TEXT,
+    fetched_at REAL NOT NULL,
+    pinned INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def normalize_manga_name(manga_name: str) -> str:
+    """
+    Builds the cache key for a manga name: case, punctuation and spacing are ignored,
+    so 'One-Piece' and 'one piece' share an entry.
+    """
+    return " ".join(_NON_WORD_PATTERN.sub(" ", manga_name.casefold()).split())
+
+
+@dataclass
+class CachedMetadata:
+    """
+    One cache row. `metadata` is None for a remembered failed lookup.
+    """
+
+    key: str
+    manga_name: str
+    metadata: dict | None
+    fetched_at: float
+    pinned: bool
+
+    @property
+    def is_negative(self) -> bool:
+        return self.metadata is None
+
+
+class MetadataCache:
+    """
+    SQLite-backed cache of resolved Jikan metadata keyed by normalized manga name.
+    Successful lookups are reused for `ttl` seconds, failed ones for `negative_ttl`
+    seconds, and pinned entries never expire.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        ttl: float = METADATA_CACHE_TTL,
+        negative_ttl: float = METADATA_NEGATIVE_TTL,
+    ):
+        self.path = Path(path) if path else CACHE_DIR / METADATA_CACHE_FILE
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        init_db(self.path, _SCHEMA)
+
+    def _connect(self):
+        return open_db(self.path)
+
+    def is_fresh(self, entry: CachedMetadata, now: float | None = None) -> bool:
+        if entry.pinned:
+            return True
+        age = (now or time.time()) - entry.fetched_at
+        return age < (self.negative_ttl if entry.is_negative else self.ttl)
+
+    def lookup(self, manga_name: str) -> CachedMetadata | None:
+        """
+        Returns the stored entry for `manga_name`, fresh or not, or None if there is none.
+        """
+        key = normalize_manga_name(manga_name)
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT key, manga_name, metadata, fetched_at, pinned FROM metadata WHERE key = ?",
+                (key,),
+            ).fetchone()
+        return _row_to_entry(row) if row else None
+
+    def get(self, manga_name: str) -> CachedMetadata | None:
+        """
+        Returns the entry for `manga_name` only if it is still fresh.
+        """
+        entry = self.lookup(manga_name)
+        if entry and self.is_fresh(entry):
+            return entry
+        return None
+
+    def put(self, manga_name: str, metadata: dict | None) -> None:
+        """
+        Stores a lookup result; pass None to remember a failed lookup.
+        An existing pin is kept.
+        """
+        key = normalize_manga_name(manga_name)
+        payload = json.dumps(metadata) if metadata is not None else None
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO metadata (key, manga_name, metadata, fetched_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    manga_name = excluded.manga_name,
+                    metadata = excluded.metadata,
+                    fetched_at = excluded.fetched_at
+                """,
+                (key, manga_name, payload, time.time()),
+            )
+
+    def set_pinned(self, manga_name: str, pinned: bool) -> bool:
+        """
+        Pins or unpins an entry. Returns False if there is no entry for `manga_name`.
+        """
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE metadata SET pinned = ? WHERE key = ?",
+                (int(pinned), normalize_manga_name(manga_name)),
+            )
+        return cursor.rowcount > 0
+
+    def forget(self, manga_name: str) -> bool:
+        """
+        Deletes an entry. Returns False if there was none.
+        """
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM metadata WHERE key = ?",
+                (normalize_manga_name(manga_name),),
+            )
+        return cursor.rowcount > 0
+
+    def entries(self) -> list[CachedMetadata]:
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, manga_name, metadata, fetched_at, pinned FROM metadata ORDER BY key"
+            ).fetchall()
+        return [_row_to_entry(row) for row in rows]
+
+
+def _row_to_entry(row) -> CachedMetadata:
+    key, manga_name, payload, fetched_at, pinned = row
+    return CachedMetadata(
+        key=key,
+        manga_name=manga_name,
+        metadata=json.loads(payload) if payload is not None else None,
+        fetched_at=fetched_at,
+        pinned=bool(pinned),
+    )
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_metadata_cache() -> MetadataCache | None:
+    """
+    Returns the shared cache in CACHE_DIR, or None if it cannot be opened.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = MetadataCache()
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(
+                    f"Metadata cache unavailable, querying Jikan directly: {e}"
+                )
+                return None
+        return _default_cache
@@ -1,11 +1,18 @@
+from collections import Counter, defaultdict
 import logging
 from pathlib import Path
 import re
 
+from .utils import generate_chapter_range, natural_sort_key
+
 MANGA_CHAPTER_PATTERN = re.compile(r"([\d]+.?\d*)\.cbz", re.IGNORECASE)
 MANGA_NAME_PATTERN = re.compile(
     r"^(.*?)\s*Chapter[\s\-_]*[\d\.]+.*\.cbz$", re.IGNORECASE
 )
+CHAPTER_KEYWORD_PATTERN = re.compile(r"Chapter[\s\-_]*(\d+(?:\.\d+)?)", re.IGNORECASE)
+EXTRA_CHAPTER_PATTERN = re.compile(
+    r"\b(extra|special|omake|bonus|side[\s\-_]?story)\b", re.IGNORECASE
+)
 
 
 def parse_chapter_number(filename):
@@ -19,36 +26,138 @@ def parse_chapter_number(filename):
         - 'Manga Name Chapter125.5.cbz'
     Returns a float representing the chapter number, or None if not found.
     """
-    # Improved regex to handle optional space or delimiter between 'Chapter' and number
-    match = re.search(MANGA_CHAPTER_PATTERN, filename)
+    # The number before '.cbz' is tried first, as it always was: chapter numbers name
+    # the status keys and output files of libraries that are already processed
+    match = MANGA_CHAPTER_PATTERN.search(filename)
     if match:
         try:
             return float(match.group(1))
         except ValueError:
             logging.warning(f"Invalid chapter number format in filename '{filename}'.")
             return None
+    # Only names without a trailing number fall back to the one after 'Chapter'
+    match = CHAPTER_KEYWORD_PATTERN.search(filename)
+    if match:
+        return float(match.group(1))
     logging.warning(f"No chapter number found in filename '{filename}'.")
     return None
 
 
+def parse_series_name(filename: str) -> str | None:
+    """
+    Extracts the manga name from a CBZ filename.
+    Example: 'Manga Name Chapter 1.cbz' -> 'Manga Name'
+    """
+    match = MANGA_NAME_PATTERN.match(filename)
+    if match and match.group(1).strip():
+        return match.group(1).strip()
+    return None
+
+
+class ChapterEntry:
+    """
+    One chapter file with its filename parsed once.
+    `number` is None when no chapter number could be found.
+    """
+
+    __slots__ = ("path", "number", "is_decimal", "is_extra", "series_name")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.number = parse_chapter_number(path.name)
+        self.is_decimal = self.number is not None and not self.number.is_integer()
+        self.is_extra = bool(EXTRA_CHAPTER_PATTERN.search(path.stem))
+        self.series_name = parse_series_name(path.name)
+
+    def sort_key(self) -> tuple:
+        # Unparseable chapters go after every numbered one, in natural filename order
+        return (self.number is None, self.number or 0.0, natural_sort_key(self.path.name))
+
+    def __repr__(self) -> str:
+        return f"ChapterEntry({self.path.name!r}, number={self.number})"
+
+
+class ChapterIndex:
+    """
+    The chapters of one folder, parsed once and sorted by chapter number.
+    Also holds the series name agreed on by most filenames and the chapter numbers
+    that appear in more than one file.
+    """
+
+    __slots__ = ("directory", "entries", "series_name", "duplicates", "_by_path")
+
+    def __init__(self, directory: Path, cbz_files: list[Path]):
+        self.directory = directory
+        self.entries = sorted(
+            (ChapterEntry(cbz) for cbz in cbz_files), key=ChapterEntry.sort_key
+        )
+        self._by_path = {entry.path: entry for entry in self.entries}
+
+        names = Counter(
+            entry.series_name for entry in self.entries if entry.series_name
+        )
+        # Fallback to directory name
+        self.series_name = names.most_common(1)[0][0] if names else directory.name
+
+        by_number = defaultdict(list)
+        for entry in self.entries:
+            if entry.number is not None:
+                by_number[entry.number].append(entry)
+        self.duplicates = {
+            number: entries for number, entries in by_number.items() if len(entries) > 1
+        }
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def paths(self) -> list[Path]:
+        return [entry.path for entry in self.entries]
+
+    @property
+    def unnumbered(self) -> list[ChapterEntry]:
+        return [entry for entry in self.entries if entry.number is None]
+
+    def entry(self, cbz_path: Path) -> ChapterEntry | None:
+        return self._by_path.get(cbz_path)
+
+    def chapter_numbers(self, cbz_files: list[Path]) -> list[float]:
+        """
+        Returns the chapter numbers of `cbz_files`, leaving out unparseable ones.
+        """
+        numbers = []
+        for cbz in cbz_files:
+            entry = self._by_path.get(cbz)
+            if entry and entry.number is not None:
+                numbers.append(entry.number)
+        return numbers
+
+    def chapter_range(
+        self, cbz_files: list[Path], part_number: int | None = None
+    ) -> str:
+        return generate_chapter_range(self.chapter_numbers(cbz_files), part_number)
+
+    def log_summary(self) -> None:
+        for number, entries in sorted(self.duplicates.items()):
+            logging.warning(
+                f"Chapter {number:g} appears in {len(entries)} files: "
+                f"{', '.join(entry.path.name for entry in entries)}"
+            )
+        if self.unnumbered:
+            logging.warning(
+                f"{len(self.unnumbered)} files have no chapter number and are placed last."
+            )
+
+
 def get_manga_name(directory: Path, cbz_files: list[Path]) -> str:
     """
     Attempts to parse the manga name from the CBZ filenames.
     If CBZ filenames include the manga name (e.g., 'Manga Name Chapter 1.cbz'),
-    it extracts the manga name. Otherwise, it uses the directory name.
+    the name most of them agree on is used. Otherwise, it uses the directory name.
     """
     if not cbz_files:
         return None
-
-    first_cbz = cbz_files[0].name
-    # Attempt to extract manga name from the first CBZ filename
-    # Example: 'Manga Name Chapter 1.cbz' -> 'Manga Name'
-    match = re.match(MANGA_NAME_PATTERN, first_cbz)
-    if match and match.group(1).strip():
-        return match.group(1).strip()
-    else:
-        # Fallback to directory name
-        return directory.name
+    return ChapterIndex(directory, cbz_files).series_name
 
 
 def is_volume(chapter_number: int, manga_name: str) -> bool:
@@ -0,0 +1,84 @@
+import logging
+import queue
+import threading
+from typing import Callable, Iterable
+
+_DONE = object()
+
+
+def run_pipeline(
+    items: Iterable,
+    stages: list[tuple[str, Callable, int]],
+    queue_size: int = 1,
+) -> list:
+    """
+    Runs every item through `stages` with bounded queues between them.
+    Each stage is a (name, func, workers) tuple; `func(item)` runs on one of the
+    stage's worker threads and the item is handed to the next stage only if it
+    returns a truthy value. `items` is consumed lazily on its own thread, so a
+    generator that scans or groups work overlaps with the stages downstream.
+    Queues hold at most `queue_size` items, which keeps a fast stage from
+    running arbitrarily far ahead of a slow one.
+    Returns the items that made it through every stage, in completion order.
+    """
+    stages = [(name, func, max(1, workers)) for name, func, workers in stages]
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+    completed = []
+    completed_lock = threading.Lock()
+    threads = []
+
+    def feed():
+        try:
+            for item in items:
+                queues[0].put(item)
+        except Exception as e:
+            logging.error(f"Failed to produce pipeline items: {e}")
+        finally:
+            for _ in range(stages[0][2]):
+                queues[0].put(_DONE)
+
+    def make_worker(index: int, remaining: list, remaining_lock: threading.Lock):
+        name, func, _ = stages[index]
+        is_last = index == len(stages) - 1
+
+        def work():
+            while True:
+                item = queues[index].get()
+                if item is _DONE:
+                    break
+                try:
+                    passed = func(item)
+                except Exception as e:
+                    logging.error(f"Stage '{name}' failed: {e}")
+                    passed = False
+                if not passed:
+                    continue
+                if is_last:
+                    with completed_lock:
+                        completed.append(item)
+                else:
+                    queues[index + 1].put(item)
+
+            # The last worker of a stage to finish shuts down the next stage
+            with remaining_lock:
+                remaining[0] -= 1
+                last_worker = remaining[0] == 0
+            if last_worker and not is_last:
+                for _ in range(stages[index + 1][2]):
+                    queues[index + 1].put(_DONE)
+
+        return work
+
+    threads.append(threading.Thread(target=feed, name="pipeline-feed", daemon=True))
+    for index, (name, _, workers) in enumerate(stages):
+        worker = make_worker(index, [workers], threading.Lock())
+        for n in range(workers):
+            threads.append(
+                threading.Thread(target=worker, name=f"{name}-{n + 1}", daemon=True)
+            )
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return completed
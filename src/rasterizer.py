@@ -0,0 +1,148 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import io
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .constants import (
+    DEVICE_PROFILE,
+    DEVICE_PROFILES,
+    RASTERIZE_JPEG_QUALITY,
+    RASTERIZE_WORKERS,
+    TRIM_MIN_KEEP,
+    TRIM_TOLERANCE,
+)
+
+# Pillow is imported where pages are processed, so runs without --rasterize never load it
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+def trim_margins(
+    image: "Image.Image", tolerance: int = TRIM_TOLERANCE
+) -> "Image.Image":
+    """
+    Crops borders that have the same shade as the top-left pixel (within `tolerance`).
+    Pages that would lose more than TRIM_MIN_KEEP of either dimension, such as
+    mostly blank pages, are returned unchanged.
+    """
+    from PIL import Image, ImageChops
+
+    background = Image.new("L", image.size, image.getpixel((0, 0)))
+    mask = ImageChops.difference(image, background).point(
+        lambda value: 255 if value > tolerance else 0
+    )
+    bbox = mask.getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = bbox
+    if (right - left) < image.width * TRIM_MIN_KEEP or (
+        bottom - top
+    ) < image.height * TRIM_MIN_KEEP:
+        return image
+    return image.crop(bbox)
+
+
+def rasterize_page(
+    data: bytes, screen_size: tuple[int, int], trim: bool = True
+) -> bytes:
+    """
+    Converts one page to grayscale, trims its margins and downscales it to fit the
+    screen, returning it as a JPEG. Landscape pages are treated as two-page
+    spreads and may be up to two screens wide, since KCC splits them later.
+    Pages are never upscaled.
+    """
+    from PIL import Image
+
+    width, height = screen_size
+    with Image.open(io.BytesIO(data)) as source:
+        image = source.convert("L")
+    if trim:
+        image = trim_margins(image)
+    if image.width > image.height:
+        width *= 2
+    scale = min(width / image.width, height / image.height)
+    if scale < 1:
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.LANCZOS,
+        )
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=RASTERIZE_JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def _rasterize_job(job: tuple) -> bytes | None:
+    # Runs in a worker process; failures are reported to the parent as None
+    data, screen_size, trim = job
+    try:
+        return rasterize_page(data, screen_size, trim)
+    except Exception:
+        return None
+
+
+class PageRasterizer:
+    """
+    Pre-processes pages for a device profile (grayscale, trimmed margins, downscaled
+    to the screen resolution) across a pool of worker processes, so KCC receives
+    pages that are already close to their final size.
+    Use as a context manager; one instance can be shared by several threads.
+    """
+
+    def __init__(
+        self,
+        profile: str = DEVICE_PROFILE,
+        workers: int = RASTERIZE_WORKERS,
+        trim: bool = True,
+    ):
+        self.profile = profile
+        self.screen_size = DEVICE_PROFILES[profile]
+        self.workers = workers
+        self.trim = trim
+        self._executor = None
+
+    def __enter__(self):
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown(cancel_futures=True)
+        self._executor = None
+
+    @property
+    def settings(self) -> dict:
+        """
+        Everything that affects the output pages, for pack fingerprints.
+        """
+        return {
+            "profile": self.profile,
+            "trim": self.trim,
+            "quality": RASTERIZE_JPEG_QUALITY,
+        }
+
+    def map_pages(self, pages):
+        """
+        Processes (arcname, data) pairs in parallel and yields them in the same order,
+        renamed to '.jpg'. At most two pages per worker are in flight, so memory stays
+        bounded however long the pack is. Pages that cannot be decoded are passed
+        through unchanged.
+        """
+        pending = deque()
+        window = self.workers * 2
+        for arcname, data in pages:
+            future = self._executor.submit(
+                _rasterize_job, (data, self.screen_size, self.trim)
+            )
+            pending.append((arcname, data, future))
+            if len(pending) >= window:
+                yield self._result(*pending.popleft())
+        while pending:
+            yield self._result(*pending.popleft())
+
+    def _result(self, arcname: str, data: bytes, future) -> tuple[str, bytes]:
+        processed = future.result()
+        if processed is None:
+            logging.warning(f"Could not process page '{arcname}', keeping it as is.")
+            return arcname, data
+        return str(Path(arcname).with_suffix(".jpg")), processed
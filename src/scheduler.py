@@ -0,0 +1,87 @@
+import itertools
+import logging
+import queue
+import threading
+from typing import Callable
+
+NETWORK = "network"
+DISK = "disk"
+CPU = "cpu"
+
+_STOP = object()
+
+
+class ResourceScheduler:
+    """
+    Runs jobs on separate worker pools, one per resource type (network, disk, cpu),
+    each with its own concurrency limit. Every pool serves its jobs from a priority
+    queue (lower values first, FIFO among equals), and a job may submit follow-up
+    jobs to any pool, e.g. a metadata lookup that queues the packs of its series.
+    A job that fails or hangs only occupies one worker of its own pool.
+    """
+
+    def __init__(self, limits: dict[str, int]):
+        self._queues = {resource: queue.PriorityQueue() for resource in limits}
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._limits = {resource: max(1, limit) for resource, limit in limits.items()}
+        self._threads = []
+        for resource, limit in self._limits.items():
+            for n in range(limit):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(resource,),
+                    name=f"{resource}-{n + 1}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(
+        self, resource: str, func: Callable, *args, priority: tuple = ()
+    ) -> None:
+        """
+        Queues `func(*args)` on the pool for `resource`.
+        Priorities are tuples compared element-wise; lower runs first.
+        """
+        with self._idle:
+            self._pending += 1
+        self._queues[resource].put((priority, next(self._sequence), func, args))
+
+    def wait(self) -> None:
+        """
+        Blocks until every submitted job, including follow-ups, has finished.
+        """
+        with self._idle:
+            while self._pending:
+                self._idle.wait(timeout=1.0)
+
+    def shutdown(self) -> None:
+        """
+        Stops the workers once the jobs already queued have run.
+        """
+        for resource, jobs in self._queues.items():
+            for _ in range(self._limits[resource]):
+                # Sorts after every real job regardless of its priority
+                jobs.put(((float("inf"),), next(self._sequence), _STOP, ()))
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self, resource: str) -> None:
+        jobs = self._queues[resource]
+        while True:
+            _, _, func, args = jobs.get()
+            if func is _STOP:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                logging.error(
+                    f"{resource} job '{getattr(func, '__name__', func)}' failed: {e}"
+                )
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    if not self._pending:
+                        self._idle.notify_all()
@@ -37,14 +37,15 @@ def fuzzy_search_manga(query):
         return None
 
 
-# Example Usage
-folder_name = "Monster"
-result = fuzzy_search_manga(folder_name)
-
-if result:
-    print(f"Best Match: {result['title']}")
-    print(f"Synopsis: {result.get('synopsis', 'No synopsis available.')}")
-    print(f"Score: {result.get('score', 'No score available.')}")
-    print(f"URL: {result.get('url', 'No URL available.')}")
-else:
-    print("No match found.")
+if __name__ == "__main__":
+    # Example Usage
+    folder_name = "Monster"
+    result = fuzzy_search_manga(folder_name)
+
+    if result:
+        print(f"Best Match: {result['title']}")
+        print(f"Synopsis: {result.get('synopsis', 'No synopsis available.')}")
+        print(f"Score: {result.get('score', 'No score available.')}")
+        print(f"URL: {result.get('url', 'No URL available.')}")
+    else:
+        print("No match found.")
@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+from pathlib import Path
+import sqlite3
+
+SQLITE_TIMEOUT = 30  # seconds to wait for another writer before giving up
+
+
+@contextmanager
+def open_db(path: Path):
+    """
+    Opens a SQLite database for one unit of work; commits on success, rolls back on error.
+    `path` may also be a 'file:' URI, such as a shared in-memory database.
+    """
+    uri = isinstance(path, str) and path.startswith("file:")
+    conn = sqlite3.connect(path, timeout=SQLITE_TIMEOUT, uri=uri)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def init_db(path: Path, schema: str) -> None:
+    """
+    Creates the database and its tables if needed and switches it to WAL mode,
+    which lets readers and a writer from several processes work concurrently.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open_db(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(schema)
@@ -1,58 +1,257 @@
 import json
 import logging
 from pathlib import Path
+import sqlite3
+import threading
+import time
 
+from .constants import STATUS_DB
+from .sqlite_store import init_db, open_db
+from .tracing import span
 
-def load_status(current_dir, status_file_path: Path) -> dict:
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parts (
+    chapter_range TEXT PRIMARY KEY,
+    processed INTEGER NOT NULL DEFAULT 0,
+    converted INTEGER NOT NULL DEFAULT 0,
+    fingerprint TEXT,
+    inputs TEXT,
+    convert_fingerprint TEXT,
+    cbz_size INTEGER,
+    combine_seconds REAL,
+    processed_at REAL,
+    mobi_size INTEGER,
+    convert_seconds REAL,
+    converted_at REAL
+);
+"""
+
+_PART_COLUMNS = (
+    "chapter_range",
+    "processed",
+    "converted",
+    "fingerprint",
+    "inputs",
+    "convert_fingerprint",
+    "cbz_size",
+    "combine_seconds",
+    "processed_at",
+    "mobi_size",
+    "convert_seconds",
+    "converted_at",
+)
+
+
+_ADDED_COLUMNS = (("inputs", "TEXT"), ("convert_fingerprint", "TEXT"))
+
+
+class StatusStore:
     """
-    Loads the processing status from a JSON file.
-    Uses chapter ranges as keys.
-    If the file does not exist, returns an empty status.
+    Per-folder processing status kept in a SQLite database in WAL mode.
+    Every update touches a single row, so recording a part costs the same no matter
+    how many parts exist, and several workers or processes can update the same
+    folder without losing each other's writes. Besides the processed/converted
+    flags each part records timings, output sizes and its input fingerprint.
+    With `in_memory`, the store starts as a copy of the database at `db_path`, if
+    there is one, and lives in memory only, so dry runs leave the folder untouched.
     """
-    status_file_path = current_dir / status_file_path
 
-    if not status_file_path.exists():
+    def __init__(self, db_path: Path, in_memory: bool = False):
+        self._lock = threading.Lock()
+        if in_memory:
+            self.path = f"file:status-{id(self)}?mode=memory&cache=shared"
+            # A shared in-memory database lives as long as one connection to it
+            self._keepalive = sqlite3.connect(self.path, uri=True, check_same_thread=False)
+            if db_path.exists():
+                source = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
+                try:
+                    source.backup(self._keepalive)
+                finally:
+                    source.close()
+            self._keepalive.executescript(_SCHEMA)
+        else:
+            self.path = db_path
+            init_db(self.path, _SCHEMA)
+        self._add_missing_columns()
+
+    def _add_missing_columns(self) -> None:
+        # Databases created by older versions lack the columns added since
+        with self._lock, open_db(self.path) as conn:
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(parts)")}
+            for column, column_type in _ADDED_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE parts ADD COLUMN {column} {column_type}")
+
+    def _upsert(self, chapter_range: str, values: dict) -> None:
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in values)
+        with span("status_save", part=chapter_range), self._lock, open_db(
+            self.path
+        ) as conn:
+            conn.execute(
+                f"""
+                INSERT INTO parts (chapter_range, {columns}) VALUES (?, {placeholders})
+                ON CONFLICT(chapter_range) DO UPDATE SET {updates}
+                """,
+                (chapter_range, *values.values()),
+            )
+
+    def mark_processed(
+        self,
+        chapter_range: str,
+        fingerprint: str | None = None,
+        inputs: dict | None = None,
+        cbz_size: int | None = None,
+        combine_seconds: float | None = None,
+    ) -> None:
+        """
+        Records a freshly combined CBZ. Any earlier conversion of the part is
+        invalidated, since it was made from the previous CBZ.
+        """
+        self._upsert(
+            chapter_range,
+            {
+                "processed": 1,
+                "converted": 0,
+                "fingerprint": fingerprint,
+                "inputs": json.dumps(inputs) if inputs is not None else None,
+                "convert_fingerprint": None,
+                "cbz_size": cbz_size,
+                "combine_seconds": combine_seconds,
+                "processed_at": time.time(),
+            },
+        )
+
+    def mark_converted(
+        self,
+        chapter_range: str,
+        convert_fingerprint: str | None = None,
+        mobi_size: int | None = None,
+        convert_seconds: float | None = None,
+    ) -> None:
+        self._upsert(
+            chapter_range,
+            {
+                "converted": 1,
+                "convert_fingerprint": convert_fingerprint,
+                "mobi_size": mobi_size,
+                "convert_seconds": convert_seconds,
+                "converted_at": time.time(),
+            },
+        )
+
+    def part(self, chapter_range: str) -> dict | None:
+        """
+        Returns everything recorded for one part, or None if it was never processed.
+        """
+        with self._lock, open_db(self.path) as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_PART_COLUMNS)} FROM parts WHERE chapter_range = ?",
+                (chapter_range,),
+            ).fetchone()
+        return _row_to_part(row) if row else None
+
+    def parts(self) -> list[dict]:
+        with self._lock, open_db(self.path) as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(_PART_COLUMNS)} FROM parts ORDER BY processed_at"
+            ).fetchall()
+        return [_row_to_part(row) for row in rows]
+
+    def forget(self, chapter_range: str) -> None:
+        """
+        Drops everything recorded for one part.
+        """
+        with self._lock, open_db(self.path) as conn:
+            conn.execute("DELETE FROM parts WHERE chapter_range = ?", (chapter_range,))
+
+    def processed_parts(self) -> list[str]:
+        return [part["chapter_range"] for part in self.parts() if part["processed"]]
+
+    def converted_parts(self) -> list[str]:
+        return [part["chapter_range"] for part in self.parts() if part["converted"]]
+
+    def migrate_json(self, status_file_path: Path, rename: bool = True) -> None:
+        """
+        Imports a legacy processing_status.json and renames it to '.json.migrated',
+        or leaves it in place without `rename`.
+        """
+        try:
+            with open(status_file_path, "r", encoding="utf-8") as f:
+                legacy_status = json.load(f)
+        except Exception as e:
+            logging.error(f"Failed to load status file '{status_file_path}': {e}")
+            return
+
+        processed = legacy_status.get("processed_cbz_parts", {})
+        converted = legacy_status.get("converted_mobi_parts", {})
+        with self._lock, open_db(self.path) as conn:
+            conn.executemany(
+                """
+                INSERT INTO parts (chapter_range, processed, converted) VALUES (?, ?, ?)
+                ON CONFLICT(chapter_range) DO UPDATE SET
+                    processed = MAX(processed, excluded.processed),
+                    converted = MAX(converted, excluded.converted)
+                """,
+                [
+                    (
+                        chapter_range,
+                        int(chapter_range in processed),
+                        int(chapter_range in converted),
+                    )
+                    for chapter_range in dict.fromkeys([*processed, *converted])
+                ],
+            )
+        if not rename:
+            logging.info(f"Read the legacy status file '{status_file_path}'.")
+            return
+        try:
+            status_file_path.replace(
+                status_file_path.with_name(status_file_path.name + ".migrated")
+            )
+        except FileNotFoundError:
+            # Another process migrated the same file concurrently
+            return
         logging.info(
-            f"Status file '{status_file_path}' does not exist. Initializing new status."
+            f"Migrated {len(processed)} processed and {len(converted)} converted parts from '{status_file_path}'."
         )
-        return {"processed_cbz_parts": {}, "converted_mobi_parts": {}}, status_file_path
-    try:
-        with open(status_file_path, "r", encoding="utf-8") as f:
-            status = json.load(f)
-        logging.debug(f"Loaded processing status from '{status_file_path}'.")
-        return status, status_file_path
-    except Exception as e:
-        logging.error(f"Failed to load status file '{status_file_path}': {e}")
-        return {"processed_cbz_parts": {}, "converted_mobi_parts": {}}, status_file_path
-
-
-def save_status(status_file: Path, status: dict):
+
+
+def _row_to_part(row) -> dict:
+    part = dict(zip(_PART_COLUMNS, row))
+    part["inputs"] = json.loads(part["inputs"]) if part["inputs"] else None
+    return part
+
+
+def load_status(current_dir, status_file_path: Path, dry_run: bool = False) -> StatusStore:
     """
-    Saves the processing status to a JSON file atomically.
+    Opens the processing status of `current_dir`.
+    Uses chapter ranges as keys. A legacy JSON status file at `status_file_path`
+    (relative to `current_dir`) is migrated into the database the first time.
+    With `dry_run`, the status is only read: nothing is created, migrated or renamed.
     """
-    try:
-        temp_file = status_file.with_suffix(".tmp")
-        with open(temp_file, "w", encoding="utf-8") as f:
-            json.dump(status, f, indent=4)
-        temp_file.replace(status_file)
-        logging.debug(f"Saved processing status to '{status_file}'.")
-    except Exception as e:
-        logging.error(f"Failed to save status file '{status_file}': {e}")
+    store = StatusStore(current_dir / STATUS_DB, in_memory=dry_run)
+    legacy_status_file = current_dir / status_file_path
+    if legacy_status_file.exists():
+        store.migrate_json(legacy_status_file, rename=not dry_run)
+    logging.debug(f"Loaded processing status from '{store.path}'.")
+    return store
 
 
-def update_conversion_status(status_file, status, chapter_range):
-    status.setdefault("converted_mobi_parts", {})[chapter_range] = True
-    save_status(status_file, status)
+def update_conversion_status(status: StatusStore, chapter_range, **details):
+    status.mark_converted(chapter_range, **details)
 
 
-def update_status(status_file, status, chapter_range):
-    status.setdefault("processed_cbz_parts", {})[chapter_range] = True
-    save_status(status_file, status)
+def update_status(status: StatusStore, chapter_range, **details):
+    status.mark_processed(chapter_range, **details)
 
 
-def part_already_converted_to_mobi(status: dict, chapter_range):
-    return chapter_range in status.get("converted_mobi_parts", {})
+def part_already_converted_to_mobi(status: StatusStore, chapter_range):
+    part = status.part(chapter_range)
+    return bool(part and part["converted"])
 
 
-def part_already_processed(status: dict, chapter_range):
-    return chapter_range in status.get("processed_cbz_parts", {})
+def part_already_processed(status: StatusStore, chapter_range):
+    part = status.part(chapter_range)
+    return bool(part and part["processed"])
@@ -0,0 +1,404 @@
+from dataclasses import dataclass
+import gzip
+import json
+import logging
+from pathlib import Path
+import threading
+import time
+
+from .constants import (
+    CACHE_DIR,
+    TITLE_INDEX_FILE,
+    TITLE_INDEX_MAX_POSTINGS,
+    TITLE_INDEX_MIN_RATIO,
+    TITLE_INDEX_MIN_SCORE,
+)
+from .metadata_cache import normalize_manga_name
+from .sqlite_store import init_db, open_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manga (
+    mal_id INTEGER PRIMARY KEY,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS titles (
+    id INTEGER PRIMARY KEY,
+    normalized TEXT NOT NULL,
+    title TEXT NOT NULL,
+    mal_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS titles_normalized ON titles (normalized);
+CREATE TABLE IF NOT EXISTS words (
+    word TEXT NOT NULL,
+    title_id INTEGER NOT NULL,
+    PRIMARY KEY (word, title_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS vocabulary (
+    word TEXT PRIMARY KEY,
+    titles INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS info (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+# SQLite limits the number of parameters of one statement
+_SQL_BATCH = 500
+# Rarest words of a name whose titles are scored
+_CANDIDATE_WORDS = 2
+# Known words standing in for a word missing from the index (a typo), and how close they must be
+_TYPO_WORDS = 3
+_TYPO_MIN_RATIO = 75
+_TYPO_CHUNK = 64
+
+# Fields of a Jikan manga record kept in the index; enough for build_manga_metadata
+RECORD_FIELDS = (
+    "mal_id",
+    "title",
+    "titles",
+    "title_synonyms",
+    "title_english",
+    "authors",
+    "synopsis",
+    "genres",
+    "score",
+    "images",
+)
+
+
+def record_titles(manga: dict) -> list[str]:
+    """
+    Returns every title of a Jikan manga record: the main title, the alternate
+    titles, the synonyms and the English title, in that order.
+    """
+    titles = [manga.get("title", "")]
+    titles += [entry.get("title", "") for entry in manga.get("titles", [])]
+    titles += manga.get("title_synonyms", [])
+    if manga.get("title_english"):
+        titles.append(manga["title_english"])
+    return titles
+
+
+def read_dump(dump_path: Path) -> list[dict]:
+    """
+    Returns the manga records of a dump: a JSON list, a Jikan response ({"data": [...]})
+    or JSON lines, optionally gzip-compressed.
+    """
+    opener = gzip.open if dump_path.suffix == ".gz" else open
+    with opener(dump_path, "rt", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        return data["data"] if "data" in data else [data]
+    return data
+
+
+@dataclass
+class TitleMatch:
+    """
+    The best title of the index for one name, with its RapidFuzz scores (0-100)
+    and the Jikan record it belongs to. `score` is WRatio, which forgives extra
+    words; `ratio` is the plain edit-distance ratio, which does not.
+    """
+
+    name: str
+    title: str
+    score: int
+    ratio: int
+    record: dict
+
+    def is_confident(
+        self, min_score: int = TITLE_INDEX_MIN_SCORE, min_ratio: int = TITLE_INDEX_MIN_RATIO
+    ) -> bool:
+        return self.score >= min_score and self.ratio >= min_ratio
+
+
+class TitleIndex:
+    """
+    Local index of manga titles built from a dump of Jikan records, for matching
+    folder names without the network. Names whose normalized form is a known title
+    are resolved with one indexed query, unless that title belongs to several manga
+    (a remake and its original, say), which leaves the name unmatched. The others are compared with RapidFuzz
+    against the titles sharing one of their rarest words, found through an
+    inverted word index, so a lookup never scans every title. A word missing from
+    the index is replaced by the known words closest to it, so a typo in a rare
+    word still finds candidates.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else CACHE_DIR / TITLE_INDEX_FILE
+        self._lock = threading.Lock()
+        init_db(self.path, _SCHEMA)
+
+    def build(self, dump_path: Path) -> int:
+        """
+        Replaces the index with the records of `dump_path`. Returns the number of
+        records indexed.
+        """
+        records = []
+        titles = []
+        words = set()
+        for manga in read_dump(Path(dump_path)):
+            if "mal_id" not in manga or not manga.get("title"):
+                continue
+            records.append(
+                (
+                    manga["mal_id"],
+                    json.dumps(
+                        {key: manga[key] for key in RECORD_FIELDS if key in manga},
+                        ensure_ascii=False,
+                    ),
+                )
+            )
+            seen = set()
+            for title in record_titles(manga):
+                normalized = normalize_manga_name(title or "")
+                if normalized and normalized not in seen:
+                    seen.add(normalized)
+                    titles.append((len(titles), normalized, title, manga["mal_id"]))
+                    words.update(
+                        (word, len(titles) - 1) for word in normalized.split()
+                    )
+
+        vocabulary = {}
+        for word, _ in words:
+            vocabulary[word] = vocabulary.get(word, 0) + 1
+        with self._lock, open_db(self.path) as conn:
+            for table in ("manga", "titles", "words", "vocabulary"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                "INSERT OR REPLACE INTO manga (mal_id, record) VALUES (?, ?)", records
+            )
+            conn.executemany(
+                "INSERT INTO titles (id, normalized, title, mal_id) VALUES (?, ?, ?, ?)",
+                titles,
+            )
+            conn.executemany("INSERT INTO words (word, title_id) VALUES (?, ?)", words)
+            conn.executemany(
+                "INSERT INTO vocabulary (word, titles) VALUES (?, ?)",
+                vocabulary.items(),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+                [("source", str(dump_path)), ("built_at", str(time.time()))],
+            )
+        logging.info(f"Indexed {len(titles)} titles of {len(records)} manga.")
+        return len(records)
+
+    def __len__(self) -> int:
+        with self._lock, open_db(self.path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+
+    def match_many(
+        self, names, min_score: int = 0, min_ratio: int = 0
+    ) -> dict[str, TitleMatch | None]:
+        """
+        Finds the best title for every name in one batch.
+        Returns {name: TitleMatch}, with None for names that match nothing scoring
+        at least `min_score` (WRatio) and `min_ratio` (plain ratio), and for names
+        that are exactly a title shared by several manga.
+        """
+        import numpy as np
+        from rapidfuzz import fuzz, process
+
+        names = list(dict.fromkeys(names))
+        queries = {name: normalize_manga_name(name) for name in names}
+        best = {}
+        with self._lock, open_db(self.path) as conn:
+            exact = {
+                normalized: (title_id, manga_count)
+                for title_id, normalized, manga_count in _select_in(
+                    conn,
+                    "SELECT MIN(id), normalized, COUNT(DISTINCT mal_id) FROM titles "
+                    "WHERE normalized IN ({}) GROUP BY normalized",
+                    set(queries.values()),
+                )
+            }
+            fuzzy = {}
+            for name, normalized in queries.items():
+                if normalized in exact:
+                    title_id, manga_count = exact[normalized]
+                    if manga_count == 1:
+                        best[name] = (title_id, 100, 100)
+                    else:
+                        # Any of them would score 100; let Jikan decide instead
+                        logging.debug(
+                            f"'{name}' is a title of {manga_count} manga in the index."
+                        )
+                elif normalized:
+                    fuzzy[name] = normalized
+            candidates = self._candidates(conn, fuzzy)
+
+            for name, normalized in fuzzy.items():
+                choices = candidates.get(name)
+                if not choices:
+                    continue
+                title_ids = list(choices)
+                titles = list(choices.values())
+                weighted = process.cdist(
+                    [normalized], titles, scorer=fuzz.WRatio, score_cutoff=min_score
+                )[0]
+                # The plain ratio only matters for the titles WRatio lets through
+                eligible = np.flatnonzero(weighted)
+                plain = process.cdist(
+                    [normalized],
+                    [titles[i] for i in eligible],
+                    scorer=fuzz.ratio,
+                    score_cutoff=min_ratio,
+                )[0]
+                kept = plain >= min_ratio
+                eligible, plain = eligible[kept], plain[kept]
+                if not eligible.size:
+                    continue
+                # WRatio often ties a title with a shorter one; prefer the closest
+                top = np.lexsort((plain, weighted[eligible]))[-1]
+                position = eligible[top]
+                best[name] = (
+                    title_ids[position],
+                    round(weighted[position]),
+                    round(plain[top]),
+                )
+
+            rows = _select_in(
+                conn,
+                "SELECT t.id, t.title, m.record FROM titles t "
+                "JOIN manga m ON m.mal_id = t.mal_id WHERE t.id IN ({})",
+                {title_id for title_id, _, _ in best.values()},
+            )
+        found = {
+            title_id: (title, json.loads(record)) for title_id, title, record in rows
+        }
+
+        matches = {}
+        for name in names:
+            if name not in best:
+                matches[name] = None
+                continue
+            title_id, score, ratio = best[name]
+            title, record = found[title_id]
+            matches[name] = TitleMatch(name, title, score, ratio, record)
+        return matches
+
+    def _candidates(self, conn, queries: dict[str, str]) -> dict[str, dict[int, str]]:
+        """
+        Returns, for every name, the {title id: normalized title} of the titles that
+        share one of its rarest words. Words found in more than
+        TITLE_INDEX_MAX_POSTINGS titles (articles, particles) are only used when a
+        name has no other word. A word the index does not know stands for the known
+        words closest to it, counted together.
+        """
+        query_words = {
+            name: set(normalized.split()) for name, normalized in queries.items()
+        }
+        counts = dict(
+            _select_in(
+                conn,
+                "SELECT word, titles FROM vocabulary WHERE word IN ({})",
+                set().union(*query_words.values()),
+            )
+        )
+        unknown = set().union(*query_words.values()) - counts.keys()
+        typos = _close_words(conn, unknown) if unknown else {}
+        for close in typos.values():
+            counts.update(close)
+
+        selected = {}
+        for name, words in query_words.items():
+            groups = sorted(
+                (sum(counts[word] for word in group), sorted(group))
+                for group in (
+                    [word] if word in counts else list(typos.get(word, {}))
+                    for word in words
+                )
+                if group
+            )
+            rare = [group for count, group in groups if count <= TITLE_INDEX_MAX_POSTINGS]
+            chosen = (rare or [group for _, group in groups])[:_CANDIDATE_WORDS]
+            selected[name] = [word for group in chosen for word in group]
+
+        postings = {}
+        for word, title_id, normalized in _select_in(
+            conn,
+            "SELECT w.word, t.id, t.normalized FROM words w "
+            "JOIN titles t ON t.id = w.title_id WHERE w.word IN ({})",
+            set().union(*selected.values()),
+        ):
+            postings.setdefault(word, {})[title_id] = normalized
+        candidates = {}
+        for name, words in selected.items():
+            candidates[name] = {}
+            for word in words:
+                candidates[name].update(postings.get(word, {}))
+        return candidates
+
+    def match(
+        self, name: str, min_score: int = 0, min_ratio: int = 0
+    ) -> TitleMatch | None:
+        return self.match_many([name], min_score, min_ratio)[name]
+
+
+def _close_words(conn, words) -> dict[str, dict[str, int]]:
+    """
+    Returns, for every word missing from the index, the {known word: title count}
+    of up to _TYPO_WORDS vocabulary words closest to it by plain ratio. The words
+    are scored against the vocabulary in chunks, so the score matrix stays small.
+    """
+    import numpy as np
+    from rapidfuzz import fuzz, process
+
+    vocabulary = conn.execute("SELECT word, titles FROM vocabulary").fetchall()
+    known = [word for word, _ in vocabulary]
+    words = list(words)
+    close = {}
+    for start in range(0, len(words), _TYPO_CHUNK):
+        chunk = words[start : start + _TYPO_CHUNK]
+        scores = process.cdist(
+            chunk,
+            known,
+            scorer=fuzz.ratio,
+            score_cutoff=_TYPO_MIN_RATIO,
+            dtype=np.uint8,
+            workers=-1,
+        )
+        for word, row in zip(chunk, scores):
+            found = np.flatnonzero(row)
+            found = found[np.argsort(row[found])[::-1][:_TYPO_WORDS]]
+            close[word] = {known[i]: vocabulary[i][1] for i in found}
+    return close
+
+
+def _select_in(conn, sql: str, values) -> list[tuple]:
+    """
+    Runs `sql`, whose '{}' is an IN list, over `values` in batches SQLite accepts.
+    """
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), _SQL_BATCH):
+        batch = values[start : start + _SQL_BATCH]
+        rows += conn.execute(sql.format(",".join("?" * len(batch))), batch).fetchall()
+    return rows
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_title_index() -> TitleIndex | None:
+    """
+    Returns the shared title index in CACHE_DIR, or None if none has been built.
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            path = CACHE_DIR / TITLE_INDEX_FILE
+            if not path.exists():
+                return None
+            try:
+                _default_index = TitleIndex(path)
+            except Exception as e:
+                logging.warning(f"Title index unavailable, matching online: {e}")
+                return None
+        return _default_index
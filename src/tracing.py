@@ -0,0 +1,178 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+
+_tracer = None
+# Attributes of the enclosing spans (folder, pack, ...), inherited by nested spans
+_attributes: ContextVar[dict] = ContextVar("trace_attributes", default={})
+
+
+class Tracer:
+    """
+    Writes finished spans to a file as they complete: Chrome trace events (open
+    the file in chrome://tracing or Perfetto) or, for a '.jsonl' path, one JSON
+    object per line. Safe to use from several threads.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.chrome = self.path.suffix.lower() != ".jsonl"
+        self._lock = threading.Lock()
+        self._threads = {}
+        self._origin_ns = time.perf_counter_ns()
+        self._origin_time = time.time()
+        self._events = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        if self.chrome:
+            # The closing bracket is optional in this format, so a crashed run still loads
+            self._file.write("[\n")
+
+    def record(self, name: str, start_ns: int, end_ns: int, attributes: dict) -> None:
+        thread = threading.current_thread()
+        if self.chrome:
+            event = {
+                "name": name,
+                "cat": "pipeline",
+                "ph": "X",
+                "ts": (start_ns - self._origin_ns) / 1000,
+                "dur": (end_ns - start_ns) / 1000,
+                "pid": os.getpid(),
+                "tid": thread.native_id,
+                "args": attributes,
+            }
+        else:
+            event = {
+                "name": name,
+                "start": self._origin_time + (start_ns - self._origin_ns) / 1e9,
+                "duration": (end_ns - start_ns) / 1e9,
+                "thread": thread.name,
+                "attributes": attributes,
+            }
+        line = json.dumps(event, default=str, ensure_ascii=False)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._threads.setdefault(thread.native_id, thread.name)
+            if self.chrome and self._events:
+                self._file.write(",\n")
+            self._file.write(line if self.chrome else line + "\n")
+            self._events += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            if self.chrome:
+                # Name the thread tracks after the worker threads
+                for tid, thread_name in self._threads.items():
+                    if self._events:
+                        self._file.write(",\n")
+                    self._file.write(
+                        json.dumps(
+                            {
+                                "name": "thread_name",
+                                "ph": "M",
+                                "pid": os.getpid(),
+                                "tid": tid,
+                                "args": {"name": thread_name},
+                            }
+                        )
+                    )
+                    self._events += 1
+                self._file.write("\n]\n")
+            self._file.close()
+
+
+class _Span:
+    __slots__ = ("name", "attributes", "_start_ns", "_token")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes) -> None:
+        """
+        Adds attributes known only once the span is running, such as a page count.
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        parent = _attributes.get()
+        if parent:
+            self.attributes = {**parent, **self.attributes}
+        self._token = _attributes.set(self.attributes)
+        self._start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        _attributes.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        tracer = _tracer
+        if tracer is not None:
+            tracer.record(self.name, self._start_ns, end_ns, self.attributes)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attributes):
+    """
+    Times the enclosed block as a span named `name`. Attributes such as folder
+    and pack are inherited by the spans opened inside it (in the same thread).
+    When tracing is off this returns a shared no-op context manager.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(name, attributes)
+
+
+def start_tracing(path: Path) -> Tracer:
+    global _tracer
+    _tracer = Tracer(path)
+    logging.info(f"Tracing pipeline stages to '{path}'.")
+    return _tracer
+
+
+def stop_tracing() -> None:
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+        logging.info(f"Trace written to '{tracer.path}'.")
+
+
+@contextmanager
+def tracing(path: Path | str | None):
+    """
+    Traces the enclosed block to `path`; does nothing if `path` is None.
+    """
+    if path is None:
+        yield None
+        return
+    tracer = start_tracing(Path(path))
+    try:
+        yield tracer
+    finally:
+        stop_tracing()
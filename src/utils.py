@@ -7,7 +7,31 @@ import sys
 import xml.etree.ElementTree as ET
 import zipfile
 
-from tqdm import tqdm
+from .constants import (
+    BYTES_PER_PART,
+    CHAPTERS_PER_PART,
+    COMBINE_WORKERS,
+    CONVERT_WORKERS,
+    COVER_CACHE_DIR,
+    DEDUPE_EDGE_PAGES,
+    DEDUPE_MAX_DISTANCE,
+    DEDUPE_MAX_SHARE,
+    DEDUPE_MIN_REPEATS,
+    DEVICE_PROFILE,
+    DISK_BUDGET,
+    DISK_FREE_RESERVE,
+    GROUPING_MODE,
+    GROUPING_MODES,
+    MAX_CHAPTERS_PER_PART,
+    MIN_CHAPTERS_PER_PART,
+    PAGES_PER_PART,
+    PIPELINE_QUEUE_SIZE,
+    RAM_STAGING_LIMIT,
+    RAM_STAGING_MAX_PACK,
+    RASTERIZE_WORKERS,
+    ZIP_WORKERS,
+)
+from .tracing import span
 
 
 def setup_logging(verbose=False):
@@ -22,13 +46,16 @@ def setup_logging(verbose=False):
     )
 
 
+_DIGITS_PATTERN = re.compile(r"(\d+)")
+
+
 def natural_sort_key(s):
     """
     Generates a key for natural sorting.
     Splits the string into a list of integers and non-integer substrings.
     """
     return [
-        int(text) if text.isdigit() else text.lower() for text in re.split(r"(\d+)", s)
+        int(text) if text.isdigit() else text.lower() for text in _DIGITS_PATTERN.split(s)
     ]
 
 
@@ -44,38 +71,33 @@ def check_kcc_installed(project_root: Path) -> None:
         sys.exit(1)
 
 
-def create_comic_info_xml(metadata: dict, output_path: Path) -> bool:
+def build_comic_info_xml(metadata: dict) -> bytes:
     """
-    Generates a ComicInfo.xml file based on the provided metadata and saves it to output_path.
-    :param metadata: Dictionary containing metadata fields.
-    :param output_path: Path where ComicInfo.xml will be saved.
-    :return: True if successful, False otherwise.
+    Builds the ComicInfo.xml document for the provided metadata and returns it as UTF-8 bytes.
     """
-    try:
-        comic_info = ET.Element("ComicInfo")
+    comic_info = ET.Element("ComicInfo")
 
-        series = ET.SubElement(comic_info, "Series")
-        series.text = metadata.get("title", "Unknown Series")
+    series = ET.SubElement(comic_info, "Series")
+    series.text = metadata.get("title", "Unknown Series")
 
-        summary = ET.SubElement(comic_info, "Summary")
-        summary.text = metadata.get("summary", "No synopsis available.")
+    summary = ET.SubElement(comic_info, "Summary")
+    summary.text = metadata.get("summary", "No synopsis available.")
 
-        # Create an ElementTree and write to file
-        tree = ET.ElementTree(comic_info)
-        tree.write(output_path, encoding="utf-8", xml_declaration=True)
-        logging.debug(f"Generated ComicInfo.xml at '{output_path}'.")
-        return True
-    except Exception as e:
-        logging.error(f"Failed to generate ComicInfo.xml: {e}")
-        return False
+    return ET.tostring(comic_info, encoding="utf-8", xml_declaration=True)
 
 
-def generate_chapter_range(chapter_numbers: list[int]) -> str:
+def generate_chapter_range(
+    chapter_numbers: list[int], part_number: int | None = None
+) -> str:
     """
     Generates a chapter range string given a list of chapter numbers.
     Example: [1, 2, 3, 4] -> "1 - 4"
+    A part without chapter numbers is named after `part_number`, so such parts
+    do not share a status key and output file: [] -> "Unknown Chapters (Part 3)"
     """
     if not chapter_numbers:
+        if part_number is not None:
+            return f"Unknown Chapters (Part {part_number})"
         return "Unknown Chapters"
     min_chapter_num, max_chapter_num = min(chapter_numbers), max(chapter_numbers)
     return f"{int(min_chapter_num)} - {int(max_chapter_num)}"
@@ -102,9 +124,176 @@ def parse_arguments():
         action="store_true",
         help="Simulate processing without making any changes.",
     )
+    add_grouping_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_rasterize_arguments(parser)
+    add_dedupe_arguments(parser)
+    add_disk_arguments(parser)
+    add_tracing_arguments(parser)
     return parser.parse_args()
 
 
+def add_grouping_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options that decide how chapters are grouped into packs.
+    """
+    parser.add_argument(
+        "--group-by",
+        choices=GROUPING_MODES,
+        default=GROUPING_MODE,
+        help=f"Split packs by chapter count, or balance them by pages or bytes. Default: {GROUPING_MODE}",
+    )
+    parser.add_argument(
+        "--chapters-per-part",
+        type=int,
+        default=CHAPTERS_PER_PART,
+        help=f"Chapters per pack with --group-by chapters. Default: {CHAPTERS_PER_PART}",
+    )
+    parser.add_argument(
+        "--pages-per-part",
+        type=int,
+        default=PAGES_PER_PART,
+        help=f"Target pages per pack with --group-by pages. Default: {PAGES_PER_PART}",
+    )
+    parser.add_argument(
+        "--mb-per-part",
+        type=float,
+        default=BYTES_PER_PART / 1024 / 1024,
+        help=f"Target uncompressed megabytes per pack with --group-by bytes. Default: {BYTES_PER_PART // 1024 // 1024}",
+    )
+    parser.add_argument(
+        "--min-chapters",
+        type=int,
+        default=MIN_CHAPTERS_PER_PART,
+        help=f"Fewest chapters in a balanced pack. Default: {MIN_CHAPTERS_PER_PART}",
+    )
+    parser.add_argument(
+        "--max-chapters",
+        type=int,
+        default=MAX_CHAPTERS_PER_PART,
+        help=f"Most chapters in a balanced pack. Default: {MAX_CHAPTERS_PER_PART}",
+    )
+
+
+def add_pipeline_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options that size the combine/convert pipeline.
+    """
+    parser.add_argument(
+        "--combine-workers",
+        type=int,
+        default=COMBINE_WORKERS,
+        help=f"Number of packs combined in parallel. Default: {COMBINE_WORKERS}",
+    )
+    parser.add_argument(
+        "--convert-workers",
+        type=int,
+        default=CONVERT_WORKERS,
+        help=f"Number of KCC conversions run in parallel. Default: {CONVERT_WORKERS}",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=PIPELINE_QUEUE_SIZE,
+        help=f"Combined packs allowed to wait for conversion. Default: {PIPELINE_QUEUE_SIZE}",
+    )
+
+
+def add_rasterize_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options of the optional page pre-rasterization stage.
+    """
+    parser.add_argument(
+        "--rasterize",
+        action="store_true",
+        help=f"Convert pages to grayscale, trim margins and downscale them to the {DEVICE_PROFILE} screen before KCC runs.",
+    )
+    parser.add_argument(
+        "--rasterize-workers",
+        type=int,
+        default=RASTERIZE_WORKERS,
+        help=f"Worker processes for --rasterize. Default: {RASTERIZE_WORKERS}",
+    )
+
+
+def add_disk_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options that limit how much disk space and memory packs in progress may claim.
+    """
+    parser.add_argument(
+        "--disk-budget-gb",
+        type=float,
+        default=DISK_BUDGET / 1024**3 if DISK_BUDGET else None,
+        help="Most gigabytes the packs in progress may claim per volume; packs wait for room beyond it. Default: limited by free space only",
+    )
+    parser.add_argument(
+        "--disk-reserve-gb",
+        type=float,
+        default=DISK_FREE_RESERVE / 1024**3,
+        help=f"Free gigabytes left untouched on every volume. Default: {DISK_FREE_RESERVE / 1024**3:g}",
+    )
+    parser.add_argument(
+        "--ram-staging-mb",
+        type=float,
+        default=RAM_STAGING_MAX_PACK / 1024 / 1024,
+        help=f"Assemble packs up to this many megabytes in memory and write them in one go, e.g. 512. Default: {RAM_STAGING_MAX_PACK // 1024 // 1024} (off)",
+    )
+    parser.add_argument(
+        "--ram-limit-mb",
+        type=float,
+        default=RAM_STAGING_LIMIT / 1024 / 1024 if RAM_STAGING_LIMIT else None,
+        help="Memory all packs assembled in memory may use together, e.g. 2048. Default: one pack of --ram-staging-mb",
+    )
+
+
+def add_tracing_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the option that records per-stage tracing spans.
+    """
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Record how long every stage takes per series and pack, as a Chrome trace (.json) or JSON lines (.jsonl).",
+    )
+
+
+def add_dedupe_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options of the optional duplicate page removal stage.
+    """
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="Drop credit pages, banners and other pages repeated across chapters, or listed in the allow-list.",
+    )
+    parser.add_argument(
+        "--dedupe-distance",
+        type=int,
+        default=DEDUPE_MAX_DISTANCE,
+        help=f"Largest Hamming distance between page hashes still treated as the same page. Default: {DEDUPE_MAX_DISTANCE}",
+    )
+    parser.add_argument(
+        "--dedupe-min-repeats",
+        type=int,
+        default=DEDUPE_MIN_REPEATS,
+        help=f"Chapters a page must appear in, counting those before the pack, to be dropped. Default: {DEDUPE_MIN_REPEATS}",
+    )
+    parser.add_argument(
+        "--dedupe-edge-pages",
+        type=int,
+        default=DEDUPE_EDGE_PAGES,
+        help=f"Pages checked at each end of a chapter, 0 for all. Default: {DEDUPE_EDGE_PAGES}",
+    )
+    parser.add_argument(
+        "--dedupe-max-share",
+        type=float,
+        default=DEDUPE_MAX_SHARE,
+        help=f"Largest share of a pack's pages that may be dropped; packs that would lose more are kept whole. Default: {DEDUPE_MAX_SHARE}",
+    )
+
+
 def get_sorted_cbz_files(directory: Path) -> list[Path]:
     """
     Retrieves and sorts all CBZ files in the given directory using natural sorting.
@@ -131,10 +320,25 @@ def create_output_folder(dir: Path) -> Path:
     return converted_output_dir
 
 
+def is_cached_cover(path: Path) -> bool:
+    """
+    Tells whether `path` lives in the persistent cover cache and must therefore be kept.
+    """
+    try:
+        return Path(path).resolve().is_relative_to(COVER_CACHE_DIR.resolve())
+    except OSError:
+        return False
+
+
 def clean_cover_image(dry_run, cover_image_path) -> bool:
-    # Clean up the cover image temp file if it was created
+    # Clean up the cover image temp file if it was created; cached covers are shared and kept
 
-    if cover_image_path and cover_image_path.exists() and not dry_run:
+    if (
+        cover_image_path
+        and cover_image_path.exists()
+        and not dry_run
+        and not is_cached_cover(cover_image_path)
+    ):
         try:
             cover_image_path.unlink()
             logging.info(f"Deleted temporary cover image file: {cover_image_path}")
@@ -146,8 +350,18 @@ def clean_cover_image(dry_run, cover_image_path) -> bool:
     return True
 
 
-def zip_files(output_cbz_path, files_to_zip):
-    with zipfile.ZipFile(output_cbz_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for file_path in tqdm(files_to_zip, desc="Adding Files to CBZ", unit="file"):
-            if file_path.is_file():
-                zipf.write(file_path, file_path.name)
+def zip_files(output_cbz_path, files_to_zip, workers: int = ZIP_WORKERS):
+    """
+    Writes `files_to_zip` into a new archive in the given order. Images are stored
+    and other files deflated; reading, hashing and deflating run on `workers` threads.
+    """
+    # src.archive imports this module, so the writer is imported on first use
+    from .archive import ParallelZipWriter
+
+    files = [file_path for file_path in files_to_zip if file_path.is_file()]
+    with span("zip_write", output=Path(output_cbz_path).name, files=len(files)):
+        with zipfile.ZipFile(output_cbz_path, "w") as zipf, ParallelZipWriter(
+            zipf, workers
+        ) as writer:
+            for file_path in files:
+                writer.add_file(file_path, file_path.name)
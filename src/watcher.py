@@ -0,0 +1,214 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import time
+
+from .constants import WATCH_DEBOUNCE, WATCH_MIN_WAIT, WATCH_POLL_INTERVAL
+
+# inotify(7) event flags
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def snapshot_folder(folder: Path) -> dict[str, tuple[int, int]]:
+    """
+    Returns the name, size and mtime of every CBZ in a folder.
+    """
+    snapshot = {}
+    for cbz in folder.glob("*.cbz"):
+        try:
+            stat = cbz.stat()
+        except FileNotFoundError:
+            continue
+        snapshot[cbz.name] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+class _Inotify:
+    """
+    Minimal inotify binding through ctypes: watches the library root and each
+    series folder directly below it, and reports which series folders changed.
+    """
+
+    def __init__(self, root: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self._folders = {}
+        self._root_wd = self._add_watch(root)
+        for folder in root.iterdir():
+            if folder.is_dir():
+                self._add_watch(folder)
+
+    def _add_watch(self, path: Path) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for '{path}'")
+        self._folders[wd] = path
+        return wd
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def read(self, timeout: float) -> tuple[set[Path], bool]:
+        """
+        Waits up to `timeout` seconds and returns the series folders whose CBZs
+        changed, plus whether events were lost and a rescan is needed.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set(), False
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set(), False
+
+        changed, overflow = set(), False
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            parent = self._folders.get(wd)
+            if parent is None:
+                continue
+            if wd == self._root_wd:
+                folder = parent / name
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._add_watch(folder)
+                    except OSError as e:
+                        logging.warning(f"Cannot watch '{folder}': {e}")
+                    changed.add(folder)
+            elif name.lower().endswith(".cbz"):
+                changed.add(parent)
+        return changed, overflow
+
+
+class LibraryWatcher:
+    """
+    Watches the series folders of a library for new or replaced chapter CBZs and
+    reports a folder once it has been quiet for `debounce` seconds and none of its
+    CBZs changed size or mtime in that time, so bursts of new chapters and files
+    that are still being copied are handled in one go.
+    Uses inotify on Linux and falls back to polling elsewhere (or on request).
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        debounce: float = WATCH_DEBOUNCE,
+        poll_interval: float = WATCH_POLL_INTERVAL,
+        use_inotify: bool = True,
+    ):
+        self.root = root
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._pending = {}  # folder -> (time of last change, snapshot at that time)
+        self._snapshots = {}
+        self._inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify(root)
+            except (OSError, AttributeError) as e:
+                logging.warning(f"inotify unavailable, polling instead: {e}")
+        self._snapshots = self._scan()
+        logging.info(
+            f"Watching '{root}' with {'inotify' if self._inotify else 'polling'} "
+            f"(debounce {debounce:g}s)."
+        )
+
+    def _scan(self) -> dict[Path, dict]:
+        return {
+            folder: snapshot_folder(folder)
+            for folder in self.root.iterdir()
+            if folder.is_dir()
+        }
+
+    def _mark_changed(self, folders) -> None:
+        now = time.monotonic()
+        for folder in folders:
+            if folder.is_dir():
+                self._pending[folder] = (now, snapshot_folder(folder))
+
+    def _poll_changes(self) -> set[Path]:
+        current = self._scan()
+        changed = {
+            folder
+            for folder, snapshot in current.items()
+            if self._snapshots.get(folder) != snapshot
+        }
+        self._snapshots = current
+        return changed
+
+    def _settled_folders(self) -> list[Path]:
+        now = time.monotonic()
+        ready = []
+        for folder, (changed_at, snapshot) in list(self._pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+            current = snapshot_folder(folder) if folder.is_dir() else {}
+            if current != snapshot:
+                # Still being written to: restart the quiet period
+                self._pending[folder] = (now, current)
+                continue
+            del self._pending[folder]
+            if current:
+                ready.append(folder)
+        return ready
+
+    def wait_for_folders(self) -> list[Path]:
+        """
+        Blocks until at least one folder has settled and returns the settled folders.
+        """
+        while True:
+            ready = self._settled_folders()
+            if ready:
+                return ready
+            timeout = max(min(self.poll_interval, self.debounce), WATCH_MIN_WAIT)
+            if self._inotify:
+                changed, overflow = self._inotify.read(timeout)
+                if overflow:
+                    logging.warning("inotify queue overflowed, rescanning the library.")
+                    changed |= self._poll_changes()
+            else:
+                time.sleep(timeout)
+                changed = self._poll_changes()
+            if changed:
+                logging.debug(f"Changes in: {', '.join(f.name for f in changed)}")
+                self._mark_changed(changed)
+
+    def close(self) -> None:
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,184 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from ..src import archive
+from ..src.archive import ParallelZipWriter, copy_zip_entry
+
+PAGE = os.urandom(50_000)
+TEXT = b"<ComicInfo>" + b"page " * 5_000 + b"</ComicInfo>"
+
+
+class _Unseekable(io.RawIOBase):
+    """
+    A write-only stream without seek, so zipfile writes data descriptors.
+    """
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def _archive(entries, seekable=True) -> bytes:
+    """
+    Returns the bytes of an archive holding `entries`, as (name, data, compress_type).
+    """
+    stream = io.BytesIO() if seekable else _Unseekable()
+    with zipfile.ZipFile(stream, "w") as zf:
+        for name, data, compress_type in entries:
+            zf.writestr(name, data, compress_type=compress_type)
+    return (stream if seekable else stream.buffer).getvalue()
+
+
+def _copy_all(source_bytes: bytes, rename=lambda name: name) -> bytes:
+    target_stream = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(source_bytes)) as source, zipfile.ZipFile(
+        target_stream, "w"
+    ) as target:
+        for info in source.infolist():
+            copy_zip_entry(source, info, target, rename(info.filename))
+    return target_stream.getvalue()
+
+
+def _contents(archive_bytes: bytes) -> dict[str, bytes]:
+    with zipfile.ZipFile(io.BytesIO(archive_bytes)) as zf:
+        assert zf.testzip() is None
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+
+def _corrupt(archive_bytes: bytes, data: bytes) -> bytes:
+    """
+    Flips one byte in the middle of the first occurrence of `data`.
+    """
+    position = archive_bytes.index(data) + len(data) // 2
+    return (
+        archive_bytes[:position]
+        + bytes([archive_bytes[position] ^ 0xFF])
+        + archive_bytes[position + 1 :]
+    )
+
+
+@pytest.fixture(params=[True, False], ids=["raw", "fallback"])
+def raw_copy(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(archive, "_RAW_MODULE_SUPPORTED", False)
+        monkeypatch.setattr(archive, "supports_raw_write", lambda target: False)
+    return request.param
+
+
+@pytest.mark.parametrize("seekable", [True, False], ids=["headers", "descriptors"])
+def test_copy_round_trip(raw_copy, seekable):
+    source = _archive(
+        [
+            ("001.jpg", PAGE, zipfile.ZIP_STORED),
+            ("002.png", PAGE, zipfile.ZIP_DEFLATED),
+            ("ComicInfo.xml", TEXT, zipfile.ZIP_DEFLATED),
+        ],
+        seekable,
+    )
+    if not seekable:
+        with zipfile.ZipFile(io.BytesIO(source)) as zf:
+            assert all(info.flag_bits & 0x08 for info in zf.infolist())
+
+    copied = _contents(_copy_all(source, lambda name: f"00001_{name}"))
+    assert copied == {
+        "00001_001.jpg": PAGE,
+        "00001_002.png": PAGE,
+        "00001_ComicInfo.xml": TEXT,
+    }
+
+
+def test_copy_keeps_non_ascii_names(raw_copy):
+    source = _archive([("第1話/ページ01.jpg", PAGE, zipfile.ZIP_STORED)])
+    copied = _copy_all(source, lambda name: "00001_ページ01.jpg")
+    assert _contents(copied) == {"00001_ページ01.jpg": PAGE}
+
+
+@pytest.mark.parametrize(
+    "compress_type", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED], ids=["stored", "deflated"]
+)
+def test_corrupt_entry_raises_and_leaves_target_valid(raw_copy, compress_type):
+    data = TEXT if compress_type == zipfile.ZIP_DEFLATED else PAGE
+    good = _archive([("good.jpg", PAGE, zipfile.ZIP_STORED)])
+    bad_source = _archive([("bad.jpg", data, compress_type)])
+    with zipfile.ZipFile(io.BytesIO(bad_source)) as zf:
+        info = zf.infolist()[0]
+        stored = bad_source[info.header_offset :][30 + len(info.filename) :][
+            : info.compress_size
+        ]
+    bad_source = _corrupt(bad_source, stored)
+
+    target_stream = io.BytesIO()
+    with zipfile.ZipFile(target_stream, "w") as target:
+        with zipfile.ZipFile(io.BytesIO(good)) as source:
+            copy_zip_entry(source, source.infolist()[0], target, "00001.jpg")
+        with zipfile.ZipFile(io.BytesIO(bad_source)) as source:
+            with pytest.raises(zipfile.BadZipFile):
+                copy_zip_entry(source, source.infolist()[0], target, "00002.jpg")
+        with zipfile.ZipFile(io.BytesIO(good)) as source:
+            copy_zip_entry(source, source.infolist()[0], target, "00003.jpg")
+    assert _contents(target_stream.getvalue()) == {"00001.jpg": PAGE, "00003.jpg": PAGE}
+
+
+def test_truncated_entry_raises(raw_copy):
+    source = _archive([("001.jpg", PAGE, zipfile.ZIP_STORED)])
+    target_stream = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(source)) as zf, zipfile.ZipFile(
+        target_stream, "w"
+    ) as target:
+        info = zf.infolist()[0]
+        # The central directory claims more data than the entry holds
+        info.compress_size += 100
+        info.file_size += 100
+        with pytest.raises(zipfile.BadZipFile):
+            copy_zip_entry(zf, info, target, "00001.jpg")
+    assert _contents(target_stream.getvalue()) == {}
+
+
+def test_parallel_writer_round_trip(raw_copy, tmp_path):
+    cover = tmp_path / "cover.jpg"
+    cover.write_bytes(PAGE[:1000])
+    source = _archive(
+        [("001.jpg", PAGE, zipfile.ZIP_STORED), ("002.jpg", PAGE, zipfile.ZIP_DEFLATED)]
+    )
+    target_stream = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(source)) as zf, zipfile.ZipFile(
+        target_stream, "w"
+    ) as target, ParallelZipWriter(target, workers=2) as writer:
+        writer.add_file(cover, "00001_cover.jpg")
+        for number, info in enumerate(zf.infolist(), 2):
+            writer.copy_entry(zf, info, f"{number:05d}.jpg")
+        writer.add_bytes(TEXT, "ComicInfo.xml")
+
+    with zipfile.ZipFile(io.BytesIO(target_stream.getvalue())) as zf:
+        assert [info.filename for info in zf.infolist()] == [
+            "00001_cover.jpg",
+            "00002.jpg",
+            "00003.jpg",
+            "ComicInfo.xml",
+        ]
+        assert zf.getinfo("ComicInfo.xml").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.getinfo("00001_cover.jpg").compress_type == zipfile.ZIP_STORED
+    assert _contents(target_stream.getvalue())["00003.jpg"] == PAGE
+
+
+def test_parallel_writer_rollback_drops_later_entries():
+    source = _archive([("001.jpg", PAGE, zipfile.ZIP_STORED)])
+    target_stream = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(source)) as zf, zipfile.ZipFile(
+        target_stream, "w"
+    ) as target, ParallelZipWriter(target, workers=2) as writer:
+        writer.copy_entry(zf, zf.infolist()[0], "00001.jpg")
+        mark = writer.mark()
+        writer.copy_entry(zf, zf.infolist()[0], "00002.jpg")
+        writer.add_bytes(TEXT, "00003.xml")
+        writer.rollback(mark)
+        writer.copy_entry(zf, zf.infolist()[0], "00002.jpg")
+    assert _contents(target_stream.getvalue()) == {"00001.jpg": PAGE, "00002.jpg": PAGE}
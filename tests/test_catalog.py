@@ -0,0 +1,47 @@
+import zipfile
+
+from ..src import catalog as catalog_module
+from ..src.catalog import LibraryCatalog, load_manifests
+
+
+def _chapter(path, pages=2):
+    with zipfile.ZipFile(path, "w") as zf:
+        for number in range(1, pages + 1):
+            zf.writestr(f"{number:03d}.jpg", b"page %d" % number)
+    return path
+
+
+def _catalogued(catalog):
+    with catalog_module.open_db(catalog.path) as conn:
+        return {row[0] for row in conn.execute("SELECT path FROM archives")}
+
+
+def test_refresh_drops_deleted_archives(tmp_path):
+    catalog = LibraryCatalog(tmp_path / "catalog.sqlite3")
+    first = _chapter(tmp_path / "Chapter 1.cbz")
+    second = _chapter(tmp_path / "Chapter 2.cbz", pages=3)
+    catalog.refresh([first, second])
+    assert _catalogued(catalog) == {str(first.resolve()), str(second.resolve())}
+
+    second.unlink()
+    manifests = catalog.refresh([first, second])
+    assert manifests[first].page_count == 2
+    assert manifests[second].error and manifests[second].page_count == 0
+    assert _catalogued(catalog) == {str(first.resolve())}
+
+
+def test_refresh_without_persist_leaves_catalog_alone(tmp_path):
+    catalog = LibraryCatalog(tmp_path / "catalog.sqlite3")
+    chapter = _chapter(tmp_path / "Chapter 1.cbz")
+    assert catalog.refresh([chapter], persist=False)[chapter].page_count == 2
+    assert _catalogued(catalog) == set()
+
+
+def test_dry_run_does_not_create_catalog(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_module, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(catalog_module, "_default_catalog", None)
+    chapter = _chapter(tmp_path / "Chapter 1.cbz")
+    manifests = load_manifests([chapter, tmp_path / "Chapter 2.cbz"], dry_run=True)
+    assert manifests[chapter].page_count == 2
+    assert manifests[tmp_path / "Chapter 2.cbz"].error
+    assert not (tmp_path / "cache").exists()
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from ..src.title_index import TitleIndex
+
+pytest.importorskip("rapidfuzz")
+
+DUMP = [
+    {"mal_id": 1, "title": "Hunter x Hunter", "title_synonyms": ["HxH"]},
+    {"mal_id": 2, "title": "Hunter x Hunter", "title_english": "Hunter x Hunter (2011)"},
+    {"mal_id": 3, "title": "Vagabond"},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    dump = tmp_path / "dump.json"
+    dump.write_text(json.dumps(DUMP), encoding="utf-8")
+    index = TitleIndex(tmp_path / "titles.sqlite3")
+    index.build(dump)
+    return index
+
+
+def test_exact_title_of_one_manga_matches(index):
+    match = index.match("Vagabond")
+    assert match.record["mal_id"] == 3
+    assert (match.score, match.ratio) == (100, 100)
+
+
+def test_exact_title_shared_by_several_manga_is_unmatched(index):
+    assert index.match("Hunter x Hunter") is None
+    assert index.match("HxH").record["mal_id"] == 1
+
+
+def test_match_applies_min_ratio(index):
+    assert index.match("Vagabond Deluxe Edition", min_score=50).record["mal_id"] == 3
+    assert index.match("Vagabond Deluxe Edition", min_score=50, min_ratio=90) is None